@@ -0,0 +1,119 @@
+"""
+Benchmark the import time of the package's `microcosm.factories` entry points.
+
+Every entry point is imported whenever an object graph is created, so their import time is paid
+by every CLI and worker at startup. Each run imports the entry point modules in a fresh interpreter
+with `-X importtime` and parses its report.
+
+Fails (with a non-zero exit status) if a lazily-imported dependency (e.g. `boto3`) is imported
+or if the import time exceeds `--max-millis`.
+
+Usage:
+
+    python benchmarks/import_time.py [--repeat 5] [--top 10] [--max-millis 1000]
+
+"""
+from argparse import ArgumentParser
+from importlib.metadata import entry_points
+from re import compile
+from subprocess import run
+from sys import executable, exit
+
+
+PACKAGE = "microcosm_elasticsearch"
+
+# Dependencies that must only be imported when used
+LAZY_MODULES = ("boto3", "botocore", "microcosm_flask")
+
+# e.g. "import time:       524 |     136541 |   elasticsearch"
+LINE_PATTERN = compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def get_modules():
+    """
+    The modules of the package's `microcosm.factories` entry points.
+
+    """
+    return sorted({
+        entry_point.value.split(":")[0]
+        for entry_point in entry_points(group="microcosm.factories")
+        if entry_point.value.startswith(PACKAGE)
+    })
+
+
+def parse(report):
+    """
+    Parse an `-X importtime` report.
+
+    :returns: a list of (module, depth, self microseconds, cumulative microseconds)
+
+    """
+    imports = []
+    for line in report.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match is None:
+            continue
+        self_micros, cumulative_micros, indent, module = match.groups()
+        imports.append((module, len(indent) // 2, int(self_micros), int(cumulative_micros)))
+    return imports
+
+
+def get_total_micros(imports):
+    """
+    The time to import the package's modules (excluding interpreter startup).
+
+    """
+    return sum(
+        cumulative
+        for module, depth, _, cumulative in imports
+        if depth == 0 and module.startswith(PACKAGE)
+    )
+
+
+def measure(modules):
+    """
+    Import modules in a fresh interpreter.
+
+    :returns: the parsed `-X importtime` report
+
+    """
+    result = run(
+        [executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return parse(result.stderr)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Show the slowest top-level imports")
+    parser.add_argument("--max-millis", type=float, help="Fail if the entry points take longer to import")
+    args = parser.parse_args()
+
+    modules = get_modules()
+    # NB: the fastest run is the least affected by noise (e.g. a cold file system cache)
+    imports = min(
+        (measure(modules) for _ in range(args.repeat)),
+        key=get_total_micros,
+    )
+    total_millis = get_total_micros(imports) / 1000
+    top_level = [(module, cumulative) for module, depth, _, cumulative in imports if depth == 0]
+
+    print(f"entry points: {', '.join(modules)}")  # noqa: T201
+    print(f"total: {total_millis:.1f}ms")  # noqa: T201
+    for module, cumulative in sorted(top_level, key=lambda item: -item[1])[:args.top]:
+        print(f"  {module}: {cumulative / 1000:.1f}ms")  # noqa: T201
+
+    imported = {module.split(".")[0] for module, _, _, _ in imports}
+    eager = [module for module in LAZY_MODULES if module in imported]
+    if eager:
+        exit(f"eagerly imported: {', '.join(eager)}")
+    if args.max_millis is not None and total_millis > args.max_millis:
+        exit(f"import time {total_millis:.1f}ms exceeds {args.max_millis:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
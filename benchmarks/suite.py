@@ -0,0 +1,432 @@
+"""
+Benchmark suite for client-side hot paths.
+
+Runs offline: requests are served by an in-process HTTP stub that returns canned
+Elasticsearch responses, so results measure client-side work (and local HTTP overhead) only.
+
+Measures:
+
+ -  bulk serialization (docs/sec) for the default, validated, trusted and raw (dict and bytes) `Store` paths
+ -  search hit hydration (hits/sec and memory per hit) into models (`SearchIndex._to_list`) and read-only
+    records, and attribute access on the results
+ -  model serialization (`Model.to_dict`) and equality (`Model.__eq__` vs. comparing `_members()`)
+ -  query construction and serialization (`SearchIndex._search`) vs. precompiled query templates
+ -  request signing (`awsv4sign`) and URL normalization (`make_url_safe`)
+ -  end-to-end client overhead for searches and bulk writes against the stub
+ -  replayed searches (`replay.py`) against the stub, with client latency percentiles
+
+Results are written as JSON so that runs against different commits can be compared.
+
+Usage:
+
+    python benchmarks/suite.py [--scale 1.0] [--repeat 3] [--output results.json]
+
+"""
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dump, dumps
+from platform import python_version
+from subprocess import DEVNULL, CalledProcessError, check_output
+from sys import stdout
+from threading import Thread
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+
+from boto3 import Session
+from elasticsearch_dsl.response import Response
+from microcosm.api import create_object_graph
+from requests import Request
+
+from microcosm_elasticsearch.factories import awsv4sign, make_url_safe
+from microcosm_elasticsearch.replay import Replay
+from microcosm_elasticsearch.templates import Param, QueryTemplate
+from microcosm_elasticsearch.tests.fixtures import Person, Planet
+
+
+SEARCH_HITS = 100
+
+
+def make_source(index):
+    return dict(
+        id=str(index),
+        first="Kevin",
+        middle="Wayne",
+        last="Durant",
+        origin_planet="EARTH",
+        doctype="person",
+        created_at=1000,
+        updated_at=1000 + index,
+    )
+
+
+def make_search_response(count):
+    return dict(
+        took=1,
+        timed_out=False,
+        _shards=dict(total=1, successful=1, skipped=0, failed=0),
+        hits=dict(
+            total=dict(value=count, relation="eq"),
+            max_score=None,
+            hits=[
+                dict(
+                    _index="example_v1_test",
+                    _type="_doc",
+                    _id=str(index),
+                    _score=None,
+                    _seq_no=index,
+                    _primary_term=1,
+                    _source=make_source(index),
+                    sort=[1000],
+                )
+                for index in range(count)
+            ],
+        ),
+    )
+
+
+def make_bulk_response(body):
+    # NB: every action is followed by a source line, except for deletes (unused here)
+    count = body.count(b"\n") // 2
+    return dict(
+        took=1,
+        errors=False,
+        items=[dict(index=dict(_id=str(index), status=201)) for index in range(count)],
+    )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves canned Elasticsearch responses.
+
+    """
+    protocol_version = "HTTP/1.1"
+    # NB: avoid delayed ACKs between the header and body writes skewing client timings
+    disable_nagle_algorithm = True
+    search_response = dumps(make_search_response(SEARCH_HITS)).encode("utf-8")
+    info_response = dumps(dict(
+        name="stub",
+        cluster_name="stub",
+        version=dict(number="7.17.0", build_flavor="default"),
+        tagline="You Know, for Search",
+    )).encode("utf-8")
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def do_PUT(self):
+        self.handle_request()
+
+    def do_HEAD(self):
+        self.respond(b"")
+
+    def handle_request(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        path = self.path.split("?")[0]
+
+        if path.endswith("/_bulk"):
+            self.respond(dumps(make_bulk_response(body)).encode("utf-8"))
+        elif path.endswith("/_search"):
+            self.respond(self.search_response)
+        elif path.endswith("/_count"):
+            self.respond(b'{"count":%d}' % SEARCH_HITS)
+        elif path == "/":
+            self.respond(self.info_response)
+        else:
+            self.respond(b"{}")
+
+    def respond(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """
+    An in-process HTTP server for canned responses.
+
+    """
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def host(self):
+        host, port = self.server.server_address
+        return f"{host}:{port}"
+
+
+def measure(name, unit, func, count, repeat):
+    """
+    Measure the best rate of `count` units of work over `repeat` runs.
+
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = perf_counter()
+        func()
+        timings.append(perf_counter() - started_at)
+
+    best = min(timings)
+    return dict(
+        name=name,
+        unit=unit,
+        count=count,
+        seconds=best,
+        rate=count / best,
+    )
+
+
+def measure_memory(func):
+    """
+    The memory allocated (and still held) by a function's result, in bytes.
+
+    """
+    start()
+    try:
+        result = func()
+        memory, _ = get_traced_memory()
+    finally:
+        stop()
+    del result
+    return memory
+
+
+def make_people(count, offset=0):
+    return [
+        Person(meta=dict(id=str(index + offset)), **dict(make_source(index + offset), origin_planet=Planet.EARTH))
+        for index in range(count)
+    ]
+
+
+def bulk_benchmarks(store, count, repeat):
+    batch_size = 500
+    cases = dict(
+        default=dict(),
+        validated=dict(validate=True),
+        trusted=dict(trusted=True),
+        trusted_sampled=dict(trusted=True, validate_sample_rate=0.01),
+    )
+    for name, options in cases.items():
+        def run():
+            actions = [("index", person) for person in make_people(count)]
+            store.bulk(actions, batch_size=batch_size, **options)
+
+        yield measure(f"bulk.{name}", "docs/sec", run, count, repeat)
+
+    raw_cases = dict(
+        raw=lambda source: source,
+        raw_bytes=lambda source: dumps(source).encode("utf-8"),
+    )
+    for name, encode in raw_cases.items():
+        def run_raw():
+            actions = [("index", str(index), encode(make_source(index))) for index in range(count)]
+            store.bulk_raw(actions, batch_size=batch_size)
+
+        yield measure(f"bulk.{name}", "docs/sec", run_raw, count, repeat)
+
+
+def hydration_benchmarks(search_index, count, repeat):
+    raw = make_search_response(count)
+    query = search_index._search()
+
+    cases = dict(
+        models=lambda: search_index._to_list(Response(query, raw)),
+        records=lambda: search_index._to_records(raw),
+    )
+    for name, hydrate in cases.items():
+        result = measure(f"hydrate.{name}", "hits/sec", hydrate, count, repeat)
+        result.update(bytes_per_hit=measure_memory(hydrate) / count)
+        yield result
+
+        hits = hydrate()
+
+        def access():
+            for hit in hits:
+                hit.first, hit.last, hit.origin_planet
+
+        yield measure(f"access.{name}", "hits/sec", access, count, repeat)
+
+
+def serialization_benchmarks(count, repeat):
+    people = make_people(count)
+
+    def run():
+        for person in people:
+            person.to_dict()
+
+    yield measure("model.to_dict", "docs/sec", run, count, repeat)
+
+
+def equality_benchmarks(count, repeat):
+    people = make_people(count)
+    cases = dict(
+        equal=list(zip(people, make_people(count))),
+        distinct=list(zip(people, make_people(count, offset=count))),
+    )
+    for name, pairs in cases.items():
+        def compare_members():
+            for left, right in pairs:
+                left._members() == right._members()
+
+        def compare():
+            for left, right in pairs:
+                left == right
+
+        yield measure(f"model.members.{name}", "comparisons/sec", compare_members, count, repeat)
+        yield measure(f"model.eq.{name}", "comparisons/sec", compare, count, repeat)
+
+
+def query_benchmarks(search_index, count, repeat):
+    serializer = search_index.elasticsearch_client.transport.serializer
+    template = QueryTemplate(
+        dict(
+            query=dict(multi_match=dict(query=Param("q"), fields=["first", "last"])),
+            sort=[dict(created_at=dict(order="desc"))],
+            size=Param("limit"),
+            seq_no_primary_term=True,
+        ),
+    )
+
+    def build():
+        for _ in range(count):
+            serializer.dumps(search_index._search(q="kevin durant", limit=20).to_dict())
+
+    def render():
+        for _ in range(count):
+            template.render(dict(q="kevin durant", limit=20))
+
+    yield measure("query.build", "queries/sec", build, count, repeat)
+    yield measure("query.template", "queries/sec", render, count, repeat)
+
+
+def signing_benchmarks(count, repeat):
+    url = "https://search.example.com/example_v1/_search?q=first:kevin durant&size=10"
+    session = Session(
+        aws_access_key_id="access-key-id",
+        aws_secret_access_key="secret-access-key",
+        region_name="us-east-1",
+    )
+    request = Request("POST", url, data=b'{"query":{"match_all":{}}}').prepare()
+
+    def sign():
+        for _ in range(count):
+            awsv4sign(request, session=session, region="us-east-1")
+
+    def make_safe():
+        for _ in range(count):
+            make_url_safe(url)
+
+    yield measure("awsv4sign", "requests/sec", sign, count, repeat)
+    yield measure("make_url_safe", "urls/sec", make_safe, count, repeat)
+
+
+def client_benchmarks(store, search_index, count, repeat):
+    def search():
+        for _ in range(count):
+            search_index.search(read_only=True)
+
+    def bulk():
+        actions = [("index", str(index), make_source(index)) for index in range(count)]
+        store.bulk_raw(actions, batch_size=100)
+
+    yield measure("client.search", "requests/sec", search, count, repeat)
+    yield measure("client.bulk_raw", "docs/sec", bulk, count, repeat)
+
+
+def replay_benchmarks(search_index, count):
+    queries = [
+        dict(body=dict(query=dict(match=dict(first="kevin")), size=20)),
+        dict(kwargs=dict(q="kevin durant", limit=20)),
+    ]
+    for concurrency in (1, 4):
+        replay = Replay(
+            search_index.elasticsearch_client,
+            index_name=search_index.index_name,
+            search_index=search_index,
+            concurrency=concurrency,
+        )
+        report = replay.run(queries, requests=count)
+        yield dict(
+            name=f"replay.concurrency_{concurrency}",
+            unit="requests/sec",
+            count=count,
+            seconds=report["seconds"],
+            rate=report["throughput"],
+            client=report["client"],
+            errors=report["errors"],
+        )
+
+
+def get_commit():
+    try:
+        return check_output(["git", "rev-parse", "HEAD"], stderr=DEVNULL).decode("utf-8").strip()
+    except (CalledProcessError, OSError):
+        return None
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the amount of work per benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write results to this file instead of stdout")
+    args = parser.parse_args()
+
+    def scaled(count):
+        return max(int(count * args.scale), 1)
+
+    with StubServer() as server:
+        def loader(metadata):
+            return dict(
+                elasticsearch_client=dict(
+                    host=server.host,
+                ),
+            )
+
+        graph = create_object_graph("example", testing=True, loader=loader)
+        store = graph.person_store
+        search_index = graph.example_search_index
+
+        results = [
+            *bulk_benchmarks(store, scaled(10000), args.repeat),
+            *hydration_benchmarks(search_index, scaled(10000), args.repeat),
+            *serialization_benchmarks(scaled(10000), args.repeat),
+            *equality_benchmarks(scaled(10000), args.repeat),
+            *query_benchmarks(search_index, scaled(10000), args.repeat),
+            *signing_benchmarks(scaled(2000), args.repeat),
+            *client_benchmarks(store, search_index, scaled(200), args.repeat),
+            *replay_benchmarks(search_index, scaled(200)),
+        ]
+
+    report = dict(
+        commit=get_commit(),
+        python=python_version(),
+        scale=args.scale,
+        repeat=args.repeat,
+        results=results,
+    )
+    if args.output:
+        with open(args.output, "w") as output:
+            dump(report, output, indent=2)
+    else:
+        dump(report, stdout, indent=2)
+        stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
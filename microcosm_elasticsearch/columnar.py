@@ -0,0 +1,158 @@
+"""
+Columnar export of search results.
+
+Analytics code typically wants columns rather than models. Columns are filled directly
+from (projected) hits, without creating a model per document, and are typed by field class:
+
+ -  `Date` fields become int64 epoch millis (with a validity mask)
+ -  `Keyword` (and `EnumField`) fields become dictionary-encoded categoricals
+ -  other fields (e.g. `Text`) are kept as Python objects
+
+Numeric buffers use the standard library's `array`, which supports the buffer protocol;
+vectorized libraries can wrap them without copying (e.g. `numpy.frombuffer(column.values, "int64")`).
+
+"""
+from array import array
+from datetime import datetime, timezone
+
+from elasticsearch_dsl import Date, Keyword
+
+from microcosm_elasticsearch.fields import EnumField
+
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+class DateColumn:
+    """
+    Dates as int64 epoch millis; missing values are zero and flagged in `validity`.
+
+    """
+    def __init__(self, field):
+        self.field = field
+        self.values = array("q")
+        self.validity = bytearray()
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        if value is None:
+            self.values.append(0)
+            self.validity.append(0)
+        else:
+            self.values.append(self.to_epoch_millis(value))
+            self.validity.append(1)
+
+    def to_epoch_millis(self, value):
+        if isinstance(value, (int, float)):
+            return int(value)
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+
+        value = self.field.deserialize(value)
+        if not isinstance(value, datetime):
+            # NB: dates without times
+            value = datetime(value.year, value.month, value.day)
+        if value.tzinfo is None:
+            # NB: Elasticsearch dates without a timezone are UTC
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+
+
+class CategoricalColumn:
+    """
+    Dictionary-encoded values: `codes` index into `categories`; missing values are coded as -1.
+
+    `EnumField` categories are decoded into enum members (once per category).
+
+    """
+    def __init__(self, field):
+        self.field = field
+        self.codes = array("i")
+        self.categories = []
+        self._category_codes = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+
+        if isinstance(value, list):
+            value = tuple(value)
+
+        try:
+            code = self._category_codes[value]
+        except KeyError:
+            code = self._category_codes[value] = len(self.categories)
+            self.categories.append(self.decode(value))
+        self.codes.append(code)
+
+    def decode(self, value):
+        if isinstance(self.field, EnumField):
+            return self.field.deserialize(value)
+        return value
+
+
+class ObjectColumn:
+    """
+    Values as Python objects; missing values are None.
+
+    """
+    def __init__(self, field):
+        self.field = field
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        self.values.append(value)
+
+
+def column_for(field):
+    """
+    Create an empty column for a field, typed by the field's class.
+
+    """
+    if isinstance(field, Date):
+        return DateColumn(field)
+    if isinstance(field, Keyword):
+        return CategoricalColumn(field)
+    return ObjectColumn(field)
+
+
+def iter_column_batches(hits, model_class, fields=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream (raw) hits into batches of columns keyed by field name.
+
+    :param hits: an iterable of raw hits (e.g. from `elasticsearch.helpers.scan`)
+    :param model_class: the model class whose declared fields define the columns
+    :param fields: the names of the fields to include; defaults to all declared fields
+    :param batch_size: the maximum number of rows per batch
+
+    """
+    mapping = model_class._doc_type.mapping
+    names = tuple(fields or mapping)
+
+    def new_batch():
+        return {name: column_for(mapping[name]) for name in names}
+
+    batch = new_batch()
+    size = 0
+    for hit in hits:
+        source = hit.get("_source", {})
+        for name, column in batch.items():
+            column.append(source.get(name))
+        size += 1
+
+        if size == batch_size:
+            yield batch
+            batch = new_batch()
+            size = 0
+
+    if size:
+        yield batch
@@ -4,7 +4,9 @@ Elasticsearch errors.
 Compatible with `microcosm-flask` HTTP error handling conventions.
 
 """
+from contextlib import contextmanager
 from functools import wraps
+from inspect import isgeneratorfunction
 
 from elasticsearch.exceptions import ConflictError, NotFoundError, RequestError
 
@@ -13,23 +15,38 @@ def translate_elasticsearch_errors(func):
     """
     Translate Elasticsearch errors into HTTP compatible ones.
 
+    Generator functions are supported; errors are translated as the generator is consumed.
+
     """
+    if isgeneratorfunction(func):
+        @wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            with translating_elasticsearch_errors():
+                yield from func(*args, **kwargs)
+        return generator_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        try:
+        with translating_elasticsearch_errors():
             return func(*args, **kwargs)
-        except ConflictError:
-            raise ElasticsearchConflictError
-        except NotFoundError:
-            raise ElasticsearchNotFoundError
-        except RequestError as error:
-            raise ElasticsearchError(error)
-        except KeyError as error:
-            # NB: usually caused by a missing index argument
-            raise ElasticsearchError(error)
     return wrapper
 
 
+@contextmanager
+def translating_elasticsearch_errors():
+    try:
+        yield
+    except ConflictError:
+        raise ElasticsearchConflictError
+    except NotFoundError:
+        raise ElasticsearchNotFoundError
+    except RequestError as error:
+        raise ElasticsearchError(error)
+    except KeyError as error:
+        # NB: usually caused by a missing index argument
+        raise ElasticsearchError(error)
+
+
 class ElasticsearchError(Exception):
     """
     Something unexpected happened.
@@ -71,3 +88,37 @@ class ElasticsearchNotFoundError(ElasticsearchError):
     @property
     def include_stack_trace(self):
         return False
+
+
+class ElasticsearchUnavailableError(ElasticsearchError):
+    """
+    A request was rejected client-side because the cluster is degraded or overloaded.
+
+    Marked as retryable (see `microcosm_flask.errors.as_retryable`).
+
+    """
+    retryable = True
+
+    @property
+    def status_code(self):
+        # service unavailable
+        return 503
+
+    @property
+    def include_stack_trace(self):
+        return False
+
+
+class ElasticsearchMappingConflictError(ElasticsearchError):
+    """
+    A registered mapping cannot be applied to an existing index in place.
+
+    Breaking mapping changes require a new (versioned) index and a reindex.
+
+    """
+    def __init__(self, index_name, conflicts):
+        super().__init__(
+            f"Mapping for index '{index_name}' is incompatible: {'; '.join(conflicts)}",
+        )
+        self.index_name = index_name
+        self.conflicts = conflicts
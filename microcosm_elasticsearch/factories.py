@@ -1,19 +1,26 @@
 """
 Factory that configures Elasticsearch client.
 
+NB: this module is loaded with the other `microcosm.factories` entry points whenever an object graph
+is created; optional dependencies that are slow to import (e.g. `boto3` for AWS request signing, or
+`microcosm_flask` for the index status convention) and the in-memory client are imported when they are used.
+
 """
 from functools import partial
 from os import environ
 from urllib.parse import parse_qs, urlencode, urlparse
 
-from boto3 import Session
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
 from elasticsearch import Elasticsearch, RequestsHttpConnection
 from microcosm.api import defaults
 from microcosm.config.types import boolean
 from microcosm.config.validation import typed
 
+from microcosm_elasticsearch.resilience import (
+    CircuitBreaker,
+    ConcurrencyLimiter,
+    ResilientTransport,
+)
+
 
 def make_url_safe(raw_url):
     """
@@ -40,6 +47,9 @@ def make_url_safe(raw_url):
 
 
 def awsv4sign(r, *, session, region):
+    from botocore.auth import SigV4Auth
+    from botocore.awsrequest import AWSRequest
+
     request = AWSRequest(method=r.method.upper(),
                          url=make_url_safe(r.url),
                          data=r.body)
@@ -49,6 +59,43 @@ def awsv4sign(r, *, session, region):
     return r
 
 
+def configure_transport(config):
+    """
+    Configure the (optional) circuit breaker and concurrency limiter of the client's transport.
+
+    :returns: the client arguments to use
+
+    """
+    circuit_breaker = None
+    if config.use_circuit_breaker:
+        circuit_breaker = CircuitBreaker(
+            failure_rate=config.circuit_breaker_failure_rate,
+            minimum_calls=config.circuit_breaker_minimum_calls,
+            window_size=config.circuit_breaker_window_size,
+            slow_call_millis=config.circuit_breaker_slow_call_millis,
+            open_seconds=config.circuit_breaker_open_seconds,
+            half_open_probes=config.circuit_breaker_half_open_probes,
+        )
+
+    limiter = None
+    if config.max_in_flight:
+        limiter = ConcurrencyLimiter(
+            max_in_flight=config.max_in_flight,
+            wait_millis=config.max_in_flight_wait_millis,
+        )
+
+    if circuit_breaker is None and limiter is None:
+        return dict()
+
+    return dict(
+        transport_class=partial(
+            ResilientTransport,
+            circuit_breaker=circuit_breaker,
+            limiter=limiter,
+        ),
+    )
+
+
 @defaults(
     aws_region=environ.get("AWS_DEFAULT_REGION", environ.get("AWS_REGION", "us-east-1")),
     host="localhost",
@@ -57,8 +104,18 @@ def awsv4sign(r, *, session, region):
     username="elastic",
     password="changeme",
     use_aws4auth=typed(boolean, default_value=False),
+    use_in_memory=typed(boolean, default_value=False),
     timeout_seconds=typed(int, 10),
     retry_on_timeout=typed(boolean, default_value=False),
+    use_circuit_breaker=typed(boolean, default_value=False),
+    circuit_breaker_failure_rate=typed(float, default_value=0.5),
+    circuit_breaker_minimum_calls=typed(int, default_value=20),
+    circuit_breaker_window_size=typed(int, default_value=50),
+    circuit_breaker_slow_call_millis=typed(int, default_value=None),
+    circuit_breaker_open_seconds=typed(float, default_value=30.0),
+    circuit_breaker_half_open_probes=typed(int, default_value=1),
+    max_in_flight=typed(int, default_value=None),
+    max_in_flight_wait_millis=typed(int, default_value=0),
 )
 def configure_elasticsearch_client(graph):
     """
@@ -67,7 +124,14 @@ def configure_elasticsearch_client(graph):
     :returns: an Elasticsearch client instance of the configured name
 
     """
+    if graph.config.elasticsearch_client.use_in_memory:
+        from microcosm_elasticsearch.memory.client import InMemoryElasticsearch
+
+        return InMemoryElasticsearch()
+
     if graph.config.elasticsearch_client.use_aws4auth:
+        from boto3 import Session
+
         region = graph.config.elasticsearch_client.aws_region
         awsauth = partial(
             awsv4sign,
@@ -95,5 +159,8 @@ def configure_elasticsearch_client(graph):
                 graph.config.elasticsearch_client.username,
                 graph.config.elasticsearch_client.password,
             ),
+            timeout=graph.config.elasticsearch_client.timeout_seconds,
+            retry_on_timeout=graph.config.elasticsearch_client.retry_on_timeout,
         )
+    config.update(configure_transport(graph.config.elasticsearch_client))
     return Elasticsearch(**config)
@@ -1,32 +1,43 @@
 """
-Index Status convention.
+Index Status convention; `microcosm_flask` is imported lazily (see `microcosm_elasticsearch.factories`).
 
 """
-from marshmallow import Schema
-from microcosm_flask.conventions.base import EndpointDefinition
-from microcosm_flask.conventions.crud import configure_crud
-from microcosm_flask.namespaces import Namespace
-from microcosm_flask.operations import Operation
-
-from microcosm_elasticsearch.index_status.resources import IndexStatusSchema
-from microcosm_elasticsearch.index_status.store import IndexStatusStore
+from microcosm.api import defaults
+from microcosm.config.validation import typed
 
 
+@defaults(
+    cache_ttl_seconds=typed(int, default_value=5),
+)
 def configure_status_convention(graph):
-    store = IndexStatusStore(graph)
+    from microcosm_flask.conventions.base import EndpointDefinition
+    from microcosm_flask.conventions.crud import configure_crud
+    from microcosm_flask.namespaces import Namespace
+    from microcosm_flask.operations import Operation
+
+    from microcosm_elasticsearch.index_status.resources import (
+        IndexStatusSchema,
+        IndexStatusSearchSchema,
+    )
+    from microcosm_elasticsearch.index_status.store import IndexStatusStore
+
+    store = IndexStatusStore(
+        graph,
+        cache_ttl_seconds=graph.config.index_status_convention.cache_ttl_seconds,
+    )
 
     ns = Namespace(
         subject="index_status",
     )
 
-    def search(**kwargs):
-        status = store.get_status()
+    def search(summary=False, **kwargs):
+        status = store.get_status(summary=summary)
         return status, len(status)
 
     mappings = {
         Operation.Search: EndpointDefinition(
             func=search,
-            request_schema=Schema(),
+            request_schema=IndexStatusSearchSchema(),
             response_schema=IndexStatusSchema(),
         ),
     }
@@ -8,9 +8,27 @@ class IndexStatus:
     def __init__(
         self,
         name,
-        data,
-        stats,
+        data=None,
+        stats=None,
+        summary=None,
     ):
         self.name = name
         self.data = data
         self.stats = stats
+        self.summary = summary
+
+
+class IndexSummary:
+    def __init__(
+        self,
+        doc_count,
+        store_size_in_bytes,
+        indexing_rate,
+        search_rate,
+        segment_count,
+    ):
+        self.doc_count = doc_count
+        self.store_size_in_bytes = store_size_in_bytes
+        self.indexing_rate = indexing_rate
+        self.search_rate = search_rate
+        self.segment_count = segment_count
@@ -5,7 +5,21 @@ Index Status resources.
 from marshmallow import Schema, fields
 
 
+class IndexStatusSearchSchema(Schema):
+    summary = fields.Boolean(required=False)
+
+
+class IndexSummarySchema(Schema):
+    doc_count = fields.Integer(allow_none=True)
+    store_size_in_bytes = fields.Integer(allow_none=True)
+    # per second, since the previous summary (if any)
+    indexing_rate = fields.Float(allow_none=True)
+    search_rate = fields.Float(allow_none=True)
+    segment_count = fields.Integer(allow_none=True)
+
+
 class IndexStatusSchema(Schema):
     name = fields.String()
     data = fields.Raw()
     stats = fields.Raw()
+    summary = fields.Nested(IndexSummarySchema, allow_none=True)
@@ -2,13 +2,39 @@
 Index Status Store
 
 """
-from microcosm_elasticsearch.index_status.models import IndexStatus
+from threading import Lock
+from time import monotonic
+
+from microcosm_elasticsearch.index_status.models import IndexStatus, IndexSummary
+
+
+# The stats needed for summaries
+SUMMARY_METRICS = "docs,store,indexing,search,segments"
 
 
 class IndexStatusStore:
+    """
+    Collects the status of all registered indexes.
+
+    Settings and stats are fetched with (at most) two multi-index requests and cached for `cache_ttl_seconds`,
+    as health checks may poll the status frequently. Summaries avoid fetching (and serializing) settings,
+    mappings and the full stats.
 
-    def __init__(self, graph):
+    """
+    def __init__(self, graph, cache_ttl_seconds=0, clock=monotonic):
+        self.elasticsearch_client = graph.elasticsearch_client
         self.index_registry = graph.elasticsearch_index_registry
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.clock = clock
+
+        self.lock = Lock()
+        self.cache = dict()
+        # the previous stats sample (and its time), to compute rates
+        self.sample = None
+
+    @property
+    def index_names(self):
+        return ",".join(index._name for index in self.index_registry.indexes.values())
 
     def process_status_data(self, status, stats):
         """
@@ -26,13 +52,74 @@ class IndexStatusStore:
             )
         return indices
 
-    def get_status(self):
+    def process_summary_data(self, stats, previous=None, elapsed_seconds=None):
+        """
+        Summarize the stats of each index, computing rates from a previous stats sample (if any).
+
+        """
         indices = []
-        for key, index in self.index_registry.indexes.items():
-            indices.extend(
-                self.process_status_data(
-                    status=index.get(),
-                    stats=index.stats(),
+        for name, index_stats in stats["indices"].items():
+            primaries = index_stats.get("primaries", {})
+            total = index_stats.get("total", {})
+
+            previous_total = previous["indices"].get(name, {}).get("total", {}) if previous else None
+
+            def rate(section, key):
+                if not previous_total or not elapsed_seconds:
+                    return None
+                current = total.get(section, {}).get(key)
+                before = previous_total.get(section, {}).get(key)
+                if current is None or before is None or current < before:
+                    return None
+                return (current - before) / elapsed_seconds
+
+            indices.append(
+                IndexStatus(
+                    name=name,
+                    summary=IndexSummary(
+                        doc_count=primaries.get("docs", {}).get("count"),
+                        store_size_in_bytes=total.get("store", {}).get("size_in_bytes"),
+                        indexing_rate=rate("indexing", "index_total"),
+                        search_rate=rate("search", "query_total"),
+                        segment_count=total.get("segments", {}).get("count"),
+                    ),
                 )
             )
         return indices
+
+    def get_status(self, summary=False):
+        """
+        Get the status (or summary) of all registered indexes, from cache if fresh.
+
+        """
+        now = self.clock()
+        with self.lock:
+            cached = self.cache.get(summary)
+            if cached is not None and now < cached[0]:
+                return cached[1]
+
+        if not self.index_registry.indexes:
+            status = []
+        elif summary:
+            status = self.get_summary(now)
+        else:
+            status = self.process_status_data(
+                status=self.elasticsearch_client.indices.get(index=self.index_names),
+                stats=self.elasticsearch_client.indices.stats(index=self.index_names),
+            )
+
+        with self.lock:
+            self.cache[summary] = (now + self.cache_ttl_seconds, status)
+        return status
+
+    def get_summary(self, now):
+        stats = self.elasticsearch_client.indices.stats(index=self.index_names, metric=SUMMARY_METRICS)
+
+        with self.lock:
+            previous, self.sample = self.sample, (now, stats)
+
+        if previous is None:
+            return self.process_summary_data(stats)
+
+        sampled_at, previous_stats = previous
+        return self.process_summary_data(stats, previous_stats, now - sampled_at)
@@ -5,6 +5,11 @@ CLI entry point hook.
 from argparse import ArgumentParser
 from json import loads
 
+from microcosm_elasticsearch.columnar import DEFAULT_BATCH_SIZE
+from microcosm_elasticsearch.registry import select_indexes
+from microcosm_elasticsearch.replay import Replay, load_queries
+from microcosm_elasticsearch.transfer import DEFAULT_KEEP_ALIVE, export_indexes, import_stores
+
 
 def createall_main(graph):
     """
@@ -15,12 +20,85 @@ def createall_main(graph):
     parser.add_argument("--only", action="append")
     parser.add_argument("--skip", action="append")
     parser.add_argument("-D", "--drop", action="store_true")
+    parser.add_argument("--no-update-mappings", dest="update_mappings", action="store_false")
     args = parser.parse_args()
 
     graph.elasticsearch_index_registry.createall(
         force=args.drop,
         only=args.only,
         skip=args.skip,
+        update_mappings=args.update_mappings,
+    )
+
+
+def export_stats_main(graph):
+    """
+    Export index and cluster stats to metrics periodically.
+
+    """
+    parser = ArgumentParser()
+    parser.add_argument("--interval-seconds", type=int)
+    parser.add_argument("--iterations", type=int, help="Stop after this many exports")
+    args = parser.parse_args()
+
+    exporter = graph.elasticsearch_stats_exporter
+    if args.interval_seconds is not None:
+        exporter.interval_seconds = args.interval_seconds
+    exporter.run(iterations=args.iterations)
+
+
+def export_main(graph):
+    """
+    Export indexes to NDJSON files (see `transfer.py`).
+
+    """
+    parser = ArgumentParser()
+    parser.add_argument("directory")
+    parser.add_argument("--only", action="append")
+    parser.add_argument("--skip", action="append")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("--slices", type=int, help="Scroll slices per index (defaults to the number of workers)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--keep-alive", default=DEFAULT_KEEP_ALIVE)
+    parser.add_argument("-z", "--gzip", action="store_true")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted export")
+    args = parser.parse_args()
+
+    indexes = graph.elasticsearch_index_registry.select(only=args.only, skip=args.skip)
+    return export_indexes(
+        graph.elasticsearch_client,
+        [index._name for index in indexes],
+        args.directory,
+        workers=args.workers,
+        slices=args.slices,
+        batch_size=args.batch_size,
+        keep_alive=args.keep_alive,
+        compress=args.gzip,
+        resume=args.resume,
+    )
+
+
+def import_main(graph, stores):
+    """
+    Import NDJSON files (see `export_main`) through the bulk path of some stores.
+
+    """
+    parser = ArgumentParser()
+    parser.add_argument("directory")
+    parser.add_argument("--only", action="append")
+    parser.add_argument("--skip", action="append")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted import")
+    args = parser.parse_args()
+
+    indexes = list(select_indexes([store.get_index() for store in stores], only=args.only, skip=args.skip))
+    return import_stores(
+        [store for store in stores if store.get_index() in indexes],
+        args.directory,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        resume=args.resume,
     )
 
 
@@ -49,3 +127,28 @@ def query_main(graph, default_index):
         return response["hits"]["hits"]
     else:
         return response
+
+
+def replay_main(graph, default_index, search_index=None):
+    """
+    Replay captured searches as a load test (see `replay.py`).
+
+    """
+    parser = ArgumentParser()
+    parser.add_argument("path", help="An NDJSON file of captured searches")
+    parser.add_argument("-i", "--index", default=default_index)
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("-r", "--rate", type=float, help="Searches per second (defaults to unlimited)")
+    parser.add_argument("-n", "--requests", type=int, help="Number of searches (defaults to one per line)")
+    parser.add_argument("--read-only", action="store_true")
+    args = parser.parse_args()
+
+    replay = Replay(
+        graph.elasticsearch_client,
+        index_name=args.index,
+        search_index=search_index,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        read_only=args.read_only,
+    )
+    return replay.run(load_queries(args.path), requests=args.requests)
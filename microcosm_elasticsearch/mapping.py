@@ -3,10 +3,149 @@ from elasticsearch_dsl import Mapping
 from microcosm_elasticsearch.models import Model
 
 
-def create_mapping(*model_classes: Model) -> Mapping:
+# Field parameters that Elasticsearch allows to change on an existing field.
+UPDATABLE_FIELD_PARAMETERS = frozenset((
+    "ignore_above",
+    "meta",
+    "search_analyzer",
+    "search_quote_analyzer",
+))
+
+# Top-level mapping parameters that Elasticsearch allows to change on an existing index.
+UPDATABLE_MAPPING_PARAMETERS = frozenset((
+    "_meta",
+    "date_detection",
+    "dynamic",
+    "dynamic_templates",
+    "numeric_detection",
+))
+
+
+def create_mapping(*model_classes: Model, routing_required: bool = False) -> Mapping:
+    """
+    Create a (single-type) mapping for one or more model classes.
+
+    :param routing_required: require a custom routing value for every document operation
+
+    """
     mapping = Mapping()
 
     for model_class in model_classes:
         mapping.update(model_class._doc_type.mapping)
 
+    if routing_required:
+        mapping.meta("_routing", required=True)
+
     return mapping
+
+
+class MappingDiff:
+    """
+    The difference between a registered mapping and a live one.
+
+    Changes are additive-compatible and may be applied in place with `put_mapping`;
+    conflicts describe breaking changes that require a new index (and a reindex).
+
+    """
+    def __init__(self):
+        self.parameters = {}
+        self.properties = {}
+        self.conflicts = []
+
+    @property
+    def is_compatible(self):
+        return not self.conflicts
+
+    @property
+    def has_changes(self):
+        return bool(self.parameters or self.properties)
+
+    def to_body(self):
+        """
+        Generate a `put_mapping` body that applies the compatible changes.
+
+        """
+        body = dict(self.parameters)
+        if self.properties:
+            body["properties"] = self.properties
+        return body
+
+
+def diff_mapping(expected, actual) -> MappingDiff:
+    """
+    Compare a registered mapping against a live mapping.
+
+    Both arguments are mapping dictionaries, as returned by `Mapping.to_dict()` and
+    (per index) by the `_mapping` API. Fields that only exist in the live mapping
+    (e.g. from dynamic mapping) are ignored.
+
+    """
+    diff = MappingDiff()
+    actual = actual or {}
+
+    for key, value in expected.items():
+        if key == "properties" or actual.get(key) == value:
+            continue
+        if key in UPDATABLE_MAPPING_PARAMETERS:
+            diff.parameters[key] = value
+        else:
+            diff.conflicts.append(f"mapping parameter '{key}' cannot be changed")
+
+    diff.properties = _diff_properties(
+        expected.get("properties", {}),
+        actual.get("properties", {}),
+        diff.conflicts,
+    )
+    return diff
+
+
+def _diff_properties(expected, actual, conflicts, prefix=""):
+    """
+    Compute the properties that need to be (re-)applied, recording conflicts along the way.
+
+    Any top-level property that changed compatibly is returned with its full registered
+    definition; Elasticsearch merges identical sub-definitions without complaint.
+
+    """
+    changes = {}
+    for name, definition in expected.items():
+        path = f"{prefix}{name}"
+        if name not in actual:
+            changes[name] = definition
+        elif _diff_field(definition, actual[name], conflicts, path):
+            changes[name] = definition
+    return changes
+
+
+def _diff_field(expected, actual, conflicts, path):
+    """
+    Compare a single field definition, returning whether it has compatible changes.
+
+    """
+    expected_type = expected.get("type", "object")
+    actual_type = actual.get("type", "object")
+    if expected_type != actual_type:
+        conflicts.append(f"field '{path}' changed type from '{actual_type}' to '{expected_type}'")
+        return False
+
+    changed = False
+    for key in set(expected) | set(actual):
+        if key in ("type", "properties", "fields"):
+            continue
+        if expected.get(key) == actual.get(key):
+            continue
+        if key in UPDATABLE_FIELD_PARAMETERS:
+            changed = True
+        else:
+            conflicts.append(f"field '{path}' parameter '{key}' cannot be changed")
+
+    for nested_key in ("properties", "fields"):
+        if _diff_properties(
+            expected.get(nested_key, {}),
+            actual.get(nested_key, {}),
+            conflicts,
+            prefix=f"{path}.",
+        ):
+            changed = True
+
+    return changed
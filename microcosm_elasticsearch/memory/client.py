@@ -0,0 +1,784 @@
+"""
+An in-memory fake of the Elasticsearch client.
+
+Implements the subset of the client API used by this library: index management, document
+CRUD, `_bulk`, `_mget`, `_search` (including sliced scrolling) and `_count`. Select it with:
+
+    config.elasticsearch_client.use_in_memory = true
+
+Refresh semantics are deterministic: writes are immediately visible to `get` and `mget`,
+but only become visible to `search` and `count` once their index is refreshed, either
+explicitly (e.g. via `Store.flushing`) or by writing with `refresh=true` (or `wait_for`).
+There is no periodic refresh.
+
+Searches with custom `routing` only see documents with matching routing values, as if each
+routing value had its own shard.
+
+Like a real cluster, state is shared by all clients (in a process) unless a client is given
+its own `InMemoryCluster`.
+
+"""
+from copy import deepcopy
+from fnmatch import fnmatch
+from json import loads
+from types import SimpleNamespace
+from uuid import uuid4
+from zlib import crc32
+
+from elasticsearch.exceptions import (
+    ConflictError,
+    NotFoundError,
+    RequestError,
+    TransportError,
+)
+from elasticsearch.serializer import JSONSerializer
+
+from microcosm_elasticsearch.memory.queries import (
+    Fields,
+    Matcher,
+    bad_request,
+    filter_source,
+    sort_hits,
+)
+
+
+DEFAULT_SIZE = 10
+
+SHARDS = dict(total=1, successful=1, skipped=0, failed=0)
+
+# Request body keys that may also be passed as (named) keyword arguments
+SEARCH_BODY_KEYS = (
+    "query",
+    "sort",
+    "from",
+    "from_",
+    "size",
+    "_source",
+    "source",
+    "explain",
+    "profile",
+    "seq_no_primary_term",
+    "track_total_hits",
+    "version",
+    "aggs",
+    "aggregations",
+    "post_filter",
+    "search_after",
+    "collapse",
+    "suggest",
+    "slice",
+)
+UNSUPPORTED_SEARCH_KEYS = ("aggs", "aggregations", "post_filter", "search_after", "collapse", "suggest")
+UPDATE_BODY_KEYS = ("doc", "upsert", "doc_as_upsert", "script", "scripted_upsert", "detect_noop")
+MGET_BODY_KEYS = ("docs", "ids")
+INDEX_BODY_KEYS = ("mappings", "settings", "aliases")
+
+
+def error_info(error_type, reason):
+    return dict(
+        error=dict(
+            root_cause=[dict(type=error_type, reason=reason)],
+            type=error_type,
+            reason=reason,
+        ),
+    )
+
+
+def not_found(error_type, reason):
+    return NotFoundError(404, error_type, error_info(error_type, reason))
+
+
+def is_refresh(refresh):
+    return refresh in (True, "true", "wait_for", "")
+
+
+def to_body(body, kwargs, keys):
+    """
+    Resolve a request body passed either as `body` (possibly serialized) or as named keyword arguments.
+
+    """
+    if isinstance(body, (str, bytes)):
+        body = loads(body)
+    if body is None:
+        body = {key: kwargs.pop(key) for key in keys if key in kwargs}
+    return body
+
+
+def deep_merge(target, source):
+    """
+    Merge a partial document into a document source, as partial updates do.
+
+    """
+    merged = dict(target)
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = deepcopy(value)
+    return merged
+
+
+class StoredDocument:
+    """
+    A document version.
+
+    """
+    __slots__ = ("id", "source", "seq_no", "primary_term", "version", "routing")
+
+    def __init__(self, id, source, seq_no, version, routing=None):
+        self.id = id
+        self.source = source
+        self.seq_no = seq_no
+        self.primary_term = 1
+        self.version = version
+        self.routing = routing
+
+
+class MemoryIndex:
+    """
+    The state of an index.
+
+    Writes replace (immutable) document versions in `documents`; a refresh snapshots
+    them into `searchable`.
+
+    """
+    def __init__(self, name, mappings=None, settings=None, aliases=None):
+        self.name = name
+        self.uuid = uuid4().hex
+        self.mappings = deepcopy(mappings or {})
+        self.settings = deepcopy(settings or {})
+        self.aliases = deepcopy(aliases or {})
+        self.documents = {}
+        self.searchable = {}
+        self.seq_no = -1
+
+    @property
+    def routing_required(self):
+        return self.mappings.get("_routing", {}).get("required", False)
+
+    def next_seq_no(self):
+        self.seq_no += 1
+        return self.seq_no
+
+    def refresh(self):
+        self.searchable = dict(self.documents)
+
+    def matcher(self):
+        return Matcher(self.mappings)
+
+
+class InMemoryCluster:
+    """
+    The state of a cluster: its indexes and open scroll contexts.
+
+    """
+    def __init__(self):
+        self.indexes = {}
+        self.scrolls = {}
+
+    def clear(self):
+        self.indexes.clear()
+        self.scrolls.clear()
+
+
+DEFAULT_CLUSTER = InMemoryCluster()
+
+
+class InMemoryIndicesClient:
+    """
+    The `indices` namespace of the in-memory client.
+
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, index, body=None, **kwargs):
+        body = to_body(body, kwargs, INDEX_BODY_KEYS)
+        if self.client.resolve(index, allow_missing=True):
+            raise RequestError(
+                400,
+                "resource_already_exists_exception",
+                error_info("resource_already_exists_exception", f"index [{index}] already exists"),
+            )
+
+        self.client.indexes[index] = MemoryIndex(
+            index,
+            mappings=body.get("mappings"),
+            settings=body.get("settings"),
+            aliases=body.get("aliases"),
+        )
+        return dict(acknowledged=True, shards_acknowledged=True, index=index)
+
+    def delete(self, index, ignore=(), **kwargs):
+        indexes = self.client.resolve(index, allow_missing=404 in self.client.ignored(ignore))
+        for memory_index in indexes:
+            del self.client.indexes[memory_index.name]
+        return dict(acknowledged=True)
+
+    def exists(self, index, **kwargs):
+        return bool(self.client.resolve(index, allow_missing=True))
+
+    def refresh(self, index=None, ignore=(), ignore_unavailable=False, **kwargs):
+        allow_missing = ignore_unavailable or 404 in self.client.ignored(ignore)
+        for memory_index in self.client.resolve(index, allow_missing=allow_missing):
+            memory_index.refresh()
+        return dict(_shards=SHARDS)
+
+    def flush(self, index=None, ignore=(), ignore_unavailable=False, **kwargs):
+        # NB: flushing does not affect visibility (as of Elasticsearch 7)
+        allow_missing = ignore_unavailable or 404 in self.client.ignored(ignore)
+        self.client.resolve(index, allow_missing=allow_missing)
+        return dict(_shards=SHARDS)
+
+    def get(self, index, **kwargs):
+        return {
+            memory_index.name: dict(
+                aliases=deepcopy(memory_index.aliases),
+                mappings=deepcopy(memory_index.mappings),
+                settings=dict(index=dict(
+                    deepcopy(memory_index.settings.get("index", memory_index.settings)),
+                    provided_name=memory_index.name,
+                    uuid=memory_index.uuid,
+                )),
+            )
+            for memory_index in self.client.resolve(index)
+        }
+
+    def get_mapping(self, index=None, **kwargs):
+        return {
+            memory_index.name: dict(mappings=deepcopy(memory_index.mappings))
+            for memory_index in self.client.resolve(index)
+        }
+
+    def put_mapping(self, index, body=None, **kwargs):
+        body = to_body(body, kwargs, ("properties", "dynamic", "_routing", "_source", "_meta"))
+        for memory_index in self.client.resolve(index):
+            memory_index.mappings = deep_merge(memory_index.mappings, body)
+        return dict(acknowledged=True)
+
+    def stats(self, index=None, **kwargs):
+        indices = {
+            memory_index.name: dict(
+                uuid=memory_index.uuid,
+                primaries=dict(docs=dict(count=len(memory_index.searchable), deleted=0)),
+                total=dict(docs=dict(count=len(memory_index.searchable), deleted=0)),
+            )
+            for memory_index in self.client.resolve(index)
+        }
+        count = sum(stats["primaries"]["docs"]["count"] for stats in indices.values())
+        return dict(
+            _shards=SHARDS,
+            _all=dict(
+                primaries=dict(docs=dict(count=count, deleted=0)),
+                total=dict(docs=dict(count=count, deleted=0)),
+            ),
+            indices=indices,
+        )
+
+    def exists_alias(self, name, index=None, **kwargs):
+        return any(
+            name in memory_index.aliases
+            for memory_index in self.client.resolve(index, allow_missing=True)
+        )
+
+    def get_alias(self, index=None, name=None, **kwargs):
+        return {
+            memory_index.name: dict(aliases={
+                alias: deepcopy(options)
+                for alias, options in memory_index.aliases.items()
+                if name is None or alias == name
+            })
+            for memory_index in self.client.resolve(index)
+        }
+
+    def put_alias(self, index, name, body=None, **kwargs):
+        for memory_index in self.client.resolve(index):
+            memory_index.aliases[name] = body or {}
+        return dict(acknowledged=True)
+
+
+class InMemoryElasticsearch:
+    """
+    A (single node, single shard) in-memory fake of `elasticsearch.Elasticsearch`.
+
+    """
+    def __init__(self, cluster=DEFAULT_CLUSTER):
+        self.cluster = cluster
+        self.indices = InMemoryIndicesClient(self)
+        # NB: used by `elasticsearch.helpers` to serialize bulk actions
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+
+    @property
+    def indexes(self):
+        return self.cluster.indexes
+
+    @property
+    def scrolls(self):
+        return self.cluster.scrolls
+
+    def ping(self, **kwargs):
+        return True
+
+    def info(self, **kwargs):
+        return dict(
+            name="in-memory",
+            cluster_name="in-memory",
+            version=dict(number="7.17.0"),
+            tagline="You Know, for Search",
+        )
+
+    def ignored(self, ignore):
+        if isinstance(ignore, int):
+            return (ignore,)
+        return tuple(ignore or ())
+
+    def resolve(self, index, allow_missing=False):
+        """
+        Resolve index names, aliases, comma-separated lists and wildcards into indexes.
+
+        :raises `NotFoundError` if a name does not match any index (unless allowed)
+
+        """
+        if index is None or index in ("_all", "*", ""):
+            return list(self.indexes.values())
+
+        names = index.split(",") if isinstance(index, str) else list(index)
+        resolved = {}
+        for name in names:
+            matched = [
+                memory_index
+                for memory_index in self.indexes.values()
+                if memory_index.name == name or name in memory_index.aliases or (
+                    "*" in name and self._matches_wildcard(memory_index, name)
+                )
+            ]
+            if not matched and not allow_missing and "*" not in name:
+                raise not_found("index_not_found_exception", f"no such index [{name}]")
+            for memory_index in matched:
+                resolved[memory_index.name] = memory_index
+        return list(resolved.values())
+
+    def _matches_wildcard(self, memory_index, pattern):
+        return fnmatch(memory_index.name, pattern) or any(fnmatch(alias, pattern) for alias in memory_index.aliases)
+
+    def resolve_for_write(self, index):
+        """
+        Resolve the target of a write, creating the index if it does not exist (as Elasticsearch does).
+
+        """
+        if index is None:
+            raise bad_request("action_request_validation_exception", "index is missing")
+
+        indexes = self.resolve(index, allow_missing=True)
+        if not indexes:
+            self.indices.create(index=index)
+            return self.indexes[index]
+        if len(indexes) > 1:
+            raise bad_request(
+                "illegal_argument_exception",
+                f"no write index is defined for alias [{index}]",
+            )
+        return indexes[0]
+
+    def _write_response(self, memory_index, document, result, refresh=None):
+        response = dict(
+            _index=memory_index.name,
+            _type="_doc",
+            _id=document.id,
+            _version=document.version,
+            result=result,
+            _shards=dict(total=1, successful=1, failed=0),
+            _seq_no=document.seq_no,
+            _primary_term=document.primary_term,
+        )
+        if is_refresh(refresh):
+            response["forced_refresh"] = True
+        return response
+
+    def _check_routing(self, memory_index, routing):
+        if memory_index.routing_required and routing is None:
+            raise bad_request("routing_missing_exception", f"routing is required for [{memory_index.name}]")
+
+    def _check_version(self, memory_index, id, document, if_seq_no, if_primary_term):
+        if if_seq_no is None and if_primary_term is None:
+            return
+        if document is None or (document.seq_no, document.primary_term) != (int(if_seq_no), int(if_primary_term)):
+            current = "" if document is None else (
+                f". current document has seqNo [{document.seq_no}] and primary term [{document.primary_term}]"
+            )
+            raise ConflictError(409, "version_conflict_engine_exception", error_info(
+                "version_conflict_engine_exception",
+                f"[{id}]: version conflict, required seqNo [{if_seq_no}], primary term [{if_primary_term}]{current}",
+            ))
+
+    def _put(self, memory_index, id, source, routing, existing):
+        document = StoredDocument(
+            id=id,
+            source=deepcopy(source),
+            seq_no=memory_index.next_seq_no(),
+            version=1 if existing is None else existing.version + 1,
+            routing=routing,
+        )
+        memory_index.documents[id] = document
+        return document
+
+    def _refresh(self, memory_index, refresh):
+        if is_refresh(refresh):
+            memory_index.refresh()
+
+    def _get_document(self, memory_index, id):
+        document = memory_index.documents.get(str(id))
+        if document is None:
+            raise NotFoundError(404, "not_found", dict(_index=memory_index.name, _type="_doc", _id=id, found=False))
+        return document
+
+    def create(self, index, id=None, body=None, routing=None, refresh=None, **kwargs):
+        body = to_body(body, kwargs, ("document",))
+        if "document" in body and len(body) == 1:
+            body = body["document"]
+        memory_index = self.resolve_for_write(index)
+        self._check_routing(memory_index, routing)
+
+        id = str(id) if id is not None else uuid4().hex
+        if id in memory_index.documents:
+            raise ConflictError(409, "version_conflict_engine_exception", error_info(
+                "version_conflict_engine_exception",
+                f"[{id}]: version conflict, document already exists",
+            ))
+
+        document = self._put(memory_index, id, body, routing, None)
+        self._refresh(memory_index, refresh)
+        return self._write_response(memory_index, document, "created", refresh)
+
+    def index(
+        self,
+        index,
+        body=None,
+        id=None,
+        routing=None,
+        refresh=None,
+        op_type=None,
+        if_seq_no=None,
+        if_primary_term=None,
+        **kwargs
+    ):
+        body = to_body(body, kwargs, ("document",))
+        if "document" in body and len(body) == 1:
+            body = body["document"]
+        if op_type == "create":
+            return self.create(index, id, body=body, routing=routing, refresh=refresh)
+
+        memory_index = self.resolve_for_write(index)
+        self._check_routing(memory_index, routing)
+
+        id = str(id) if id is not None else uuid4().hex
+        existing = memory_index.documents.get(id)
+        self._check_version(memory_index, id, existing, if_seq_no, if_primary_term)
+
+        document = self._put(memory_index, id, body, routing, existing)
+        self._refresh(memory_index, refresh)
+        return self._write_response(memory_index, document, "created" if existing is None else "updated", refresh)
+
+    def update(
+        self,
+        index,
+        id,
+        body=None,
+        routing=None,
+        refresh=None,
+        if_seq_no=None,
+        if_primary_term=None,
+        _source=None,
+        **kwargs
+    ):
+        body = to_body(body, kwargs, UPDATE_BODY_KEYS)
+        memory_index = self.resolve_for_write(index)
+        self._check_routing(memory_index, routing)
+
+        id = str(id)
+        existing = memory_index.documents.get(id)
+        self._check_version(memory_index, id, existing, if_seq_no, if_primary_term)
+
+        upsert = body.get("upsert", body.get("doc") if body.get("doc_as_upsert") else None)
+        if existing is None and upsert is None:
+            raise not_found("document_missing_exception", f"[_doc][{id}]: document missing")
+        if "script" in body:
+            raise bad_request("illegal_argument_exception", "scripts are not supported by the in-memory client")
+
+        if existing is None:
+            document, result = self._put(memory_index, id, upsert, routing, None), "created"
+        else:
+            source = deep_merge(existing.source, body.get("doc", {}))
+            if source == existing.source and body.get("detect_noop", True):
+                document, result = existing, "noop"
+            else:
+                document, result = self._put(memory_index, id, source, routing or existing.routing, existing), "updated"
+
+        self._refresh(memory_index, refresh)
+        response = self._write_response(memory_index, document, result, refresh)
+        if _source:
+            response["get"] = dict(found=True, _source=deepcopy(document.source))
+        return response
+
+    def delete(self, index, id, routing=None, refresh=None, if_seq_no=None, if_primary_term=None, **kwargs):
+        memory_index = self.resolve(index)[0]
+        self._check_routing(memory_index, routing)
+        id = str(id)
+        existing = memory_index.documents.get(id)
+        self._check_version(memory_index, id, existing, if_seq_no, if_primary_term)
+
+        if existing is None:
+            raise NotFoundError(404, "not_found", dict(
+                _index=memory_index.name,
+                _type="_doc",
+                _id=id,
+                result="not_found",
+            ))
+
+        del memory_index.documents[id]
+        self._refresh(memory_index, refresh)
+        deleted = StoredDocument(id, None, memory_index.next_seq_no(), existing.version + 1, existing.routing)
+        return self._write_response(memory_index, deleted, "deleted", refresh)
+
+    def get(self, index, id, routing=None, _source=None, **kwargs):
+        memory_index = self.resolve(index)[0]
+        self._check_routing(memory_index, routing)
+        document = self._get_document(memory_index, id)
+        return self._to_get_response(memory_index, document, _source)
+
+    def exists(self, index, id, **kwargs):
+        indexes = self.resolve(index, allow_missing=True)
+        return bool(indexes) and str(id) in indexes[0].documents
+
+    def _to_get_response(self, memory_index, document, source_filter=None):
+        response = dict(
+            _index=memory_index.name,
+            _type="_doc",
+            _id=document.id,
+            _version=document.version,
+            _seq_no=document.seq_no,
+            _primary_term=document.primary_term,
+            found=True,
+        )
+        if document.routing is not None:
+            response["_routing"] = document.routing
+        source = filter_source(deepcopy(document.source), source_filter)
+        if source is not None:
+            response["_source"] = source
+        return response
+
+    def mget(self, body=None, index=None, **kwargs):
+        body = to_body(body, kwargs, MGET_BODY_KEYS)
+        requests = body.get("docs") or [dict(_id=id) for id in body.get("ids", [])]
+
+        docs = []
+        for request in requests:
+            index_name = request.get("_index", index)
+            indexes = self.resolve(index_name, allow_missing=True)
+            document = indexes[0].documents.get(str(request["_id"])) if indexes else None
+            if document is None:
+                docs.append(dict(_index=index_name, _type="_doc", _id=request["_id"], found=False))
+            else:
+                docs.append(self._to_get_response(indexes[0], document, request.get("_source")))
+        return dict(docs=docs)
+
+    def _search_hits(self, index, query, routing=None):
+        """
+        Evaluate a query against the searchable (refreshed) documents of some indexes.
+
+        """
+        routings = None if routing is None else set(str(routing).split(","))
+
+        hits = []
+        for memory_index in self.resolve(index):
+            matcher = memory_index.matcher()
+            for position, document in enumerate(memory_index.searchable.values()):
+                if routings is not None and (document.routing or document.id) not in routings:
+                    continue
+                score = matcher.score(query, document)
+                if score is None:
+                    continue
+                hits.append(dict(
+                    _index=memory_index.name,
+                    _type="_doc",
+                    _id=document.id,
+                    _score=score,
+                    _source=document.source,
+                    _routing=document.routing,
+                    _seq_no=document.seq_no,
+                    _primary_term=document.primary_term,
+                    _doc=position,
+                ))
+        return hits
+
+    def _in_slice(self, hit, slice):
+        # NB: a stable hash of the id, like the `_id` based slicing of scrolls
+        return crc32(hit["_id"].encode("utf-8")) % int(slice["max"]) == int(slice["id"])
+
+    def _search_request(self, body, kwargs):
+        request = dict(to_body(body, kwargs, SEARCH_BODY_KEYS))
+        if body is not None:
+            # NB: named arguments (e.g. from `elasticsearch.helpers.scan`) extend an explicit body
+            request.update({key: kwargs.pop(key) for key in SEARCH_BODY_KEYS if key in kwargs})
+        if "from_" in request:
+            request["from"] = request.pop("from_")
+        if "source" in request:
+            request["_source"] = request.pop("source")
+
+        unsupported = [key for key in UNSUPPORTED_SEARCH_KEYS if key in request]
+        if unsupported:
+            raise bad_request("parsing_exception", f"Unsupported by the in-memory client: {unsupported}")
+        return request
+
+    def _to_hit(self, hit, request, sorted_by_field):
+        result = dict(
+            _index=hit["_index"],
+            _type="_doc",
+            _id=hit["_id"],
+            _score=None if sorted_by_field else hit["_score"],
+        )
+        if hit["_routing"] is not None:
+            result["_routing"] = hit["_routing"]
+        if request.get("seq_no_primary_term"):
+            result["_seq_no"] = hit["_seq_no"]
+            result["_primary_term"] = hit["_primary_term"]
+        source = filter_source(deepcopy(hit["_source"]), request.get("_source"))
+        if source is not None:
+            result["_source"] = source
+        if "sort" in request:
+            result["sort"] = hit["sort"]
+        if request.get("explain"):
+            result["_explanation"] = dict(
+                value=hit["_score"],
+                description="in-memory score (number of matched query terms)",
+                details=[],
+            )
+        return result
+
+    def search(self, body=None, index=None, scroll=None, routing=None, **kwargs):
+        request = self._search_request(body, kwargs)
+        hits = self._search_hits(index, request.get("query"), routing)
+        if "slice" in request:
+            hits = [hit for hit in hits if self._in_slice(hit, request["slice"])]
+        fields = {memory_index.name: Fields(memory_index.mappings) for memory_index in self.resolve(index)}
+        hits = sort_hits(request.get("sort"), hits, lambda hit: fields[hit["_index"]])
+
+        sorted_by_field = "sort" in request and any(
+            key != "_score"
+            for clause in (request["sort"] if isinstance(request["sort"], list) else [request["sort"]])
+            for key in ([clause] if isinstance(clause, str) else clause)
+        )
+        hits = [self._to_hit(hit, request, sorted_by_field) for hit in hits]
+
+        offset = int(request.get("from", 0))
+        size = int(request.get("size", kwargs.get("size", DEFAULT_SIZE)))
+        page = hits[offset:offset + size]
+
+        response = dict(
+            took=0,
+            timed_out=False,
+            _shards=SHARDS,
+            hits=dict(
+                total=dict(value=len(hits), relation="eq"),
+                max_score=None if sorted_by_field or not page else max(hit["_score"] for hit in page),
+                hits=page,
+            ),
+        )
+        if scroll is not None:
+            scroll_id = uuid4().hex
+            self.scrolls[scroll_id] = (hits[offset + size:], size)
+            response["_scroll_id"] = scroll_id
+        return response
+
+    def scroll(self, body=None, scroll_id=None, **kwargs):
+        scroll_id = scroll_id or (body or {}).get("scroll_id")
+        try:
+            hits, size = self.scrolls[scroll_id]
+        except KeyError:
+            raise not_found("search_context_missing_exception", f"No search context found for id [{scroll_id}]")
+
+        self.scrolls[scroll_id] = (hits[size:], size)
+        return dict(
+            _scroll_id=scroll_id,
+            took=0,
+            timed_out=False,
+            _shards=SHARDS,
+            hits=dict(
+                total=dict(value=len(hits), relation="eq"),
+                max_score=None,
+                hits=hits[:size],
+            ),
+        )
+
+    def clear_scroll(self, body=None, scroll_id=None, **kwargs):
+        scroll_ids = scroll_id or (body or {}).get("scroll_id") or []
+        if isinstance(scroll_ids, str):
+            scroll_ids = scroll_ids.split(",")
+        for id in scroll_ids:
+            self.scrolls.pop(id, None)
+        return dict(succeeded=True, num_freed=len(scroll_ids))
+
+    def count(self, body=None, index=None, routing=None, **kwargs):
+        body = to_body(body, kwargs, ("query",))
+        hits = self._search_hits(index, body.get("query"), routing)
+        return dict(count=len(hits), _shards=SHARDS)
+
+    def _iter_bulk_lines(self, body):
+        if isinstance(body, (bytes, str)):
+            lines = body.splitlines()
+        else:
+            lines = body
+        for line in lines:
+            if isinstance(line, dict):
+                yield line
+            elif line.strip():
+                yield loads(line)
+
+    def bulk(self, body, index=None, routing=None, refresh=None, **kwargs):
+        lines = self._iter_bulk_lines(body)
+        items, touched = [], {}
+        for action in lines:
+            (op_type, meta), = action.items()
+            source = None if op_type == "delete" else next(lines)
+            index_name = meta.get("_index", index)
+            id = meta.get("_id")
+            try:
+                response = self._bulk_item(op_type, index_name, id, source, dict(
+                    routing=meta.get("routing", meta.get("_routing", routing)),
+                    if_seq_no=meta.get("if_seq_no"),
+                    if_primary_term=meta.get("if_primary_term"),
+                ))
+                touched[response["_index"]] = self.indexes[response["_index"]]
+                response["status"] = 201 if response["result"] == "created" else 200
+            except TransportError as error:
+                response = dict(
+                    _index=index_name,
+                    _type="_doc",
+                    _id=id,
+                    status=error.status_code,
+                )
+                if op_type == "delete" and error.status_code == 404 and error.error == "not_found":
+                    response["result"] = "not_found"
+                else:
+                    response["error"] = dict(type=error.error, reason=str(error))
+            items.append({op_type: response})
+
+        for memory_index in touched.values():
+            self._refresh(memory_index, refresh)
+
+        return dict(
+            took=0,
+            errors=any("error" in item[op_type] for item in items for op_type in item),
+            items=items,
+        )
+
+    def _bulk_item(self, op_type, index, id, source, options):
+        if op_type == "index":
+            return self.index(index, body=source, id=id, **options)
+        if op_type == "create":
+            return self.create(index, id, body=source, routing=options["routing"])
+        if op_type == "update":
+            return self.update(index, id, body=source, **options)
+        if op_type == "delete":
+            return self.delete(index, id, **options)
+        raise bad_request("illegal_argument_exception", f"Malformed action/metadata line [{op_type}]")
@@ -0,0 +1,394 @@
+"""
+Query evaluation for the in-memory client.
+
+Supports the subset of the query DSL used by this library (and typical services):
+`match_all`, `match_none`, `ids`, `term`, `terms`, `exists`, `range`, `match`, `multi_match`
+and `bool`. Text fields are analyzed by lowercasing and splitting on non-word characters
+(approximately the standard analyzer); other fields match on exact values.
+
+Scores are the number of matched query terms; they are only meaningful relative to each other.
+
+"""
+from datetime import date, datetime, timezone
+from fnmatch import fnmatch
+from re import findall
+
+from elasticsearch.exceptions import RequestError
+
+
+TEXT_TYPES = ("text", "match_only_text", "search_as_you_type")
+
+
+def bad_request(error_type, reason):
+    return RequestError(400, error_type, dict(error=dict(type=error_type, reason=reason)))
+
+
+def analyze(value):
+    """
+    Tokenize text (approximately) like the standard analyzer.
+
+    """
+    return findall(r"\w+", str(value).lower())
+
+
+def normalize(value):
+    """
+    Normalize an exact value for comparison.
+
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def to_millis(value):
+    """
+    Convert a date value (epoch millis or ISO 8601 string) to epoch millis.
+
+    """
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str) and value.lstrip("-").isdigit():
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if not isinstance(value, datetime) and isinstance(value, date):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def get_values(source, path):
+    """
+    Resolve a (dotted) field path into the list of its values in a document source.
+
+    """
+    values = [source]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                child = value[part]
+                if isinstance(child, list):
+                    next_values.extend(child)
+                else:
+                    next_values.append(child)
+        values = next_values
+    return [value for value in values if value is not None]
+
+
+class Fields:
+    """
+    Resolves field paths against an index mapping.
+
+    Unmapped string fields are treated like dynamically mapped ones: `text` with a `keyword` sub-field.
+
+    """
+    def __init__(self, mappings):
+        self.mappings = mappings
+
+    def resolve(self, path):
+        """
+        :returns: the source path and type of a field
+
+        """
+        properties = self.mappings.get("properties", {})
+        parts = path.split(".")
+        for index, part in enumerate(parts):
+            field = properties.get(part)
+            if field is None:
+                break
+            rest = parts[index + 1:]
+            if not rest:
+                return path, field.get("type", "object")
+            if "properties" in field:
+                properties = field["properties"]
+                continue
+            if len(rest) == 1 and rest[0] in field.get("fields", {}):
+                return ".".join(parts[:index + 1]), field["fields"][rest[0]].get("type", "keyword")
+            break
+
+        if path.endswith(".keyword"):
+            return path[:-len(".keyword")], "keyword"
+        return path, None
+
+    def values(self, source, path):
+        source_path, field_type = self.resolve(path)
+        return get_values(source, source_path), field_type
+
+    def is_text(self, field_type, values):
+        if field_type is None:
+            return any(isinstance(value, str) for value in values)
+        return field_type in TEXT_TYPES
+
+    def terms(self, source, path):
+        """
+        The indexed terms of a field: tokens for text fields, normalized values otherwise.
+
+        """
+        values, field_type = self.values(source, path)
+        if self.is_text(field_type, values):
+            return {token for value in values for token in analyze(value)}
+        return {normalize(value) for value in values}
+
+    def sort_values(self, source, path):
+        values, field_type = self.values(source, path)
+        if field_type == "date":
+            return [to_millis(value) for value in values]
+        return values
+
+
+class Matcher:
+    """
+    Evaluates queries against documents.
+
+    """
+    def __init__(self, mappings):
+        self.fields = Fields(mappings)
+
+    def score(self, query, document):
+        """
+        Evaluate a query.
+
+        :returns: the score of a matching document or None if the document does not match
+
+        """
+        if not query:
+            return 1.0
+        if len(query) != 1:
+            raise bad_request("parsing_exception", f"Expected a single query clause, got: {sorted(query)}")
+
+        query_type, clause = next(iter(query.items()))
+        try:
+            evaluate = getattr(self, f"score_{query_type}")
+        except AttributeError:
+            raise bad_request("parsing_exception", f"Unsupported query type: [{query_type}]")
+        return evaluate(clause, document)
+
+    def matches(self, query, document):
+        return self.score(query, document) is not None
+
+    def score_match_all(self, clause, document):
+        return 1.0
+
+    def score_match_none(self, clause, document):
+        return None
+
+    def score_ids(self, clause, document):
+        return 1.0 if document.id in map(normalize, clause["values"]) else None
+
+    def field_clause(self, clause, key):
+        """
+        Split a `{field: value}` or `{field: {key: value, ...}}` clause.
+
+        """
+        (field, value), = ((name, value) for name, value in clause.items() if name != "boost")
+        if isinstance(value, dict):
+            return field, value.get(key), value
+        return field, value, {}
+
+    def score_term(self, clause, document):
+        field, value, _ = self.field_clause(clause, "value")
+        return 1.0 if normalize(value) in self.fields.terms(document.source, field) else None
+
+    def score_terms(self, clause, document):
+        field, values, _ = self.field_clause(clause, "values")
+        terms = self.fields.terms(document.source, field)
+        return 1.0 if any(normalize(value) in terms for value in values) else None
+
+    def score_exists(self, clause, document):
+        values, _ = self.fields.values(document.source, clause["field"])
+        return 1.0 if values else None
+
+    def score_range(self, clause, document):
+        field, _, bounds = self.field_clause(clause, None)
+        _, field_type = self.fields.resolve(field)
+        convert = to_millis if field_type == "date" else (lambda value: value)
+
+        def in_range(value):
+            value = convert(value)
+            return all([
+                "gt" not in bounds or value > convert(bounds["gt"]),
+                "gte" not in bounds or value >= convert(bounds["gte"]),
+                "lt" not in bounds or value < convert(bounds["lt"]),
+                "lte" not in bounds or value <= convert(bounds["lte"]),
+            ])
+
+        values, _ = self.fields.values(document.source, field)
+        return 1.0 if any(in_range(value) for value in values) else None
+
+    def score_match(self, clause, document):
+        field, query, options = self.field_clause(clause, "query")
+        return self.match_field(field, query, options.get("operator", "or"), document)
+
+    def score_multi_match(self, clause, document):
+        scores = [
+            self.match_field(field.split("^")[0], clause["query"], clause.get("operator", "or"), document)
+            for field in clause.get("fields", ["*"])
+        ]
+        scores = [score for score in scores if score is not None]
+        return max(scores) if scores else None
+
+    def match_field(self, field, query, operator, document):
+        if field == "*":
+            fields = [key for key in document.source if not key.startswith("_")]
+            scores = [self.match_field(key, query, operator, document) for key in fields]
+            scores = [score for score in scores if score is not None]
+            return max(scores) if scores else None
+
+        values, field_type = self.fields.values(document.source, field)
+        if not self.fields.is_text(field_type, values):
+            return 1.0 if normalize(query) in {normalize(value) for value in values} else None
+
+        tokens = analyze(query)
+        terms = self.fields.terms(document.source, field)
+        matched = [token for token in tokens if token in terms]
+        if not matched or (operator.lower() == "and" and len(matched) < len(tokens)):
+            return None
+        return float(len(matched))
+
+    def score_bool(self, clause, document):
+        def clauses(key):
+            value = clause.get(key, [])
+            return value if isinstance(value, list) else [value]
+
+        score = 0.0
+        for query in clauses("must"):
+            query_score = self.score(query, document)
+            if query_score is None:
+                return None
+            score += query_score
+
+        for query in clauses("filter"):
+            if not self.matches(query, document):
+                return None
+
+        for query in clauses("must_not"):
+            if self.matches(query, document):
+                return None
+
+        should = clauses("should")
+        should_scores = [self.score(query, document) for query in should]
+        should_scores = [query_score for query_score in should_scores if query_score is not None]
+
+        minimum_should_match = clause.get("minimum_should_match")
+        if minimum_should_match is None:
+            minimum_should_match = 0 if (clause.get("must") or clause.get("filter")) else min(len(should), 1)
+        if len(should_scores) < int(minimum_should_match):
+            return None
+
+        return score + sum(should_scores)
+
+
+def sort_key(fields, sort, hit):
+    """
+    Resolve the sort values of a hit.
+
+    :returns: the list of sort values (as returned in the hit's `sort`)
+
+    """
+    values = []
+    for field, order in sort:
+        if field == "_score":
+            values.append(hit["_score"])
+        elif field == "_doc":
+            values.append(hit["_doc"])
+        else:
+            field_values = fields.sort_values(hit["_source"], field)
+            if not field_values:
+                values.append(None)
+            else:
+                values.append(max(field_values) if order == "desc" else min(field_values))
+    return values
+
+
+def normalize_sort(sort):
+    """
+    Normalize sort clauses into a list of (field, order) pairs.
+
+    """
+    if sort is None:
+        return [("_score", "desc")]
+    if not isinstance(sort, list):
+        sort = [sort]
+
+    normalized = []
+    for clause in sort:
+        if isinstance(clause, str):
+            if clause.startswith("-"):
+                normalized.append((clause[1:], "desc"))
+            else:
+                normalized.append((clause, "desc" if clause == "_score" else "asc"))
+            continue
+
+        (field, order), = clause.items()
+        if isinstance(order, dict):
+            order = order.get("order", "desc" if field == "_score" else "asc")
+        normalized.append((field, order))
+    return normalized
+
+
+def sort_hits(sort, hits, fields_for):
+    """
+    Sort hits stably by each sort clause in turn, missing values last.
+
+    :param fields_for: a function resolving the `Fields` of a hit's index
+
+    """
+    sort = normalize_sort(sort)
+    for hit in hits:
+        hit["sort"] = sort_key(fields_for(hit), sort, hit)
+
+    for position, (_, order) in reversed(list(enumerate(sort))):
+        present = [hit for hit in hits if hit["sort"][position] is not None]
+        missing = [hit for hit in hits if hit["sort"][position] is None]
+        present.sort(key=lambda hit: hit["sort"][position], reverse=(order == "desc"))
+        hits = present + missing
+    return hits
+
+
+def filter_source(source, spec):
+    """
+    Apply `_source` filtering to a document source.
+
+    """
+    if spec is None or spec is True:
+        return source
+    if spec is False:
+        return None
+
+    if isinstance(spec, str):
+        includes, excludes = [spec], []
+    elif isinstance(spec, list):
+        includes, excludes = spec, []
+    else:
+        includes = spec.get("includes", spec.get("include", []))
+        excludes = spec.get("excludes", spec.get("exclude", []))
+        includes = [includes] if isinstance(includes, str) else includes
+        excludes = [excludes] if isinstance(excludes, str) else excludes
+
+    def matches(path, patterns):
+        return any(
+            fnmatch(path, pattern) or path.startswith(pattern + ".")
+            for pattern in patterns
+        )
+
+    def could_contain(path, patterns):
+        return any(pattern.startswith(path + ".") or pattern.startswith("*") for pattern in patterns)
+
+    def select(value, prefix):
+        result = {}
+        for key, child in value.items():
+            path = f"{prefix}{key}"
+            if matches(path, excludes):
+                continue
+            if not includes or matches(path, includes):
+                result[key] = child
+            elif isinstance(child, dict) and could_contain(path, includes):
+                selected = select(child, path + ".")
+                if selected:
+                    result[key] = selected
+        return result
+
+    return select(source, "")
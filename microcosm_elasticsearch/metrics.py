@@ -0,0 +1,117 @@
+"""
+Opt-in instrumentation of Elasticsearch operations via `microcosm-metrics`.
+
+Enable with:
+
+    config.elasticsearch_metrics.enabled = true
+
+Operations (e.g. `create`, `search`, `bulk`) publish timings (in milliseconds) and error counts
+tagged by index, model and (translated) error class. Where available, the client-side
+serialization/hydration time, the server-side `took` and the remaining network time are
+published separately.
+
+"""
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+from microcosm.api import defaults
+from microcosm.config.types import boolean
+from microcosm.config.validation import typed
+from microcosm_metrics.naming import name_for
+
+
+PREFIX = "elasticsearch"
+
+
+@defaults(
+    enabled=typed(boolean, default_value=False),
+)
+class ElasticsearchMetrics:
+    """
+    Publishes Elasticsearch metrics, if enabled.
+
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.enabled = graph.config.elasticsearch_metrics.enabled
+
+    @property
+    def metrics(self):
+        return self.graph.metrics
+
+    def histogram(self, operation, key, value, tags):
+        if self.enabled:
+            self.metrics.histogram(name_for(PREFIX, operation, key), value, tags=tags)
+
+    def increment(self, operation, key, tags):
+        if self.enabled:
+            self.metrics.increment(name_for(PREFIX, operation, key), tags=tags)
+
+    @contextmanager
+    def timing(self, operation, key, tags):
+        """
+        Time a block of client-side work (e.g. serialization).
+
+        """
+        if not self.enabled:
+            yield
+            return
+
+        started_at = perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(operation, key, elapsed_millis(started_at), tags)
+
+    def record_response(self, operation, started_at, response, tags):
+        """
+        Record the server-side and network time of a request started at `started_at`.
+
+        """
+        if not self.enabled:
+            return
+
+        elapsed = elapsed_millis(started_at)
+        took = response.get("took") if isinstance(response, dict) else getattr(response, "took", None)
+        if took is None:
+            return
+
+        self.histogram(operation, "took", took, tags)
+        self.histogram(operation, "network", max(elapsed - took, 0), tags)
+
+
+def elapsed_millis(started_at):
+    return (perf_counter() - started_at) * 1000
+
+
+def instrumented(operation):
+    """
+    Time an operation of a component with `elasticsearch_metrics` and `metrics_tags(**kwargs)`.
+
+    Errors are counted by class; as this decorator is meant to wrap `translate_elasticsearch_errors`,
+    these are the translated error classes.
+
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            elasticsearch_metrics = self.elasticsearch_metrics
+            if not elasticsearch_metrics.enabled:
+                return func(self, *args, **kwargs)
+
+            tags = self.metrics_tags(**kwargs)
+            started_at = perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            except Exception as error:
+                elasticsearch_metrics.increment(
+                    operation,
+                    "error",
+                    tags + [f"error:{error.__class__.__name__}"],
+                )
+                raise
+            finally:
+                elasticsearch_metrics.histogram(operation, "time", elapsed_millis(started_at), tags)
+        return wrapper
+    return decorator
@@ -3,6 +3,17 @@ Base classes for models
 
 """
 from elasticsearch_dsl import Date, Document, Keyword
+from elasticsearch_dsl.utils import AttrList
+
+
+# Keys that are excluded from equality because they are not persisted
+NON_PERSISTENT_KEYS = frozenset(("index", "doc_type"))
+
+# Keys that are compared first, as they tell distinct documents apart most cheaply
+SHORT_CIRCUIT_KEYS = ("id", "updated_at")
+
+# Distinguishes missing members from members set to None (which some fields serialize)
+MISSING = object()
 
 
 class Model(Document):
@@ -12,6 +23,9 @@ class Model(Document):
 
     See README#polymorphic-models for more details
 
+    Models may declare a `__routing_field__` naming the field used as the custom routing value
+    for their documents (e.g. a tenant id); see README#custom-routing for more details.
+
     """
     # Every persistent entity should have a primary key id and created/updated timestamps.
     id = Keyword(required=True)
@@ -31,16 +45,82 @@ class Model(Document):
     def get_model_doctype(cls):
         return getattr(cls, "__doctype_name__", None) or cls.__name__.lower()
 
+    @classmethod
+    def get_routing_field(cls):
+        return getattr(cls, "__routing_field__", None)
+
+    def get_routing(self):
+        """
+        Resolve the custom routing value of this instance, if any.
+
+        """
+        routing_field = self.get_routing_field()
+        if routing_field is None:
+            return None
+        value = getattr(self, routing_field, None)
+        return None if value is None else str(value)
+
     def _members(self):
         return {
             key: value
             for key, value in self.to_dict().items()
             # NB: exclude non-persistent fields
-            if key not in ("index", "doc_type")
+            if key not in NON_PERSISTENT_KEYS
         }
 
     def __eq__(self, other):
-        return type(other) is type(self) and self._members() == other._members()
+        """
+        Compare persistent members, as if comparing `_members()`.
+
+        Avoids serializing every member (via `to_dict`): only values that are not trivially
+        equal are serialized, one member at a time.
+
+        """
+        if type(other) is not type(self):
+            return False
+        if other is self:
+            return True
+
+        data, other_data = self._d_, other._d_
+
+        for key in SHORT_CIRCUIT_KEYS:
+            if not self._member_equals(key, data.get(key, MISSING), other_data.get(key, MISSING)):
+                return False
+
+        for key, value in data.items():
+            if key in SHORT_CIRCUIT_KEYS or key in NON_PERSISTENT_KEYS:
+                continue
+            if not self._member_equals(key, value, other_data.get(key, MISSING)):
+                return False
+
+        for key, other_value in other_data.items():
+            if key in data or key in SHORT_CIRCUIT_KEYS or key in NON_PERSISTENT_KEYS:
+                continue
+            if not self._member_equals(key, MISSING, other_value):
+                return False
+
+        return True
+
+    def _member_equals(self, key, value, other_value):
+        if value is other_value or (type(value) is type(other_value) and value == other_value):
+            return True
+        return self._serialize_member(key, value) == self._serialize_member(key, other_value)
+
+    def _serialize_member(self, key, value):
+        """
+        Serialize a single member the same way as `to_dict`, treating empty values as missing.
+
+        """
+        if value is MISSING:
+            return None
+        field = self._doc_type.mapping[key] if key in self._doc_type.mapping else None
+        if field is not None and field._coerce:
+            value = field.serialize(value)
+        if isinstance(value, AttrList):
+            value = value._l_
+        if value in ([], {}, None):
+            return None
+        return value
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -79,3 +159,19 @@ class Model(Document):
     @_version.setter
     def _version(self, value):
         self.meta.version = value
+
+    @property
+    def _seq_no(self):
+        return getattr(self.meta, "seq_no", None)
+
+    @_seq_no.setter
+    def _seq_no(self, value):
+        self.meta.seq_no = value
+
+    @property
+    def _primary_term(self):
+        return getattr(self.meta, "primary_term", None)
+
+    @_primary_term.setter
+    def _primary_term(self, value):
+        self.meta.primary_term = value
@@ -0,0 +1,154 @@
+"""
+Bulk request serialization.
+
+Writes bulk actions directly as NDJSON bytes, bypassing the per-action processing
+(and per-document field serialization) of `elasticsearch.helpers.bulk`.
+
+"""
+from datetime import date, datetime
+from enum import Enum
+from json import dumps as json_dumps
+
+from elasticsearch_dsl.utils import AttrDict, AttrList
+
+
+# Bulk metadata keys of a record (as accepted by `elasticsearch.helpers.bulk`) and their action names
+ACTION_KEYS = dict(
+    _id="_id",
+    _index="_index",
+    _routing="routing",
+    routing="routing",
+    if_seq_no="if_seq_no",
+    if_primary_term="if_primary_term",
+    retry_on_conflict="retry_on_conflict",
+)
+
+EMPTY_VALUES = (None, [], {})
+
+
+def encode_default(value):
+    """
+    Encode values that are not natively JSON-compatible.
+
+    """
+    if isinstance(value, Enum):
+        # NB: consistent with `EnumField`
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, AttrList):
+        return value._l_
+    if isinstance(value, AttrDict):
+        return value.to_dict()
+    raise TypeError(f"Unable to serialize {value!r} (type: {type(value)})")
+
+
+def dumps(value):
+    return json_dumps(value, separators=(",", ":"), default=encode_default).encode("utf-8")
+
+
+def iter_batches(items, batch_size):
+    """
+    Group an iterable into lists of (at most) `batch_size` items, without materializing it.
+
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_source(data):
+    """
+    Generate a document source from raw model data, skipping empty values.
+
+    """
+    return {
+        key: value
+        for key, value in data.items()
+        if value not in EMPTY_VALUES
+    }
+
+
+def to_bulk_lines(record):
+    """
+    Serialize a bulk record into its NDJSON action (and source) lines.
+
+    Records use the same format as `elasticsearch.helpers.bulk` actions: an `_op_type`, metadata
+    keys and either a `_source` or (for updates) the remaining keys as the request body.
+    The `_source` may also be pre-serialized JSON bytes.
+
+    """
+    op_type = record.get("_op_type", "index")
+    action = {}
+    body = {}
+    for key, value in record.items():
+        if key == "_op_type":
+            continue
+        if key in ACTION_KEYS:
+            action[ACTION_KEYS[key]] = value
+        elif key != "_source":
+            body[key] = value
+
+    lines = [dumps({op_type: action}), b"\n"]
+    if op_type == "delete":
+        return lines
+
+    source = record.get("_source", body)
+    lines.append(source if isinstance(source, bytes) else dumps(source))
+    lines.append(b"\n")
+    return lines
+
+
+def to_bulk_body(records):
+    """
+    Serialize a batch of bulk records into an NDJSON request body.
+
+    """
+    return b"".join(
+        line
+        for record in records
+        for line in to_bulk_lines(record)
+    )
+
+
+def to_report(response):
+    """
+    Summarize a bulk response.
+
+    :returns: a report compatible with `elasticsearch.helpers.bulk` (with errors suppressed):
+              the number of successful items and the list of failed items
+
+    """
+    success, errors = 0, []
+    for item in response["items"]:
+        op_type, result = next(iter(item.items()))
+        if 200 <= result.get("status", 500) < 300:
+            success += 1
+        else:
+            errors.append({op_type: result})
+    return success, errors
+
+
+def send_bulk(client, records, **kwargs):
+    """
+    Send a batch of bulk records as a single NDJSON request.
+
+    :returns: a report compatible with `elasticsearch.helpers.bulk` (see `to_report`)
+
+    """
+    return send_bulk_body(client, to_bulk_body(records), **kwargs)
+
+
+def send_bulk_body(client, body, **kwargs):
+    """
+    Send an NDJSON bulk request body.
+
+    :returns: a report compatible with `elasticsearch.helpers.bulk` (see `to_report`)
+
+    """
+    return to_report(client.bulk(body=body, **kwargs))
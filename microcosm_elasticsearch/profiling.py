@@ -0,0 +1,146 @@
+"""
+Slow query logging and query profiling.
+
+Log searches whose server-side `took` exceeds a threshold with:
+
+    config.elasticsearch_slow_query_log.threshold_millis = 500
+
+Searches may also be profiled (`search(profile=True)`); the Elasticsearch profile API output
+is summarized into a per-shard breakdown of query, rewrite, collector and aggregation times.
+
+"""
+from logging import getLogger
+
+from microcosm.api import defaults
+from microcosm.config.validation import typed
+
+
+NANOS_PER_MILLI = 1000000
+
+
+@defaults(
+    threshold_millis=typed(int, default_value=None),
+)
+class SlowQueryLog:
+    """
+    Logs searches that are slower than a threshold, if configured.
+
+    """
+    def __init__(self, graph):
+        self.threshold_millis = graph.config.elasticsearch_slow_query_log.threshold_millis
+        self.logger = getLogger("microcosm_elasticsearch.slow_query")
+
+    @property
+    def enabled(self):
+        return self.threshold_millis is not None
+
+    def record(self, index_name, query, response):
+        """
+        Log a search, if its `took` exceeds the threshold.
+
+        Profiled searches (`profile=True`) also log each shard's query and total time (slowest shard first).
+
+        :param query: the executed `elasticsearch_dsl.Search` (or a dict describing the query)
+        :param response: the search response (raw or wrapped)
+
+        """
+        if not self.enabled:
+            return
+
+        took = get_took(response)
+        if took is None or took < self.threshold_millis:
+            return
+
+        # NB: only unwrap slow responses; wrapped responses are copied by `to_dict`
+        response = to_raw(response)
+        extra = dict(
+            index=index_name,
+            took=took,
+            query=query if isinstance(query, dict) else query.to_dict(),
+            shards=response.get("_shards"),
+            timed_out=response.get("timed_out"),
+        )
+        if "profile" in response:
+            extra["shard_timings"] = [
+                dict(id=shard["id"], query_millis=shard["query_millis"], total_millis=shard["total_millis"])
+                for shard in summarize_profile(response["profile"])
+            ]
+
+        self.logger.warning(
+            "Slow Elasticsearch query against %s took %sms",
+            index_name,
+            took,
+            extra=extra,
+        )
+
+
+def get_took(response):
+    """
+    The server-side `took` of a (raw or wrapped) search response.
+
+    """
+    if isinstance(response, dict):
+        return response.get("took")
+    return getattr(response, "took", None)
+
+
+def to_raw(response):
+    """
+    Unwrap an `elasticsearch_dsl` response, if necessary.
+
+    """
+    if isinstance(response, dict):
+        return response
+    return response.to_dict()
+
+
+def to_millis(nanos):
+    return nanos / NANOS_PER_MILLI
+
+
+def summarize_profile(profile):
+    """
+    Summarize profile API output into a per-shard breakdown, slowest shard first.
+
+    Times are in milliseconds; `queries` lists the top-level query components of each shard.
+
+    """
+    shards = [
+        summarize_shard(shard)
+        for shard in profile.get("shards", [])
+    ]
+    return sorted(shards, key=lambda shard: shard["total_millis"], reverse=True)
+
+
+def summarize_shard(shard):
+    searches = shard.get("searches", [])
+    queries = [
+        dict(
+            type=query["type"],
+            description=query["description"],
+            millis=to_millis(query["time_in_nanos"]),
+        )
+        for search in searches
+        for query in search.get("query", [])
+    ]
+    query_millis = sum(query["millis"] for query in queries)
+    rewrite_millis = sum(to_millis(search.get("rewrite_time", 0)) for search in searches)
+    collector_millis = sum(
+        to_millis(collector["time_in_nanos"])
+        for search in searches
+        for collector in search.get("collector", [])
+    )
+    aggregation_millis = sum(
+        to_millis(aggregation["time_in_nanos"])
+        for aggregation in shard.get("aggregations", [])
+    )
+
+    return dict(
+        id=shard["id"],
+        query_millis=query_millis,
+        rewrite_millis=rewrite_millis,
+        collector_millis=collector_millis,
+        aggregation_millis=aggregation_millis,
+        total_millis=query_millis + rewrite_millis + collector_millis + aggregation_millis,
+        queries=queries,
+    )
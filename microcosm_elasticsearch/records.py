@@ -0,0 +1,135 @@
+"""
+Lightweight read-only representations of models.
+
+Hydrating search hits as `Model` instances is convenient but costly: every instance
+carries `AttrDict` storage, meta objects and validation machinery. Records are compact,
+`__slots__`-based, read-only alternatives generated per model class from its declared fields.
+
+"""
+
+# Hit metadata retained by records
+RECORD_META_KEYS = ("_id", "_index", "_score", "_routing", "_seq_no", "_primary_term")
+
+
+class Record:
+    """
+    Base class for generated records.
+
+    """
+    __slots__ = ("_meta",)
+
+    # Populated per generated class
+    _model_class = None
+    _fields = ()
+    _decoders = {}
+
+    def __init__(self, source, meta=None):
+        decoders = self._decoders
+        for name in self._fields:
+            value = source.get(name)
+            if value is not None and name in decoders:
+                value = decoders[name](value)
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_meta", meta or {})
+
+    @classmethod
+    def from_hit(cls, hit):
+        return cls(
+            hit.get("_source", {}),
+            {key[1:]: hit[key] for key in RECORD_META_KEYS if key in hit},
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is read-only")
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self._fields
+        )
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return id(self) if self.id is None else hash(self.id)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(id={self.id!r})"
+
+    @property
+    def _id(self):
+        return self._meta.get("id")
+
+    @property
+    def _index(self):
+        return self._meta.get("index")
+
+    @property
+    def _score(self):
+        return self._meta.get("score")
+
+    @property
+    def _seq_no(self):
+        return self._meta.get("seq_no")
+
+    @property
+    def _primary_term(self):
+        return self._meta.get("primary_term")
+
+    def to_dict(self):
+        return {
+            name: getattr(self, name)
+            for name in self._fields
+            if getattr(self, name) is not None
+        }
+
+    def to_model(self):
+        """
+        Hydrate a full (mutable) model instance from this record.
+
+        """
+        return self._model_class(meta=dict(self._meta), **self.to_dict())
+
+
+_record_classes = {}
+
+
+def record_class_for(model_class):
+    """
+    Generate (and cache) the record class for a model class.
+
+    Records have one slot per declared field. Values of fields that coerce their data (e.g. `Date`,
+    `Object` and `EnumField`) are decoded the same way as when hydrating models (e.g. into datetimes
+    and enum members); other values are kept as returned by Elasticsearch.
+
+    """
+    try:
+        return _record_classes[model_class]
+    except KeyError:
+        pass
+
+    mapping = model_class._doc_type.mapping
+    fields = tuple(mapping)
+    decoders = {
+        name: mapping[name].deserialize
+        for name in fields
+        if mapping[name]._coerce
+    }
+
+    record_class = type(
+        f"{model_class.__name__}Record",
+        (Record,),
+        dict(
+            __slots__=fields,
+            __module__=model_class.__module__,
+            _model_class=model_class,
+            _fields=fields,
+            _decoders=decoders,
+        ),
+    )
+    _record_classes[model_class] = record_class
+    return record_class
@@ -6,6 +6,33 @@ from elasticsearch.exceptions import RequestError
 from elasticsearch_dsl import Index
 from inflection import underscore
 
+from microcosm_elasticsearch.errors import ElasticsearchMappingConflictError
+from microcosm_elasticsearch.mapping import diff_mapping
+
+
+# NB: Elasticsearch 6+ reports existing indexes as `resource_already_exists_exception`
+INDEX_ALREADY_EXISTS_ERRORS = ("index_already_exists_exception", "resource_already_exists_exception")
+
+
+def select_indexes(indexes, only=(), skip=()):
+    """
+    Select indexes by index (or alias) name.
+
+    :param only: if non-empty, the names of the indexes to include
+    :param skip: the names of indexes to exclude
+
+    """
+    only = set(only or [])
+    skip = set(skip or [])
+
+    for index in indexes:
+        aliases = set(index._aliases)
+        if only and (index._name not in only and not (aliases & only)):
+            continue
+        if skip and (index._name in skip or (aliases & skip)):
+            continue
+        yield index
+
 
 class IndexRegistry:
     """
@@ -59,20 +86,22 @@ class IndexRegistry:
         self.indexes[index_name] = index
         return index
 
-    def createall(self, force=False, only=(), skip=()):
+    def select(self, only=(), skip=()):
+        """
+        Select registered indexes by index (or alias) name (see `select_indexes`).
+
+        """
+        return select_indexes(self.indexes.values(), only=only, skip=skip)
+
+    def createall(self, force=False, only=(), skip=(), update_mappings=True):
         """
         Create all indexes in Elasticsearch.
 
+        Indexes that already exist have their mappings updated in place, if the change is
+        additive-compatible (see `update_mapping`).
+
         """
-        only = set(only or [])
-        skip = set(skip or [])
-
-        for index in self.indexes.values():
-            aliases = set(index._aliases)
-            if only and (index._name not in only and not (aliases & only)):
-                continue
-            if skip and (index._name in skip or (aliases & skip)):
-                continue
+        for index in self.select(only=only, skip=skip):
             if force and index.exists():
                 index.delete()
                 index.flush(ignore_unavailable=True)
@@ -80,10 +109,38 @@ class IndexRegistry:
                 index.create()
                 index.refresh()
             except RequestError as error:
-                if "index_already_exists_exception" in str(error):
+                if error.error in INDEX_ALREADY_EXISTS_ERRORS:
+                    if update_mappings:
+                        self.update_mapping(index)
                     continue
                 raise
 
+    def update_mapping(self, index):
+        """
+        Update the live mapping of an existing index to match its registered mapping.
+
+        Additive changes (e.g. new fields) are applied in place with `put_mapping`.
+
+        :raises `ElasticsearchMappingConflictError` if the change is breaking; these
+                require a new index version (and a reindex) or a forced recreate.
+        :returns: the computed `MappingDiff` or None if the index has no registered mapping
+
+        """
+        expected = index.to_dict().get("mappings")
+        if not expected:
+            return None
+
+        live = index.get_mapping()
+        # NB: the response is keyed by the concrete index name
+        actual = live.get(index._name, next(iter(live.values()), {})).get("mappings", {})
+
+        diff = diff_mapping(expected, actual)
+        if not diff.is_compatible:
+            raise ElasticsearchMappingConflictError(index._name, diff.conflicts)
+        if diff.has_changes:
+            index.put_mapping(body=diff.to_body())
+        return diff
+
     @staticmethod
     def name_for(graph, name=None, version=None):
         """
@@ -0,0 +1,243 @@
+"""
+Replay captured searches as a load test.
+
+Queries are read from an NDJSON file, one search per line:
+
+ -  `{"body": {...}}` sends a captured search body (to the line's `"index"`, if any)
+ -  `{"kwargs": {...}}` runs a `SearchIndex` search with the given arguments, including
+    query construction and hit hydration
+ -  any other object is sent as a search body
+
+Searches are replayed by `concurrency` workers, optionally paced at a fixed `rate` (searches per
+second, across workers). Pacing is open-loop: each search is scheduled at a fixed offset from the start
+and its latency is measured from its scheduled time, not from when a worker gets to send it. Searches
+delayed by busy workers (e.g. because of a slow cluster) therefore count their queueing delay as latency
+instead of quietly lowering the offered load.
+
+The report includes the client-observed latency, the server-side `took`, the queueing delay and the
+remaining (network and client-side) overhead as percentiles and a latency histogram, along with
+throughput and error counts. Replays work against any client, including the in-memory client and local stubs.
+
+See `main.replay_main` for a CLI entry point.
+
+"""
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from json import loads
+from threading import Lock
+from time import perf_counter, sleep
+
+from microcosm_elasticsearch.profiling import get_took
+
+
+PERCENTILES = (50, 95, 99)
+
+# Upper bounds (in milliseconds) of the latency histogram buckets
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def load_queries(path):
+    """
+    Load captured queries from an NDJSON file.
+
+    """
+    with open(path, "rb") as file:
+        return [loads(line) for line in file if line.strip()]
+
+
+def percentile(values, percentile):
+    """
+    The (nearest-rank) percentile of sorted values.
+
+    """
+    if not values:
+        return None
+    return values[min(int(len(values) * percentile / 100.0), len(values) - 1)]
+
+
+def summarize(values):
+    """
+    Summarize a distribution of latencies (in milliseconds).
+
+    """
+    values = sorted(values)
+    summary = {
+        f"p{value}": percentile(values, value)
+        for value in PERCENTILES
+    }
+    summary.update(
+        mean=sum(values) / len(values) if values else None,
+        max=values[-1] if values else None,
+    )
+    return summary
+
+
+def to_histogram(values):
+    """
+    Count latencies (in milliseconds) by histogram bucket, keyed by the bucket's upper bound.
+
+    """
+    counts = Counter(bisect_left(HISTOGRAM_BOUNDS, value) for value in values)
+    labels = [f"<={bound}" for bound in HISTOGRAM_BOUNDS] + [f">{HISTOGRAM_BOUNDS[-1]}"]
+    return {
+        label: counts[position]
+        for position, label in enumerate(labels)
+    }
+
+
+class Result:
+    """
+    The outcome of a replayed search.
+
+    """
+    def __init__(self, elapsed_millis, took_millis=None, error=None, queued_millis=0.0):
+        # NB: measured from the scheduled time of the search, including `queued_millis`
+        self.elapsed_millis = elapsed_millis
+        self.took_millis = took_millis
+        self.error = error
+        self.queued_millis = queued_millis
+
+
+class Replay:
+    """
+    Replays searches at a configurable concurrency and rate.
+
+    """
+    def __init__(
+        self,
+        elasticsearch_client,
+        index_name=None,
+        search_index=None,
+        concurrency=1,
+        rate=None,
+        read_only=False,
+        clock=perf_counter,
+        sleep=sleep,
+    ):
+        """
+        :param index_name: the index searched by captured bodies without an `"index"`
+        :param search_index: the `SearchIndex` that runs searches with captured `kwargs`
+        :param rate: the number of searches per second (across workers), if limited
+        :param read_only: whether searches with `kwargs` hydrate read-only records instead of models
+
+        """
+        self.elasticsearch_client = elasticsearch_client
+        self.index_name = index_name
+        self.search_index = search_index
+        self.concurrency = concurrency
+        self.rate = rate
+        self.read_only = read_only
+        self.clock = clock
+        self.sleep = sleep
+
+    def send(self, query):
+        """
+        Send a captured search.
+
+        :returns: the response
+
+        """
+        if "kwargs" in query:
+            if self.search_index is None:
+                raise ValueError("Replaying `kwargs` requires a search index")
+            kwargs = query["kwargs"]
+            response, _ = self.search_index._execute(
+                self.search_index._search(**kwargs),
+                read_only=self.read_only,
+                **kwargs
+            )
+            return response
+
+        return self.elasticsearch_client.search(
+            index=query.get("index", self.index_name),
+            body=query.get("body", query),
+        )
+
+    def replay(self, query, scheduled_at=None):
+        """
+        Send a search, measuring its latency from its scheduled time (if any).
+
+        """
+        sent_at = self.clock()
+        if scheduled_at is None:
+            scheduled_at = sent_at
+        queued_millis = max(sent_at - scheduled_at, 0) * 1000
+
+        try:
+            response = self.send(query)
+        except Exception as error:
+            return Result(
+                (self.clock() - scheduled_at) * 1000,
+                error=error.__class__.__name__,
+                queued_millis=queued_millis,
+            )
+        return Result(
+            (self.clock() - scheduled_at) * 1000,
+            took_millis=get_took(response),
+            queued_millis=queued_millis,
+        )
+
+    def run(self, queries, requests=None):
+        """
+        Replay searches, cycling through the queries until `requests` searches are sent.
+
+        :param requests: the number of searches; defaults to the number of queries
+        :returns: a report (see `report`)
+
+        """
+        requests = len(queries) if requests is None else requests
+        scheduled = enumerate(islice(cycle(queries), requests) if queries else [])
+        lock = Lock()
+        results = []
+        started_at = self.clock()
+
+        def work():
+            while True:
+                with lock:
+                    position, query = next(scheduled, (None, None))
+                if query is None:
+                    return
+
+                scheduled_at = None
+                if self.rate:
+                    scheduled_at = started_at + position / self.rate
+                    delay = scheduled_at - self.clock()
+                    if delay > 0:
+                        self.sleep(delay)
+
+                result = self.replay(query, scheduled_at)
+                with lock:
+                    results.append(result)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for future in [executor.submit(work) for _ in range(self.concurrency)]:
+                future.result()
+
+        return self.report(results, self.clock() - started_at)
+
+    def report(self, results, elapsed_seconds):
+        """
+        Summarize the results of a replay.
+
+        """
+        succeeded = [result for result in results if result.error is None]
+        timed = [result for result in succeeded if result.took_millis is not None]
+
+        return dict(
+            requests=len(results),
+            errors=len(results) - len(succeeded),
+            error_rate=(len(results) - len(succeeded)) / len(results) if results else 0.0,
+            error_types=dict(Counter(result.error for result in results if result.error is not None)),
+            seconds=elapsed_seconds,
+            throughput=len(results) / elapsed_seconds if elapsed_seconds > 0 else None,
+            client=summarize([result.elapsed_millis for result in succeeded]),
+            took=summarize([result.took_millis for result in timed]),
+            queue=summarize([result.queued_millis for result in succeeded]),
+            overhead=summarize([
+                max(result.elapsed_millis - result.queued_millis - result.took_millis, 0)
+                for result in timed
+            ]),
+            histogram=to_histogram([result.elapsed_millis for result in succeeded]),
+        )
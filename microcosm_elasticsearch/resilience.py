@@ -0,0 +1,539 @@
+"""
+Client-side protection against a degraded cluster.
+
+A circuit breaker tracks the outcomes of recent requests and rejects requests (without waiting
+for timeouts) while the cluster is failing; a concurrency limiter sheds load beyond a fixed number
+of in-flight requests. Both reject requests with a (retryable) `ElasticsearchUnavailableError`.
+
+Enable via the client configuration, e.g.:
+
+    config.elasticsearch_client.use_circuit_breaker = true
+    config.elasticsearch_client.max_in_flight = 50
+
+A retry policy retries idempotent operations after transient errors, e.g.:
+
+    config.elasticsearch_retry_policy.max_attempts = 3
+
+A hedging policy duplicates slow read-only requests, e.g.:
+
+    config.elasticsearch_hedging_policy.enabled = true
+
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from contextlib import contextmanager
+from functools import partial, wraps
+from random import random
+from threading import BoundedSemaphore, Lock
+from time import monotonic, perf_counter, sleep
+from uuid import uuid4
+
+from elasticsearch import Transport
+from elasticsearch.exceptions import ConnectionError, TransportError
+from microcosm.api import defaults
+from microcosm.config.types import boolean
+from microcosm.config.validation import typed
+
+from microcosm_elasticsearch.errors import ElasticsearchUnavailableError
+
+
+# Statuses that indicate an overloaded or unavailable cluster (rather than a bad request)
+UNAVAILABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# Statuses that indicate a transient condition (a request may succeed if retried)
+TRANSIENT_STATUSES = (429, 502, 503, 504)
+
+
+def is_failure(error):
+    """
+    Whether an error counts against the health of the cluster.
+
+    Client errors (e.g. not found, conflicts, bad requests) are healthy responses.
+
+    """
+    if isinstance(error, ConnectionError):
+        return True
+    if isinstance(error, TransportError):
+        return error.status_code in UNAVAILABLE_STATUSES
+    return False
+
+
+def is_transient(error):
+    """
+    Whether a request that failed with an error may succeed if retried.
+
+    """
+    if isinstance(error, ConnectionError):
+        return True
+    if isinstance(error, TransportError):
+        return error.status_code in TRANSIENT_STATUSES
+    return False
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker over the outcomes of requests to a cluster.
+
+     -  closed: requests are let through and the outcomes of the last `window_size` requests are tracked;
+        once at least `minimum_calls` are tracked and the rate of failures (errors and, optionally,
+        calls slower than `slow_call_millis`) reaches `failure_rate`, the breaker opens
+     -  open: requests are rejected for `open_seconds`
+     -  half open: up to `half_open_probes` requests are let through; a success closes the breaker
+        and a failure opens it again
+
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate=0.5,
+        minimum_calls=20,
+        window_size=50,
+        slow_call_millis=None,
+        open_seconds=30.0,
+        half_open_probes=1,
+        clock=monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.slow_call_millis = slow_call_millis
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+
+        self.lock = Lock()
+        self.outcomes = deque(maxlen=window_size)
+        self.state = CircuitBreaker.CLOSED
+        self.opened_at = None
+        self.probes = 0
+
+    def acquire(self):
+        """
+        Admit a request.
+
+        :raises `ElasticsearchUnavailableError` if the breaker rejects the request
+
+        """
+        with self.lock:
+            if self.state == CircuitBreaker.OPEN:
+                if self.clock() - self.opened_at < self.open_seconds:
+                    raise ElasticsearchUnavailableError("Elasticsearch circuit breaker is open")
+                self.state = CircuitBreaker.HALF_OPEN
+                self.probes = 0
+
+            if self.state == CircuitBreaker.HALF_OPEN:
+                if self.probes >= self.half_open_probes:
+                    raise ElasticsearchUnavailableError("Elasticsearch circuit breaker is half open")
+                self.probes += 1
+
+    def record(self, failed, elapsed_millis):
+        """
+        Record the outcome of an admitted request.
+
+        """
+        if self.slow_call_millis is not None and elapsed_millis >= self.slow_call_millis:
+            failed = True
+
+        with self.lock:
+            if self.state == CircuitBreaker.HALF_OPEN:
+                if failed:
+                    self.open()
+                else:
+                    self.close()
+            elif self.state == CircuitBreaker.CLOSED:
+                self.outcomes.append(failed)
+                if len(self.outcomes) >= self.minimum_calls:
+                    if sum(self.outcomes) / len(self.outcomes) >= self.failure_rate:
+                        self.open()
+
+    def open(self):
+        self.state = CircuitBreaker.OPEN
+        self.opened_at = self.clock()
+        self.outcomes.clear()
+
+    def close(self):
+        self.state = CircuitBreaker.CLOSED
+        self.outcomes.clear()
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of in-flight requests.
+
+    Requests beyond the cap wait up to `wait_millis` for a slot before being rejected.
+
+    """
+    def __init__(self, max_in_flight, wait_millis=0):
+        self.max_in_flight = max_in_flight
+        self.wait_millis = wait_millis
+        self.semaphore = BoundedSemaphore(max_in_flight)
+
+    @contextmanager
+    def limiting(self):
+        if self.wait_millis:
+            acquired = self.semaphore.acquire(timeout=self.wait_millis / 1000.0)
+        else:
+            acquired = self.semaphore.acquire(blocking=False)
+        if not acquired:
+            raise ElasticsearchUnavailableError(
+                f"Too many in-flight Elasticsearch requests (max: {self.max_in_flight})",
+            )
+        try:
+            yield
+        finally:
+            self.semaphore.release()
+
+
+class ResilientTransport(Transport):
+    """
+    A transport that applies a circuit breaker and/or a concurrency limiter to each request.
+
+    Each request is one outcome for the breaker, including the transport's own retries across nodes
+    (nodes that fail are separately marked dead by the connection pool).
+
+    """
+    def __init__(self, hosts, circuit_breaker=None, limiter=None, **kwargs):
+        super().__init__(hosts, **kwargs)
+        self.circuit_breaker = circuit_breaker
+        self.limiter = limiter
+
+    @contextmanager
+    def limiting(self):
+        if self.limiter is None:
+            yield
+            return
+        with self.limiter.limiting():
+            yield
+
+    def perform_request(self, method, url, headers=None, params=None, body=None):
+        with self.limiting():
+            if self.circuit_breaker is None:
+                return super().perform_request(method, url, headers=headers, params=params, body=body)
+
+            self.circuit_breaker.acquire()
+            started_at = perf_counter()
+            try:
+                result = super().perform_request(method, url, headers=headers, params=params, body=body)
+            except Exception as error:
+                self.circuit_breaker.record(is_failure(error), (perf_counter() - started_at) * 1000)
+                raise
+            self.circuit_breaker.record(False, (perf_counter() - started_at) * 1000)
+            return result
+
+
+class Budget:
+    """
+    A token bucket that limits extra requests (e.g. retries) to a fraction of operations.
+
+    Each operation earns `ratio` tokens, up to `tokens`; each extra request spends a token.
+
+    """
+    def __init__(self, ratio, tokens):
+        self.ratio = ratio
+        self.max_tokens = tokens
+        self.lock = Lock()
+        self.tokens = float(tokens)
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Retries operations after transient errors with exponential backoff and (full) jitter.
+
+    Retries are limited by a budget so that they don't amplify load on a struggling cluster:
+    each retry spends a token; each operation earns `budget_ratio` tokens, up to `budget_tokens`.
+
+    """
+    def __init__(
+        self,
+        max_attempts=1,
+        base_delay_millis=50,
+        max_delay_millis=2000,
+        budget_ratio=0.1,
+        budget_tokens=10,
+        sleep=sleep,
+        random=random,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay_millis = base_delay_millis
+        self.max_delay_millis = max_delay_millis
+        self.budget = Budget(budget_ratio, budget_tokens)
+        self.sleep = sleep
+        self.random = random
+
+    @property
+    def enabled(self):
+        return self.max_attempts > 1
+
+    def delay_millis(self, attempt):
+        """
+        The delay before retrying the `attempt`-th (failed) attempt.
+
+        """
+        return self.random() * min(self.max_delay_millis, self.base_delay_millis * 2 ** (attempt - 1))
+
+    def run(self, func, on_retry=None):
+        """
+        Run an (idempotent) operation, retrying after transient errors.
+
+        :param on_retry: a callback for each retried error, if any
+
+        """
+        if not self.enabled:
+            return func()
+
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except Exception as error:
+                if attempt >= self.max_attempts or not is_transient(error) or not self.budget.withdraw():
+                    raise
+                if on_retry is not None:
+                    on_retry(error)
+                self.sleep(self.delay_millis(attempt) / 1000.0)
+                attempt += 1
+
+
+@defaults(
+    max_attempts=typed(int, default_value=1),
+    base_delay_millis=typed(int, default_value=50),
+    max_delay_millis=typed(int, default_value=2000),
+    budget_ratio=typed(float, default_value=0.1),
+    budget_tokens=typed(int, default_value=10),
+)
+def configure_retry_policy(graph):
+    """
+    Configure the retry policy of idempotent operations.
+
+    Retries are disabled by default (`max_attempts` = 1).
+
+    """
+    return RetryPolicy(
+        max_attempts=graph.config.elasticsearch_retry_policy.max_attempts,
+        base_delay_millis=graph.config.elasticsearch_retry_policy.base_delay_millis,
+        max_delay_millis=graph.config.elasticsearch_retry_policy.max_delay_millis,
+        budget_ratio=graph.config.elasticsearch_retry_policy.budget_ratio,
+        budget_tokens=graph.config.elasticsearch_retry_policy.budget_tokens,
+    )
+
+
+def retried(operation, unless=None):
+    """
+    Retry an idempotent operation of a component with a `retry_policy`.
+
+    As this decorator is meant to wrap `translate_elasticsearch_errors`, it sees the (untranslated)
+    transport errors. Retries are counted via the component's `elasticsearch_metrics`, if enabled.
+
+    :param unless: a predicate of the operation's arguments for calls that are not idempotent
+                   (e.g. conditional writes) and must not be retried
+
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if unless is not None and unless(*args, **kwargs):
+                return func(self, *args, **kwargs)
+
+            def on_retry(error):
+                if self.elasticsearch_metrics.enabled:
+                    self.elasticsearch_metrics.increment(
+                        operation,
+                        "retry",
+                        self.metrics_tags(**kwargs) + [f"error:{error.__class__.__name__}"],
+                    )
+
+            return self.retry_policy.run(partial(func, self, *args, **kwargs), on_retry=on_retry)
+        return wrapper
+    return decorator
+
+
+class LatencyTracker:
+    """
+    Tracks the latencies of the last `window_size` requests.
+
+    """
+    def __init__(self, window_size=1000):
+        self.lock = Lock()
+        self.latencies = deque(maxlen=window_size)
+
+    def __len__(self):
+        return len(self.latencies)
+
+    def record(self, elapsed_millis):
+        with self.lock:
+            self.latencies.append(elapsed_millis)
+
+    def percentile(self, percentile):
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(int(len(latencies) * percentile / 100.0), len(latencies) - 1)]
+
+
+def hedge_preference(preference):
+    """
+    The `preference` of a hedged request: a different (custom) value than the original request's,
+    so that the request is likely served by different shard copies.
+
+    """
+    if preference is None or preference.startswith("_"):
+        return uuid4().hex
+    return f"{preference}:hedge"
+
+
+class HedgingPolicy:
+    """
+    Hedges slow read-only requests.
+
+    If a request has not completed after the `percentile` of recent latencies (but at least
+    `min_delay_millis`), a duplicate is sent with a different `preference` and the first successful
+    response wins. Requests are not hedged until `minimum_samples` latencies are tracked.
+
+    Hedges are limited by a budget (see `Budget`) so that they don't amplify load on a slow cluster.
+
+    Requests that can't be hedged run on the caller's thread. Otherwise, the request and its hedge
+    each need one of `max_workers` threads: work is never queued, so when all threads are busy
+    requests run on the caller's thread and hedges are dropped.
+
+    """
+    def __init__(
+        self,
+        enabled=False,
+        percentile=95,
+        min_delay_millis=10,
+        minimum_samples=100,
+        window_size=1000,
+        budget_ratio=0.05,
+        budget_tokens=10,
+        max_workers=16,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay_millis = min_delay_millis
+        self.minimum_samples = minimum_samples
+        self.latencies = LatencyTracker(window_size)
+        self.budget = Budget(budget_ratio, budget_tokens)
+        self.max_workers = max_workers
+        self.workers = BoundedSemaphore(max_workers)
+        self.executor = None
+        self.lock = Lock()
+
+    def delay_millis(self):
+        """
+        The delay before hedging a request, if requests are hedged.
+
+        """
+        if len(self.latencies) < self.minimum_samples:
+            return None
+        return max(self.latencies.percentile(self.percentile), self.min_delay_millis)
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="elasticsearch-hedging",
+                )
+            return self.executor
+
+    def submit(self, func, *args):
+        """
+        Submit a function if a worker thread is free (without queueing).
+
+        :returns: a future, or None if all workers are busy
+
+        """
+        if not self.workers.acquire(blocking=False):
+            return None
+        future = self.get_executor().submit(func, *args)
+        future.add_done_callback(lambda _: self.workers.release())
+        return future
+
+    def run(self, func, preference=None, on_hedge=None):
+        """
+        Run a read-only request, hedging it if it is slow.
+
+        :param func: a function that sends the request with a given `preference`
+        :param preference: the `preference` of the request, if any
+        :param on_hedge: a callback for each hedged request, if any
+
+        """
+        if not self.enabled:
+            return func(preference)
+
+        self.budget.deposit()
+        delay_millis = self.delay_millis()
+        started_at = perf_counter()
+
+        primary = None if delay_millis is None else self.submit(func, preference)
+        if primary is None:
+            result = func(preference)
+            self.latencies.record((perf_counter() - started_at) * 1000)
+            return result
+
+        primary.add_done_callback(lambda _: self.latencies.record((perf_counter() - started_at) * 1000))
+
+        try:
+            return primary.result(timeout=delay_millis / 1000.0)
+        except TimeoutError:
+            pass
+
+        if not self.budget.withdraw():
+            return primary.result()
+
+        hedge = self.submit(func, hedge_preference(preference))
+        if hedge is None:
+            # NB: all workers are busy (e.g. the cluster is slow); the token is spent regardless
+            return primary.result()
+
+        if on_hedge is not None:
+            on_hedge()
+
+        for future in as_completed([primary, hedge]):
+            if future.exception() is None:
+                return future.result()
+        return primary.result()
+
+
+@defaults(
+    enabled=typed(boolean, default_value=False),
+    percentile=typed(int, default_value=95),
+    min_delay_millis=typed(int, default_value=10),
+    minimum_samples=typed(int, default_value=100),
+    window_size=typed(int, default_value=1000),
+    budget_ratio=typed(float, default_value=0.05),
+    budget_tokens=typed(int, default_value=10),
+    max_workers=typed(int, default_value=16),
+)
+def configure_hedging_policy(graph):
+    """
+    Configure the hedging policy of read-only requests.
+
+    Hedging is disabled by default.
+
+    """
+    return HedgingPolicy(
+        enabled=graph.config.elasticsearch_hedging_policy.enabled,
+        percentile=graph.config.elasticsearch_hedging_policy.percentile,
+        min_delay_millis=graph.config.elasticsearch_hedging_policy.min_delay_millis,
+        minimum_samples=graph.config.elasticsearch_hedging_policy.minimum_samples,
+        window_size=graph.config.elasticsearch_hedging_policy.window_size,
+        budget_ratio=graph.config.elasticsearch_hedging_policy.budget_ratio,
+        budget_tokens=graph.config.elasticsearch_hedging_policy.budget_tokens,
+        max_workers=graph.config.elasticsearch_hedging_policy.max_workers,
+    )
@@ -0,0 +1,98 @@
+"""
+Server-side partial updates.
+
+Scripted updates modify a stored document in a single request (without reading it first),
+which is useful for counters and set-like fields.
+
+"""
+
+
+# NB: the store keeps `updated_at` current for scripted updates by prefixing this statement
+TOUCH_SCRIPT = "ctx._source.updated_at = params.updated_at;"
+
+INCREMENT_SCRIPT = (
+    "ctx._source[params.field] = (ctx._source[params.field] ?: 0) + params.value"
+)
+
+ADD_TO_SET_SCRIPT = (
+    "if (ctx._source[params.field] == null) { ctx._source[params.field] = []; } "
+    "if (ctx._source[params.field].contains(params.value)) { ctx.op = 'noop'; } "
+    "else { ctx._source[params.field].add(params.value); }"
+)
+
+
+class ScriptedUpdate:
+    """
+    A partial update of a stored model that runs as a (painless) script.
+
+    May be passed to `Store.bulk` as an "update" action.
+
+    """
+    def __init__(
+        self,
+        identifier,
+        script,
+        params=None,
+        upsert=None,
+        routing=None,
+        retry_on_conflict=None,
+        lang="painless",
+    ):
+        """
+        :param identifier: the id of the model to update
+        :param script: the script source; the document is available as `ctx._source`
+        :param params: script parameters, available as `params`
+        :param upsert: a model to create if there is no existing model
+        :param routing: the custom routing value of the model, if any
+        :param retry_on_conflict: the number of times Elasticsearch retries on version conflicts
+
+        """
+        self.id = identifier
+        self.script = script
+        self.params = params or {}
+        self.upsert = upsert
+        self.routing = routing
+        self.retry_on_conflict = retry_on_conflict
+        self.lang = lang
+
+    def get_routing(self):
+        if self.routing is None and self.upsert is not None:
+            return self.upsert.get_routing()
+        return self.routing
+
+    def to_script(self, updated_at):
+        """
+        Generate the script definition, keeping `updated_at` current.
+
+        """
+        return dict(
+            source=f"{TOUCH_SCRIPT} {self.script}",
+            lang=self.lang,
+            params=dict(self.params, updated_at=updated_at),
+        )
+
+
+def increment(identifier, field, value=1, **kwargs):
+    """
+    Increment a numeric field, treating a missing value as zero.
+
+    """
+    return ScriptedUpdate(
+        identifier,
+        INCREMENT_SCRIPT,
+        params=dict(field=field, value=value),
+        **kwargs
+    )
+
+
+def add_to_set(identifier, field, value, **kwargs):
+    """
+    Append a value to a list field unless it is already present.
+
+    """
+    return ScriptedUpdate(
+        identifier,
+        ADD_TO_SET_SCRIPT,
+        params=dict(field=field, value=value),
+        **kwargs
+    )
@@ -2,7 +2,23 @@
 Index search.
 
 """
+from time import perf_counter
+
+from elasticsearch.helpers import scan
+from elasticsearch_dsl.response import Response
+
+from microcosm_elasticsearch.columnar import DEFAULT_BATCH_SIZE, iter_column_batches
 from microcosm_elasticsearch.errors import translate_elasticsearch_errors
+from microcosm_elasticsearch.metrics import instrumented
+from microcosm_elasticsearch.profiling import summarize_profile, to_raw
+from microcosm_elasticsearch.records import record_class_for
+from microcosm_elasticsearch.resilience import retried
+from microcosm_elasticsearch.tasks import DEFAULT_POLL_INTERVAL_SECONDS, wait_for_task
+from microcosm_elasticsearch.templates import QueryTemplate
+
+
+# Let Elasticsearch choose a sensible number of slices for by-query operations
+DEFAULT_SLICES = "auto"
 
 
 class SearchIndex:
@@ -28,6 +44,37 @@ class SearchIndex:
         """
         return "doctype"
 
+    @property
+    def seq_no_primary_term(self):
+        """
+        Defines whether hits carry `seq_no` and `primary_term` for optimistic concurrency control
+
+        """
+        return True
+
+    @property
+    def request_cache(self):
+        """
+        Defines whether size=0 queries (counts and aggregations) use the shard request cache
+
+        None defers to the index setting (`index.requests.cache.enable`).
+
+        """
+        return None
+
+    def get_preference(self, preference=None, **kwargs):
+        """
+        Resolve the `preference` of a query.
+
+        Override to route the queries of a tenant or user to the same shard copies, so that identical
+        queries hit the shard request cache (and warm file system caches). For example:
+
+            def get_preference(self, preference=None, tenant_id=None, **kwargs):
+                return preference or tenant_id
+
+        """
+        return preference
+
     def __init__(self, graph, index, doc_type=None):
         """
         :param graph: the object graph
@@ -36,6 +83,10 @@ class SearchIndex:
 
         """
         self.elasticsearch_client = graph.elasticsearch_client
+        self.elasticsearch_metrics = graph.elasticsearch_metrics
+        self.retry_policy = graph.elasticsearch_retry_policy
+        self.hedging_policy = graph.elasticsearch_hedging_policy
+        self.slow_query_log = graph.elasticsearch_slow_query_log
         self.index = index
         # Mapping from ES custom type field to corresponding model class
         self.doc_types = dict()
@@ -50,50 +101,338 @@ class SearchIndex:
     def index_name(self):
         return self.index._name
 
+    def metrics_tags(self, doc_type=None, **kwargs):
+        """
+        Tag the metrics of an operation (see `metrics.py`).
+
+        Searches are tagged by the requested doc type or, if there is only one, the registered doc type.
+
+        """
+        if doc_type is None and len(self.doc_types) == 1:
+            doc_type = next(iter(self.doc_types))
+        return [
+            f"index:{self.index_name}",
+            f"model:{doc_type or 'any'}",
+        ]
+
+    @instrumented("count")
+    @retried("count")
     @translate_elasticsearch_errors
     def count(self, **kwargs):
         """
         Count the number of models matching some criterion.
 
+        :param request_cache: whether to use the shard request cache, if not the search index's default
+
         """
         query = self._search(**kwargs)
-        return query.count()
+        return self._count(query, **kwargs)
 
+    @instrumented("search")
+    @retried("search")
     @translate_elasticsearch_errors
-    def search(self, **kwargs):
+    def search(self, read_only=False, profile=False, **kwargs):
         """
         Return the list of models matching some criterion.
 
         :param offset: pagination offset, if any
         :param limit: pagination limit, if any
+        :param routing: custom routing value(s), if any, to restrict the search to matching shards
+        :param preference: a stable value (e.g. a user or session id), if any, to route repeated
+                           searches to the same shard copies (keeping their caches warm)
+        :param read_only: return compact read-only records instead of models (see `records.py`)
+        :param profile: profile the search; returns the list and a per-shard timing breakdown
+                        (see `profiling.py`)
 
         """
-        query = self._search(**kwargs)
-        results = query.execute()
+        query = self._search(profile=profile, **kwargs)
+        response, items = self._execute(query, read_only=read_only, **kwargs)
 
-        return self._to_list(results)
+        if profile:
+            return items, summarize_profile(to_raw(response).get("profile", {}))
 
-    def search_with_count(self, **kwargs):
+        return items
+
+    @instrumented("search_with_count")
+    @retried("search_with_count")
+    def search_with_count(self, read_only=False, **kwargs):
         """
         Return the list of models matching some criterion.
 
         :param offset: pagination offset, if any
         :param limit: pagination limit, if any
+        :param read_only: return compact read-only records instead of models (see `records.py`)
 
         """
         query = self._search(**kwargs)
-        results = query.execute()
+        response, items = self._execute(query, read_only=read_only, **kwargs)
+
+        if read_only:
+            total = response["hits"]["total"]
+            count = total["value"] if total["relation"] == "eq" else self._count(query, **kwargs)
+            return items, count
+
+        return items, self._count(query, **kwargs)
+
+    @instrumented("search_template")
+    @retried("search_template")
+    @translate_elasticsearch_errors
+    def search_template(self, template, params=None, read_only=False, routing=None, preference=None, **kwargs):
+        """
+        Return the list of models matching a query template (see `templates.py`).
+
+        The query is not built via `_search`: its ordering, filters and hit options (e.g. `seq_no_primary_term`)
+        must be part of the template.
+
+        :param template: a `QueryTemplate`
+        :param params: the template's parameter values
+        :param read_only: return compact read-only records instead of models (see `records.py`)
+
+        """
+        tags = self.metrics_tags(**kwargs)
+        request_params = dict()
+        if routing is not None:
+            request_params["routing"] = self._routing_param(routing)
+
+        if template.id is None:
+            body = template.render(params)
+
+            def send(preference):
+                return self.elasticsearch_client.search(
+                    index=self.index_name,
+                    body=body,
+                    preference=preference,
+                    **request_params
+                )
+        else:
+            body = dict(id=template.id, params=template.resolve(params))
+
+            def send(preference):
+                return self.elasticsearch_client.search_template(
+                    index=self.index_name,
+                    body=body,
+                    preference=preference,
+                    **request_params
+                )
+
+        started_at = perf_counter()
+        response = self._hedged(
+            "search_template",
+            send,
+            self.get_preference(preference=preference, **kwargs),
+            kwargs,
+        )
+        self.elasticsearch_metrics.record_response("search_template", started_at, response, tags)
+        self.slow_query_log.record(self.index_name, dict(template=template.name, params=params), response)
+
+        with self.elasticsearch_metrics.timing("search_template", "hydrate", tags):
+            if read_only:
+                return self._to_records(response)
+            return self._to_list(Response(self._query(), response))
+
+    @translate_elasticsearch_errors
+    def put_templates(self):
+        """
+        Store the (stored) query templates declared on this search index in the cluster.
+
+        """
+        for template in self.templates:
+            self.elasticsearch_client.put_script(id=template.id, body=template.to_script())
+
+    @property
+    def templates(self):
+        """
+        The stored query templates declared (as class attributes) on this search index.
+
+        """
+        templates = []
+        for name in dir(type(self)):
+            value = getattr(type(self), name)
+            if isinstance(value, QueryTemplate) and value.id is not None:
+                templates.append(value)
+        return templates
+
+    @instrumented("aggregate")
+    @retried("aggregate")
+    @translate_elasticsearch_errors
+    def aggregate(self, aggs, request_cache=None, **kwargs):
+        """
+        Aggregate the models matching some criterion (without returning any hits).
+
+        :param aggs: the aggregations, e.g. `dict(by_last=dict(terms=dict(field="last")))`
+        :param request_cache: whether to use the shard request cache, if not the search index's default
+        :returns: the aggregations of the response
+
+        """
+        query = self._search(**kwargs).sort().extra(from_=0, size=0, aggs=aggs)
+        query = self._with_request_cache(query, request_cache)
+        response = self._send("aggregate", query, self._execute_raw, **kwargs)
+        self.slow_query_log.record(self.index_name, query, response)
+        return response["aggregations"]
+
+    @translate_elasticsearch_errors
+    def request_cache_stats(self):
+        """
+        Shard request cache statistics of the index (e.g. to measure the effect of `preference`).
+
+        :returns: the hit and miss counts, hit rate, evictions and memory size of the cache
+
+        """
+        response = self.elasticsearch_client.indices.stats(index=self.index_name, metric="request_cache")
+        stats = response["_all"]["total"].get("request_cache", {})
+        hit_count = stats.get("hit_count", 0)
+        miss_count = stats.get("miss_count", 0)
+        total = hit_count + miss_count
+        return dict(
+            hit_count=hit_count,
+            miss_count=miss_count,
+            hit_rate=hit_count / total if total else None,
+            evictions=stats.get("evictions", 0),
+            memory_size_in_bytes=stats.get("memory_size_in_bytes", 0),
+        )
+
+    @translate_elasticsearch_errors
+    def iter_columns(self, model_class, fields=None, batch_size=DEFAULT_BATCH_SIZE, **kwargs):
+        """
+        Stream all models matching some criterion as batches of columns (see `columnar.py`).
+
+        Hits are scrolled (unordered) and projected onto the requested fields; no models are created.
+
+        :param model_class: the model class whose declared fields define the columns
+        :param fields: the names of the fields to include; defaults to all declared fields
+        :param batch_size: the maximum number of rows per batch
+
+        """
+        query = self._matching(**kwargs)
+        query = query.source(list(fields or model_class._doc_type.mapping))
+
+        hits = scan(
+            self.elasticsearch_client,
+            query=query.to_dict(),
+            index=self.index_name,
+            size=batch_size,
+            **query._params
+        )
+        yield from iter_column_batches(
+            hits,
+            model_class,
+            fields=fields,
+            batch_size=batch_size,
+        )
 
-        return self._to_list(results), query.count()
+    @translate_elasticsearch_errors
+    def delete_matching(self, **kwargs):
+        """
+        Delete the models matching some criterion server-side.
+
+        See `_by_query` for task execution options.
+
+        """
+        return self._by_query(self.elasticsearch_client.delete_by_query, **kwargs)
+
+    @translate_elasticsearch_errors
+    def update_matching(self, script=None, **kwargs):
+        """
+        Update the models matching some criterion server-side.
+
+        Without a script, matching models are reindexed in place (e.g. to pick up new mapping fields).
+
+        :param script: a script definition, if any
+
+        See `_by_query` for task execution options.
+
+        """
+        body = dict(script=script) if script is not None else {}
+        return self._by_query(self.elasticsearch_client.update_by_query, body=body, **kwargs)
+
+    def _by_query(
+        self,
+        func,
+        body=None,
+        conflicts="abort",
+        slices=DEFAULT_SLICES,
+        requests_per_second=None,
+        wait=True,
+        poll_interval_seconds=DEFAULT_POLL_INTERVAL_SECONDS,
+        progress=None,
+        **kwargs
+    ):
+        """
+        Run a by-query operation as a (sliced, optionally throttled) task.
+
+        :param conflicts: whether to "abort" or "proceed" on version conflicts
+        :param slices: the number of slices to parallelize the operation into
+        :param requests_per_second: a throttle for the operation, if any
+        :param wait: whether to wait for the task to complete; otherwise return its id
+        :param progress: a function that is called with the task status while waiting, if any
+
+        """
+        query = self._matching(**kwargs)
+        response = func(
+            index=self.index_name,
+            body=dict(
+                body or {},
+                query=query.to_dict(count=True).get("query", dict(match_all={})),
+            ),
+            conflicts=conflicts,
+            slices=slices,
+            requests_per_second=requests_per_second,
+            wait_for_completion=False,
+            **query._params
+        )
+        if not wait:
+            return response["task"]
+
+        return wait_for_task(
+            self.elasticsearch_client,
+            response["task"],
+            poll_interval_seconds=poll_interval_seconds,
+            progress=progress,
+        )
+
+    def _matching(self, routing=None, preference=None, **kwargs):
+        """
+        Create a query for models matching some criterion, without ordering.
 
-    def _search(self, explain=False, **kwargs):
+        """
+        query = self._query()
+        query = self._filter(query, **kwargs)
+        if routing is not None:
+            query = query.params(routing=self._routing_param(routing))
+        preference = self.get_preference(preference=preference, **kwargs)
+        if preference is not None:
+            query = query.params(preference=preference)
+        return query
+
+    def _search(self, explain=False, profile=False, routing=None, preference=None, **kwargs):
         query = self._query()
         query = self._order_by(query, **kwargs)
         query = self._filter(query, **kwargs)
         if explain:
             query = query.extra(explain=True)
+        if profile:
+            query = query.extra(profile=True)
+        if self.seq_no_primary_term:
+            query = query.extra(seq_no_primary_term=True)
+        if routing is not None:
+            query = query.params(routing=self._routing_param(routing))
+        preference = self.get_preference(preference=preference, **kwargs)
+        if preference is not None:
+            query = query.params(preference=preference)
         return query
 
+    def _with_request_cache(self, query, request_cache=None):
+        if request_cache is None:
+            request_cache = self.request_cache
+        if request_cache is None:
+            return query
+        return query.params(request_cache=request_cache)
+
+    def _routing_param(self, routing):
+        if isinstance(routing, (list, tuple, set)):
+            return ",".join(str(value) for value in routing)
+        return str(routing)
+
     def _to_instance(self, hit):
         """
         Resolve this hit into a model instance.
@@ -116,6 +455,106 @@ class SearchIndex:
             for hit in results.hits
         ]
 
+    def _execute(self, query, read_only=False, **kwargs):
+        """
+        Execute a search query, recording its metrics (and logging it if slow).
+
+        :returns: the response and its hits as a list of models (or records)
+
+        """
+        tags = self.metrics_tags(**kwargs)
+        started_at = perf_counter()
+
+        if read_only:
+            response = self._send("search", query, self._execute_raw, **kwargs)
+        else:
+            response = self._send("search", query, lambda query: query.execute(), **kwargs)
+
+        self.elasticsearch_metrics.record_response("search", started_at, response, tags)
+        self.slow_query_log.record(self.index_name, query, response)
+
+        with self.elasticsearch_metrics.timing("search", "hydrate", tags):
+            if read_only:
+                return response, self._to_records(response)
+            return response, self._to_list(response)
+
+    def _count(self, query, request_cache=None, **kwargs):
+        """
+        Count the hits of a query.
+
+        The count API does not accept `request_cache`; when caching is requested explicitly,
+        counts are sent as (equivalent) size=0 searches instead.
+
+        """
+        if request_cache is None:
+            request_cache = self.request_cache
+        if request_cache is None:
+            return self._send("count", query, lambda query: query.count(), **kwargs)
+
+        query = query.sort().extra(from_=0, size=0, track_total_hits=True).params(request_cache=request_cache)
+        response = self._send("count", query, self._execute_raw, **kwargs)
+        return response["hits"]["total"]["value"]
+
+    def _send(self, operation, query, send, **kwargs):
+        """
+        Send a read-only request for a query, hedging it if it is slow (see `HedgingPolicy`).
+
+        :param send: a function that sends the request for a query
+
+        """
+        def send_with(preference):
+            if preference == query._params.get("preference"):
+                return send(query)
+            return send(query.params(preference=preference))
+
+        return self._hedged(operation, send_with, query._params.get("preference"), kwargs)
+
+    def _hedged(self, operation, send, preference, kwargs):
+        """
+        Send a read-only request, hedging it if it is slow (see `HedgingPolicy`).
+
+        :param send: a function that sends the request with a given `preference`
+        :param kwargs: the arguments of the operation (for metrics tags)
+
+        """
+        def on_hedge():
+            self.elasticsearch_metrics.increment(operation, "hedge", self.metrics_tags(**kwargs))
+
+        return self.hedging_policy.run(send, preference=preference, on_hedge=on_hedge)
+
+    def _execute_raw(self, query):
+        """
+        Execute a search query, without wrapping the response.
+
+        """
+        return self.elasticsearch_client.search(
+            index=query._index,
+            body=query.to_dict(),
+            **query._params
+        )
+
+    def _to_record(self, hit):
+        """
+        Resolve this (raw) hit into a read-only record.
+
+        """
+        hit_doc_type = hit.get("_source", {}).get(self.doc_type_field)
+        hit_model_class = self.doc_types.get(hit_doc_type)
+        if hit_doc_type is not None and hit_model_class is not None:
+            return record_class_for(hit_model_class).from_hit(hit)
+        # Will return the raw hit
+        return hit
+
+    def _to_records(self, response):
+        """
+        Resolve a (raw) search response into a list of read-only records.
+
+        """
+        return [
+            self._to_record(hit)
+            for hit in response["hits"]["hits"]
+        ]
+
     def _query(self):
         """
         Create a search query.
@@ -0,0 +1,231 @@
+"""
+Periodic export of index and cluster stats to `microcosm-metrics` gauges.
+
+Polls `_stats` (for the indexes in the `IndexRegistry`), `_cluster/health` and `_nodes/stats` and
+publishes gauges so that dashboards can correlate application latency with cluster pressure:
+
+ -  per index: indexing and query rates (per second), indexing and query latencies (milliseconds),
+    refresh and merge times (milliseconds per second), doc count and store size
+ -  per thread pool (e.g. `search`, `write`): rejected tasks (per second), queued and active tasks
+ -  for the cluster: status (0 = green, 1 = yellow, 2 = red), unassigned shards and pending tasks
+
+Rates and latencies are computed from successive samples, so they are published from the second
+sample on. Run the exporter in the background (`start`) or from a CLI (see `main.export_stats_main`).
+
+"""
+from logging import getLogger
+from threading import Event, Thread
+from time import monotonic
+
+from microcosm.api import defaults
+from microcosm.config.validation import typed
+from microcosm_metrics.naming import name_for
+
+
+PREFIX = "elasticsearch"
+
+INDEX_METRICS = "docs,store,indexing,search,refresh,merge"
+
+CLUSTER_STATUSES = dict(green=0, yellow=1, red=2)
+
+# (gauge, stats section, counter) of counters published as per second rates
+INDEX_RATES = [
+    ("indexing_rate", "indexing", "index_total"),
+    ("query_rate", "search", "query_total"),
+    ("refresh_time", "refresh", "total_time_in_millis"),
+    ("merge_time", "merges", "total_time_in_millis"),
+]
+
+# (gauge, stats section, time counter, count counter) of per operation latencies
+INDEX_LATENCIES = [
+    ("indexing_latency", "indexing", "index_time_in_millis", "index_total"),
+    ("query_latency", "search", "query_time_in_millis", "query_total"),
+]
+
+
+def get_counter(stats, section, key):
+    return stats.get("total", {}).get(section, {}).get(key)
+
+
+def to_delta(current, previous):
+    """
+    The change of a counter between samples; None if it is unavailable or was reset (e.g. by a restart).
+
+    """
+    if current is None or previous is None or current < previous:
+        return None
+    return current - previous
+
+
+def to_ratio(numerator, denominator):
+    if numerator is None or not denominator:
+        return None
+    return numerator / denominator
+
+
+class Sample:
+    """
+    Stats collected at a point in time.
+
+    """
+    def __init__(self, taken_at, indices, health, thread_pools):
+        self.taken_at = taken_at
+        # index name => stats
+        self.indices = indices
+        self.health = health
+        # thread pool name => (summed over nodes) stats
+        self.thread_pools = thread_pools
+
+
+def sum_thread_pools(nodes_stats):
+    """
+    Sum the thread pool stats of all nodes.
+
+    """
+    thread_pools = dict()
+    for node in nodes_stats.get("nodes", {}).values():
+        for name, pool in node.get("thread_pool", {}).items():
+            totals = thread_pools.setdefault(name, dict(rejected=0, queue=0, active=0))
+            for key in totals:
+                totals[key] += pool.get(key, 0)
+    return thread_pools
+
+
+@defaults(
+    interval_seconds=typed(int, default_value=60),
+)
+class StatsExporter:
+    """
+    Exports index and cluster stats as gauges.
+
+    """
+    def __init__(self, graph, clock=monotonic):
+        self.graph = graph
+        self.elasticsearch_client = graph.elasticsearch_client
+        self.index_registry = graph.elasticsearch_index_registry
+        self.interval_seconds = graph.config.elasticsearch_stats_exporter.interval_seconds
+        self.clock = clock
+
+        self.logger = getLogger("microcosm_elasticsearch.stats")
+        self.previous = None
+        self.stopped = Event()
+        self.thread = None
+
+    @property
+    def metrics(self):
+        return self.graph.metrics
+
+    def gauge(self, key, value, tags):
+        if value is not None:
+            self.metrics.gauge(name_for(PREFIX, key), value, tags=tags)
+
+    def sample(self):
+        """
+        Collect the current stats.
+
+        """
+        index_names = ",".join(index._name for index in self.index_registry.indexes.values())
+        indices = dict()
+        if index_names:
+            response = self.elasticsearch_client.indices.stats(index=index_names, metric=INDEX_METRICS)
+            indices = response["indices"]
+
+        return Sample(
+            taken_at=self.clock(),
+            indices=indices,
+            health=self.elasticsearch_client.cluster.health(),
+            thread_pools=sum_thread_pools(self.elasticsearch_client.nodes.stats(metric="thread_pool")),
+        )
+
+    def export(self):
+        """
+        Collect the current stats and publish them (and rates since the previous sample).
+
+        """
+        sample = self.sample()
+        previous, self.previous = self.previous, sample
+
+        elapsed_seconds = sample.taken_at - previous.taken_at if previous else None
+
+        self.export_cluster(sample)
+        for name, stats in sample.indices.items():
+            previous_stats = previous.indices.get(name) if previous else None
+            self.export_index(name, stats, previous_stats, elapsed_seconds)
+        for name, stats in sample.thread_pools.items():
+            previous_stats = previous.thread_pools.get(name) if previous else None
+            self.export_thread_pool(name, stats, previous_stats, elapsed_seconds)
+        return sample
+
+    def export_cluster(self, sample):
+        tags = [f"cluster:{sample.health.get('cluster_name')}"]
+        self.gauge("cluster.status", CLUSTER_STATUSES.get(sample.health.get("status")), tags)
+        self.gauge("cluster.unassigned_shards", sample.health.get("unassigned_shards"), tags)
+        self.gauge("cluster.pending_tasks", sample.health.get("number_of_pending_tasks"), tags)
+
+    def export_index(self, name, stats, previous_stats, elapsed_seconds):
+        tags = [f"index:{name}"]
+        self.gauge("index.doc_count", stats.get("primaries", {}).get("docs", {}).get("count"), tags)
+        self.gauge("index.store_size", get_counter(stats, "store", "size_in_bytes"), tags)
+
+        if previous_stats is None:
+            return
+
+        def delta(section, counter):
+            return to_delta(get_counter(stats, section, counter), get_counter(previous_stats, section, counter))
+
+        for key, section, counter in INDEX_RATES:
+            self.gauge(f"index.{key}", to_ratio(delta(section, counter), elapsed_seconds), tags)
+
+        for key, section, time_counter, count_counter in INDEX_LATENCIES:
+            # NB: the mean latency of the operations between samples
+            self.gauge(
+                f"index.{key}",
+                to_ratio(delta(section, time_counter), delta(section, count_counter)),
+                tags,
+            )
+
+    def export_thread_pool(self, name, stats, previous_stats, elapsed_seconds):
+        tags = [f"thread_pool:{name}"]
+        self.gauge("thread_pool.queue", stats["queue"], tags)
+        self.gauge("thread_pool.active", stats["active"], tags)
+
+        if previous_stats is None:
+            return
+
+        self.gauge(
+            "thread_pool.rejected_rate",
+            to_ratio(to_delta(stats["rejected"], previous_stats["rejected"]), elapsed_seconds),
+            tags,
+        )
+
+    def run(self, iterations=None):
+        """
+        Export stats every `interval_seconds` until stopped (or for a number of iterations).
+
+        """
+        iteration = 0
+        while not self.stopped.is_set():
+            try:
+                self.export()
+            except Exception:
+                self.logger.warning("Failed to export Elasticsearch stats", exc_info=True)
+
+            iteration += 1
+            if iterations is not None and iteration >= iterations:
+                return
+            self.stopped.wait(self.interval_seconds)
+
+    def start(self):
+        """
+        Export stats from a background (daemon) thread.
+
+        """
+        self.stopped.clear()
+        self.thread = Thread(target=self.run, name="elasticsearch-stats-exporter", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -8,12 +8,57 @@ Intended to be duck-type compatible with `microcosm_postgres.store.Store`.
 
 """
 from contextlib import contextmanager
-from time import time
+from json import loads
+from random import random
+from time import perf_counter, time
 from uuid import uuid4
 
 from elasticsearch.helpers import bulk
 
-from microcosm_elasticsearch.errors import translate_elasticsearch_errors
+from microcosm_elasticsearch.errors import (
+    ElasticsearchConflictError,
+    translate_elasticsearch_errors,
+)
+from microcosm_elasticsearch.metrics import instrumented
+from microcosm_elasticsearch.ndjson import (
+    iter_batches,
+    to_bulk_body,
+    to_report,
+    to_source,
+)
+from microcosm_elasticsearch.resilience import retried
+from microcosm_elasticsearch.scripting import ScriptedUpdate
+
+
+DEFAULT_MODIFY_RETRIES = 3
+
+# Refresh policies for writes: don't refresh, wait for the next refresh or refresh immediately
+REFRESH_POLICIES = (False, "wait_for", True)
+
+
+def normalize_refresh(refresh):
+    """
+    Validate a refresh policy, accepting the string forms of booleans (e.g. from configuration).
+
+    """
+    if refresh is None:
+        return None
+    if refresh in ("true", "false"):
+        refresh = refresh == "true"
+    if refresh not in REFRESH_POLICIES:
+        raise ValueError(f"Unsupported refresh policy: {refresh!r}; expected one of {REFRESH_POLICIES}")
+    return refresh
+
+
+def is_conditional_replace(identifier, new_instance, *args, **kwargs):
+    """
+    Whether a `replace` is conditional on the stored model's `seq_no` and `primary_term`.
+
+    Conditional writes are not idempotent: retrying one that was applied (but whose response
+    was lost) fails with a spurious conflict.
+
+    """
+    return new_instance._seq_no is not None and new_instance._primary_term is not None
 
 
 class Store:
@@ -21,16 +66,20 @@ class Store:
     Elasticsearch persistence interface.
 
     """
-    def __init__(self, graph, index, model_class, search_index=None):
+    def __init__(self, graph, index, model_class, search_index=None, refresh=None):
         """
         :param graph: the object graph
         :param index: the name of an index to use
         :param model_class: a `elasticsearch_dsl.Document` subclass to persist.
+        :param refresh: the default refresh policy for writes (see `get_refresh`)
 
         """
         self.elasticsearch_client = graph.elasticsearch_client
+        self.elasticsearch_metrics = graph.elasticsearch_metrics
+        self.retry_policy = graph.elasticsearch_retry_policy
         self.index = index
         self.model_class = model_class
+        self.refresh = normalize_refresh(refresh)
 
         if search_index:
             search_index.register_doc_type(model_class)
@@ -69,6 +118,16 @@ class Store:
         """
         return self.index
 
+    def metrics_tags(self, **kwargs):
+        """
+        Tag the metrics of an operation (see `metrics.py`).
+
+        """
+        return [
+            f"index:{self.get_index_name(**kwargs)}",
+            f"model:{self.model_class.get_model_doctype()}",
+        ]
+
     @contextmanager
     def flushing(self, **kwargs):
         """
@@ -118,11 +177,87 @@ class Store:
         search_index = self.get_search_index(**kwargs)
         return search_index.search_with_count(**kwargs)
 
+    def search_template(self, template, **kwargs):
+        # delegate
+        search_index = self.get_search_index(**kwargs)
+        return search_index.search_template(template, **kwargs)
+
+    def aggregate(self, aggs, **kwargs):
+        # delegate
+        search_index = self.get_search_index(**kwargs)
+        return search_index.aggregate(aggs, **kwargs)
+
+    def get_routing(self, instance=None, routing=None):
+        """
+        Resolve the custom routing value for an operation.
+
+        An explicit routing value takes precedence over the instance's routing field.
+
+        """
+        if routing is None and instance is not None:
+            return instance.get_routing()
+        return routing
+
+    def get_refresh(self, refresh=None):
+        """
+        Resolve the refresh policy of a write; an explicit policy takes precedence over the store's.
+
+        Writes become visible to searches after the index's next (periodic) refresh by default;
+        "wait_for" blocks until then and True forces a refresh of the affected shards. Unlike
+        `flushing`, neither flushes the index nor refreshes shards that were not written to.
+
+        """
+        if refresh is None:
+            return self.refresh
+        return normalize_refresh(refresh)
+
+    def iter_columns(self, fields=None, **kwargs):
+        """
+        Stream all models matching some criterion as batches of columns.
+
+        See `SearchIndex.iter_columns`.
+
+        """
+        # delegate
+        search_index = self.get_search_index(**kwargs)
+        return search_index.iter_columns(self.model_class, fields=fields, **kwargs)
+
+    def delete_matching(self, **kwargs):
+        """
+        Delete all models matching some criterion server-side.
+
+        Accepts the same criteria as `search`; see `SearchIndex.delete_matching` for options.
+
+        """
+        # delegate
+        search_index = self.get_search_index(**kwargs)
+        return search_index.delete_matching(**kwargs)
+
+    def update_matching(self, script=None, params=None, **kwargs):
+        """
+        Update all models matching some criterion server-side.
+
+        Accepts the same criteria as `search`; see `SearchIndex.update_matching` for options.
+
+        :param script: the (painless) script source, if any; the document is available as `ctx._source`
+        :param params: script parameters, available as `params`
+
+        """
+        if script is not None:
+            script = ScriptedUpdate(None, script, params=params).to_script(updated_at=self.new_timestamp())
+
+        # delegate
+        search_index = self.get_search_index(**kwargs)
+        return search_index.update_matching(script=script, **kwargs)
+
+    @instrumented("create")
     @translate_elasticsearch_errors
-    def create(self, instance, **kwargs):
+    def create(self, instance, routing=None, refresh=None, **kwargs):
         """
         Persist an entity into Elasticsearch.
 
+        :param refresh: the refresh policy, if not the store's (see `get_refresh`)
+
         """
         now_millis = self.new_timestamp()
 
@@ -134,18 +269,26 @@ class Store:
         instance.updated_at = now_millis
 
         # NB: the DSL save function will overwrite existing records; use the raw client
-        self.elasticsearch_client.create(
+        response = self.elasticsearch_client.create(
             id=instance.id,
             index=self.get_index_name(**kwargs),
             body=instance.to_dict(),
+            routing=self.get_routing(instance, routing),
+            refresh=self.get_refresh(refresh),
         )
+        # NB: allow subsequent writes of this instance to use optimistic concurrency control
+        instance._seq_no = response.get("_seq_no")
+        instance._primary_term = response.get("_primary_term")
         return instance
 
+    @instrumented("retrieve")
+    @retried("retrieve")
     @translate_elasticsearch_errors
-    def retrieve(self, identifier, **kwargs):
+    def retrieve(self, identifier, routing=None, **kwargs):
         """
         Retrieve a model by primary key and zero or more other criteria.
 
+        :param routing: the custom routing value of the model, if any
         :raises `ElasticsearchNotFoundError` if there is no existing model
 
         """
@@ -153,33 +296,118 @@ class Store:
             id=identifier,
             index=self.get_index_name(**kwargs),
             using=self.elasticsearch_client,
+            routing=routing,
         )
 
+    @instrumented("update")
     @translate_elasticsearch_errors
-    def update(self, identifier, new_instance, **kwargs):
+    def update(self, identifier, new_instance, routing=None, refresh=None, **kwargs):
         """
         Update an existing model with a new one.
 
+        If the new model carries `seq_no` and `primary_term` metadata (e.g. because it was
+        retrieved or searched), the update only succeeds if the stored model is unchanged.
+
+        :param refresh: the refresh policy, if not the store's (see `get_refresh`)
         :raises `ElasticsearchNotFoundError` if there is no existing model
+        :raises `ElasticsearchConflictError` if the stored model was modified concurrently
 
         """
         new_instance.id = identifier
         new_instance._id = identifier
         new_instance.updated_at = self.new_timestamp()
 
+        routing = self.get_routing(new_instance, routing)
+        if routing is not None:
+            new_instance.meta.routing = routing
+
         new_instance.update(
             using=self.elasticsearch_client,
             index=self.get_index_name(**kwargs),
+            refresh=self.get_refresh(refresh),
             **new_instance.to_dict()
         )
 
-        return self.retrieve(identifier)
+        return self.retrieve(identifier, routing=routing, **kwargs)
 
+    @instrumented("update_script")
     @translate_elasticsearch_errors
-    def replace(self, identifier, new_instance, **kwargs):
+    def update_script(
+        self,
+        identifier,
+        script,
+        params=None,
+        upsert=None,
+        routing=None,
+        retry_on_conflict=None,
+        refresh=None,
+        **kwargs
+    ):
+        """
+        Update an existing model server-side using a (painless) script.
+
+        Runs in a single request without reading the model first; see also `scripting.py`.
+
+        :param script: the script source; the document is available as `ctx._source`
+        :param params: script parameters, available as `params`
+        :param upsert: a model to create if there is no existing model
+        :raises `ElasticsearchNotFoundError` if there is no existing model (and no upsert)
+        :returns: the updated model
+
+        """
+        update = ScriptedUpdate(
+            identifier,
+            script,
+            params=params,
+            upsert=upsert,
+            routing=routing,
+        )
+        response = self.elasticsearch_client.update(
+            id=identifier,
+            index=self.get_index_name(**kwargs),
+            body=self._to_scripted_update_body(update),
+            routing=update.get_routing(),
+            retry_on_conflict=retry_on_conflict,
+            refresh=self.get_refresh(refresh),
+            _source=True,
+        )
+        return self.model_class.from_es(dict(
+            response["get"],
+            _id=response["_id"],
+            _index=response["_index"],
+        ))
+
+    def _to_scripted_update_body(self, update):
+        now_millis = self.new_timestamp()
+        body = dict(
+            script=update.to_script(updated_at=now_millis),
+        )
+
+        if update.upsert is not None:
+            # NB: stamp the upsert the same way as `create`
+            update.upsert.id = update.id
+            update.upsert._id = update.id
+            update.upsert.created_at = now_millis
+            update.upsert.updated_at = now_millis
+            body["upsert"] = update.upsert.to_dict()
+
+        return body
+
+    @instrumented("replace")
+    @retried("replace", unless=is_conditional_replace)
+    @translate_elasticsearch_errors
+    def replace(self, identifier, new_instance, routing=None, validate=True, refresh=None, **kwargs):
         """
         Create or update an entity.
 
+        If the new model carries `seq_no` and `primary_term` metadata, the write only
+        succeeds if the stored model is unchanged; such conditional writes are not retried.
+
+        :param validate: whether to validate (and clean) the model's fields before writing
+        :param refresh: the refresh policy, if not the store's (see `get_refresh`)
+
+        :raises `ElasticsearchConflictError` if the stored model was modified concurrently
+
         """
         now_millis = self.new_timestamp()
 
@@ -194,29 +422,66 @@ class Store:
         new_instance._id = new_instance.id
         new_instance.updated_at = now_millis
 
+        routing = self.get_routing(new_instance, routing)
+        if routing is not None:
+            new_instance.meta.routing = routing
+
         new_instance.save(
             id=new_instance.id,
             using=self.elasticsearch_client,
             index=self.get_index_name(**kwargs),
-            validate=True,
+            validate=validate,
+            refresh=self.get_refresh(refresh),
         )
         return new_instance
 
+    @instrumented("delete")
     @translate_elasticsearch_errors
-    def delete(self, identifier, **kwargs):
+    def delete(self, identifier, routing=None, if_seq_no=None, if_primary_term=None, refresh=None, **kwargs):
         """
         Delete a model by primary key.
 
+        :param routing: the custom routing value of the model, if any
+        :param if_seq_no: only delete the model if it has this sequence number
+        :param if_primary_term: only delete the model if it has this primary term
+        :param refresh: the refresh policy, if not the store's (see `get_refresh`)
         :raises `ElasticsearchNotFoundError` if there is no existing model
+        :raises `ElasticsearchConflictError` if the stored model was modified concurrently
 
         """
         self.model_class().delete(
             id=identifier,
             index=self.get_index_name(**kwargs),
             using=self.elasticsearch_client,
+            routing=routing,
+            if_seq_no=if_seq_no,
+            if_primary_term=if_primary_term,
+            refresh=self.get_refresh(refresh),
         )
         return True
 
+    def modify(self, identifier, func, retries=DEFAULT_MODIFY_RETRIES, routing=None, refresh=None, **kwargs):
+        """
+        Read-modify-write a model using optimistic concurrency control.
+
+        Retrieves the model, applies `func` to it (which should modify it in place) and writes it
+        back only if it was not modified concurrently; conflicting writes are retried from scratch.
+
+        :param func: a function taking the current model
+        :param retries: the number of times to retry on conflict
+        :raises `ElasticsearchNotFoundError` if there is no existing model
+        :raises `ElasticsearchConflictError` if the retries were exhausted
+
+        """
+        for attempt in range(retries + 1):
+            instance = self.retrieve(identifier, routing=routing, **kwargs)
+            func(instance)
+            try:
+                return self.replace(identifier, instance, routing=routing, refresh=refresh, **kwargs)
+            except ElasticsearchConflictError:
+                if attempt == retries:
+                    raise
+
     def _batch_bulk(self, actions, batch_size):
         """
         Breaks list of actions into batches
@@ -226,44 +491,272 @@ class Store:
         for offset in range(0, num_actions, batch_size):
             yield actions[offset:min(offset + batch_size, num_actions)]
 
+    @instrumented("bulk")
     @translate_elasticsearch_errors
-    def bulk(self, actions, batch_size, **kwargs):
+    def bulk(
+        self,
+        actions,
+        batch_size,
+        routing=None,
+        trusted=False,
+        validate=False,
+        validate_sample_rate=None,
+        refresh=None,
+        **kwargs
+    ):
         """
         Bulk index entities
 
-        actions: list of tuples of (action, instance) to be included in the bulk
+        actions: list of tuples of (action, instance) to be included in the bulk;
+                 "update" actions take a `ScriptedUpdate` instead of an instance
         batch_size: number of records for each bulk call
-
-        All errors and exceptions are suppressed and are returned in the response report
+        routing: default custom routing value for instances without a routing field value
+        trusted: write the instances' data as-is, skipping per-field serialization, and send
+                 batches as NDJSON directly; the data must already be in its stored form
+                 (e.g. because it was read from Elasticsearch or came from a validated pipeline)
+        validate: whether to validate (and clean) every instance's fields before writing
+        validate_sample_rate: the fraction of instances to validate (at random), if not validating all
+        refresh: the refresh policy of each batch, if not the store's (see `get_refresh`)
+
+        Errors of individual writes are suppressed and are returned in the response report; invalid
+        actions (e.g. an instance that fails validation or a `ScriptedUpdate` without the "update"
+        action) raise before any batch is sent
 
         """
-        def to_dict(instance, op_type):
-            if instance.id is None:
-                instance.id = self.new_object_id()
+        index_name = self.get_index_name(**kwargs)
+        tags = self.metrics_tags(**kwargs)
+        refresh = self.get_refresh(refresh)
 
-            instance._id = instance.id
-            instance._index = self.get_index_name(**kwargs)
-
-            record = instance.to_dict(include_meta=True)
-            if op_type == "delete":
-                del record["_source"]
+        def to_dict(instance, op_type):
+            if isinstance(instance, ScriptedUpdate):
+                return self._to_scripted_update_record(instance, op_type, index_name, routing)
 
-            record["_op_type"] = op_type
-            return record
+            validate_instance = validate or (
+                validate_sample_rate is not None and random() < validate_sample_rate
+            )
+            return self._to_bulk_record(instance, op_type, index_name, routing, trusted, validate_instance)
+
+        with self.elasticsearch_metrics.timing("bulk", "serialize", tags):
+            actions = [
+                to_dict(instance, op_type)
+                for op_type, instance in actions
+            ]
+
+        if trusted:
+            return [
+                self._send_bulk(
+                    records=actions_batch,
+                    index_name=index_name,
+                    refresh=refresh,
+                    tags=tags,
+                ) for actions_batch in self._batch_bulk(
+                    actions=actions,
+                    batch_size=batch_size,
+                )
+            ]
 
-        actions = [
-            to_dict(instance, op_type)
-            for op_type, instance in actions
-        ]
         return [
-            bulk(
-                client=self.elasticsearch_client,
+            self._send_helpers_bulk(
                 actions=actions_batch,
-                index=self.get_index(**kwargs)._name,
-                raise_on_exception=False,
-                raise_on_error=False,
+                index_name=index_name,
+                refresh=refresh,
+                tags=tags,
             ) for actions_batch in self._batch_bulk(
                 actions=actions,
                 batch_size=batch_size,
             )
         ]
+
+    def _send_bulk(self, records, index_name, refresh, tags):
+        """
+        Send a batch of bulk records as NDJSON, recording its size and (encoding and request) timing.
+
+        """
+        with self.elasticsearch_metrics.timing("bulk", "encode", tags):
+            body = to_bulk_body(records)
+
+        self.elasticsearch_metrics.histogram("bulk", "items", len(records), tags)
+        self.elasticsearch_metrics.histogram("bulk", "bytes", len(body), tags)
+
+        started_at = perf_counter()
+        response = self.elasticsearch_client.bulk(body=body, index=index_name, refresh=refresh)
+        self.elasticsearch_metrics.record_response("bulk", started_at, response, tags)
+        return to_report(response)
+
+    def _send_helpers_bulk(self, actions, index_name, refresh, tags):
+        """
+        Send a batch of bulk actions via `elasticsearch.helpers.bulk`.
+
+        The helpers serialize (and may split) batches internally; only the number of items is recorded.
+
+        """
+        self.elasticsearch_metrics.histogram("bulk", "items", len(actions), tags)
+        return bulk(
+            client=self.elasticsearch_client,
+            actions=actions,
+            index=index_name,
+            refresh=refresh,
+            raise_on_exception=False,
+            raise_on_error=False,
+        )
+
+    @instrumented("bulk_raw")
+    @translate_elasticsearch_errors
+    def bulk_raw(self, actions, batch_size, routing=None, refresh=None, stamp=True, **kwargs):
+        """
+        Bulk write raw documents, without creating model instances.
+
+        actions: iterable of tuples of (action, identifier, document), where the document is a dict
+                 or pre-serialized JSON bytes (or None for "delete" actions); the identifier may be
+                 None to use the document's id (or a new id); tuples may also end with a custom
+                 routing value for the document (overriding the default `routing`)
+        batch_size: number of records for each bulk call
+        routing: default custom routing value for documents without a routing field value
+        refresh: the refresh policy of each batch, if not the store's (see `get_refresh`)
+        stamp: whether to stamp documents; pass False to write documents as-is (e.g. to restore
+               exported documents)
+
+        Documents are stamped with `id`, `created_at`, `updated_at` and `doctype` the same way
+        as `create` does (only `create` actions overwrite an existing `created_at`); "update" actions
+        are partial updates and only stamp `updated_at`.
+
+        Pre-serialized documents are only written without decoding when they are not stamped and
+        have an explicit identifier (and routing, if the model has a routing field); otherwise they
+        are decoded and cost as much as dicts.
+
+        Actions are consumed lazily, one batch at a time.
+
+        All errors and exceptions are suppressed and are returned in the response report
+
+        """
+        index_name = self.get_index_name(**kwargs)
+        tags = self.metrics_tags(**kwargs)
+        refresh = self.get_refresh(refresh)
+        records = (
+            self._to_raw_bulk_record(
+                op_type,
+                identifier,
+                document,
+                index_name,
+                document_routing[0] if document_routing else routing,
+                stamp,
+            )
+            for op_type, identifier, document, *document_routing in actions
+        )
+        return [
+            self._send_bulk(
+                records=records_batch,
+                index_name=index_name,
+                refresh=refresh,
+                tags=tags,
+            ) for records_batch in iter_batches(records, batch_size)
+        ]
+
+    def _to_raw_bulk_record(self, op_type, identifier, document, index_name, routing, stamp):
+        """
+        Generate a bulk record for a raw document, stamping it like `create`.
+
+        """
+        routing_field = self.model_class.get_routing_field()
+        if isinstance(document, bytes) and (stamp or identifier is None or (routing_field and routing is None)):
+            # NB: the document's own fields are needed (e.g. its id); decode it once
+            document = loads(document)
+
+        is_dict = isinstance(document, dict)
+        if identifier is None:
+            identifier = document.get("id") if is_dict else None
+        if identifier is None:
+            identifier = self.new_object_id()
+
+        record = dict(_op_type=op_type, _id=identifier, _index=index_name)
+
+        document_routing = document.get(routing_field) if is_dict and routing_field else None
+        if document_routing is not None or routing is not None:
+            record["_routing"] = str(document_routing if document_routing is not None else routing)
+
+        if op_type == "delete":
+            return record
+
+        now_millis = self.new_timestamp()
+
+        if op_type == "update":
+            # NB: partial update
+            if stamp:
+                document = dict(document, updated_at=now_millis)
+            if is_dict:
+                record["doc"] = document
+            else:
+                record["_source"] = b'{"doc":' + document + b"}"
+            return record
+
+        if not stamp:
+            record["_source"] = document
+            return record
+
+        stamps = dict(
+            id=identifier,
+            updated_at=now_millis,
+            doctype=self.model_class.get_model_doctype(),
+        )
+        if op_type == "create" or document.get("created_at") is None:
+            stamps["created_at"] = now_millis
+        record["_source"] = dict(document, **stamps)
+        return record
+
+    def _to_bulk_record(self, instance, op_type, index_name, routing, trusted, validate):
+        """
+        Generate a bulk record for a model instance.
+
+        """
+        if instance.id is None:
+            instance.id = self.new_object_id()
+
+        instance._id = instance.id
+        instance._index = index_name
+
+        instance_routing = self.get_routing(instance) or routing
+        if instance_routing is not None:
+            instance.meta.routing = instance_routing
+
+        if validate and op_type != "delete":
+            instance.full_clean()
+
+        if trusted:
+            record = dict(_id=instance.id, _index=index_name)
+            if instance_routing is not None:
+                record["_routing"] = instance_routing
+            if op_type != "delete":
+                record["_source"] = to_source(instance._d_)
+        else:
+            record = instance.to_dict(include_meta=True)
+            if op_type == "delete":
+                del record["_source"]
+
+        if op_type in ("index", "delete") and instance._seq_no is not None:
+            record["if_seq_no"] = instance._seq_no
+            record["if_primary_term"] = instance._primary_term
+
+        record["_op_type"] = op_type
+        return record
+
+    def _to_scripted_update_record(self, update, op_type, index_name, routing):
+        """
+        Generate a bulk record for a scripted update.
+
+        """
+        if op_type != "update":
+            raise ValueError(f"Scripted updates require the 'update' action, not '{op_type}'")
+
+        record = self._to_scripted_update_body(update)
+        record.update(
+            _op_type=op_type,
+            _id=update.id,
+            _index=index_name,
+        )
+
+        update_routing = update.get_routing() or routing
+        if update_routing is not None:
+            record["_routing"] = update_routing
+        if update.retry_on_conflict is not None:
+            record["retry_on_conflict"] = update.retry_on_conflict
+        return record
@@ -0,0 +1,43 @@
+"""
+Support for long-running server-side tasks.
+
+Operations such as `_delete_by_query` and `_update_by_query` may run asynchronously,
+returning a task id that can be polled via the `_tasks` API.
+
+"""
+from time import sleep
+
+from microcosm_elasticsearch.errors import ElasticsearchError
+
+
+DEFAULT_POLL_INTERVAL_SECONDS = 1.0
+
+
+def wait_for_task(client, task_id, poll_interval_seconds=DEFAULT_POLL_INTERVAL_SECONDS, progress=None):
+    """
+    Poll a task until it completes.
+
+    :param client: an Elasticsearch client
+    :param task_id: the task to poll
+    :param progress: a function that is called with the task status on every poll, if any
+    :raises `ElasticsearchError` if the task failed, including partial failures (e.g. of some
+            of a by-query operation's bulk requests)
+    :returns: the task's response
+
+    """
+    while True:
+        task = client.tasks.get(task_id=task_id)
+
+        if progress is not None:
+            progress(task["task"].get("status", {}))
+
+        if task.get("completed"):
+            if "error" in task:
+                raise ElasticsearchError(task["error"])
+            response = task.get("response", {})
+            # NB: by-query operations complete even if some of their documents failed
+            if response.get("failures"):
+                raise ElasticsearchError(response["failures"])
+            return response
+
+        sleep(poll_interval_seconds)
@@ -0,0 +1,148 @@
+"""
+Query templates for fixed-shape, high-volume searches.
+
+A template is a search body with parameter slots, compiled once (e.g. as a class attribute of a
+`SearchIndex` subclass):
+
+    class PersonSearchIndex(SearchIndex):
+        by_name = QueryTemplate(
+            dict(
+                query=dict(multi_match=dict(query=Param("q"), fields=["first", "last"])),
+                size=Param("limit", default=20),
+            ),
+        )
+
+    search_index.search_template(PersonSearchIndex.by_name, params=dict(q="kevin"))
+
+By default, templates are rendered client-side: the body is serialized once at compile time and each
+search only serializes its parameter values into the precompiled body. With an `id`, the template is
+instead stored in the cluster (see `SearchIndex.put_templates`) and searches send only the id and the
+parameter values.
+
+"""
+from json import dumps
+from re import compile
+
+from elasticsearch.serializer import JSONSerializer
+
+
+# NB: parameter slots are serialized as (quoted) marker strings and then split out of the serialized body
+MARKER = "@@param:{}@@"
+MARKER_PATTERN = compile(r'"@@param:(\d+)@@"')
+
+MISSING = object()
+
+SERIALIZER = JSONSerializer()
+
+
+def to_json(value):
+    """
+    Serialize a value like the client does (e.g. supporting dates and decimals).
+
+    """
+    return dumps(value, default=SERIALIZER.default, ensure_ascii=False, separators=(",", ":"))
+
+
+class Param:
+    """
+    A parameter slot in a query template.
+
+    """
+    def __init__(self, name, default=MISSING):
+        self.name = name
+        self.default = default
+
+
+def replace_params(value, params):
+    """
+    Replace parameter slots with marker strings, collecting the slots.
+
+    """
+    if isinstance(value, Param):
+        params.append(value)
+        return MARKER.format(len(params) - 1)
+    if isinstance(value, dict):
+        return {key: replace_params(child, params) for key, child in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [replace_params(child, params) for child in value]
+    return value
+
+
+class QueryTemplate:
+    """
+    A search body with parameter slots.
+
+    """
+    def __init__(self, body, id=None):
+        """
+        :param body: the search body, with `Param` slots for values
+        :param id: the id of a stored (mustache) template, if any
+
+        """
+        self.id = id
+
+        slots = []
+        serialized = to_json(replace_params(body, slots))
+        pieces = MARKER_PATTERN.split(serialized)
+        # NB: split alternates between literal parts and slot indexes
+        self.parts = pieces[::2]
+        self.slots = [slots[int(index)] for index in pieces[1::2]]
+
+        self.params = dict()
+        for slot in slots:
+            self.params.setdefault(slot.name, slot)
+
+    @property
+    def name(self):
+        return self.id or ",".join(self.params)
+
+    def resolve(self, params=None):
+        """
+        Resolve parameter values, applying defaults.
+
+        :raises `ValueError` if a parameter without a default is missing
+
+        """
+        params = params or {}
+        unknown = set(params) - set(self.params)
+        if unknown:
+            raise ValueError(f"Unknown template parameter(s): {', '.join(sorted(unknown))}")
+
+        resolved = dict()
+        for name, slot in self.params.items():
+            value = params.get(name, slot.default)
+            if value is MISSING:
+                raise ValueError(f"Missing template parameter: {name}")
+            resolved[name] = value
+        return resolved
+
+    def render(self, params=None):
+        """
+        Render the (serialized) search body for parameter values.
+
+        """
+        values = {
+            name: to_json(value)
+            for name, value in self.resolve(params).items()
+        }
+        rendered = [self.parts[0]]
+        for slot, part in zip(self.slots, self.parts[1:]):
+            rendered.append(values[slot.name])
+            rendered.append(part)
+        return "".join(rendered)
+
+    def to_script(self):
+        """
+        The stored script definition of this template.
+
+        """
+        source = [self.parts[0]]
+        for slot, part in zip(self.slots, self.parts[1:]):
+            source.append(f"{{{{#toJson}}}}{slot.name}{{{{/toJson}}}}")
+            source.append(part)
+        return dict(
+            script=dict(
+                lang="mustache",
+                source="".join(source),
+            ),
+        )
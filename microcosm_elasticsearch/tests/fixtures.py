@@ -14,6 +14,30 @@ from microcosm_elasticsearch.searching import SearchIndex
 from microcosm_elasticsearch.store import Store
 
 
+def in_memory_loader(metadata):
+    """
+    Configure an object graph with the in-memory client.
+
+    """
+    return dict(
+        elasticsearch_client=dict(
+            use_in_memory="true",
+        ),
+    )
+
+
+class Clock:
+    """
+    A fake (monotonic) clock that only moves when `now` is set.
+
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
 class SelectorAttribute(Enum):
     ONE = auto()
     TWO = auto()
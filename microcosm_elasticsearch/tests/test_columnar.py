@@ -0,0 +1,73 @@
+"""
+Test columnar export.
+
+"""
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    contains,
+    equal_to,
+    has_entries,
+    has_length,
+    is_,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.columnar import (
+    CategoricalColumn,
+    DateColumn,
+    ObjectColumn,
+    iter_column_batches,
+)
+from microcosm_elasticsearch.tests.fixtures import Person, Planet
+
+
+HITS = [
+    dict(_source=dict(id="1", first="Kevin", origin_planet="EARTH", created_at=1000)),
+    dict(_source=dict(id="2", first="Steph", origin_planet="MARS", created_at="1970-01-01T00:00:02Z")),
+    dict(_source=dict(id="3", first="Klay", origin_planet="EARTH")),
+]
+
+
+def test_iter_column_batches():
+    batches = list(iter_column_batches(HITS, Person, fields=["first", "origin_planet", "created_at"]))
+
+    assert_that(batches, has_length(1))
+    first, origin_planet, created_at = batches[0]["first"], batches[0]["origin_planet"], batches[0]["created_at"]
+
+    assert_that(first, is_(ObjectColumn))
+    assert_that(first.values, contains("Kevin", "Steph", "Klay"))
+
+    assert_that(origin_planet, is_(CategoricalColumn))
+    assert_that(list(origin_planet.codes), contains(0, 1, 0))
+    assert_that(origin_planet.categories, contains(Planet.EARTH, Planet.MARS))
+
+    assert_that(created_at, is_(DateColumn))
+    assert_that(list(created_at.values), contains(1000, 2000, 0))
+    assert_that(list(created_at.validity), contains(1, 1, 0))
+
+
+def test_iter_column_batches_batch_size():
+    batches = list(iter_column_batches(HITS, Person, batch_size=2))
+
+    assert_that(batches, contains(
+        has_entries(id=has_length(2)),
+        has_entries(id=has_length(1)),
+    ))
+    assert_that(list(batches[0]), is_(equal_to(list(Person._doc_type.mapping))))
+
+
+def test_iter_columns():
+    graph = create_object_graph("example", testing=True)
+    store = graph.person_store
+
+    with patch("microcosm_elasticsearch.searching.scan") as mocked_scan:
+        mocked_scan.return_value = iter(HITS)
+        batches = list(store.iter_columns(fields=["id"], q="Kevin", batch_size=100))
+
+    assert_that(list(batches[0]["id"].codes), contains(0, 1, 2))
+    assert_that(mocked_scan.call_args.kwargs, has_entries(
+        size=100,
+        query=has_entries(_source=["id"]),
+    ))
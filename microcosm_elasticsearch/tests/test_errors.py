@@ -28,3 +28,16 @@ def test_conflict_error():
 
 def test_not_found_error():
     assert_that(calling(fixture).with_args(NotFoundError), raises(ElasticsearchNotFoundError))
+
+
+@translate_elasticsearch_errors
+def generator_fixture(error):
+    yield
+    raise error
+
+
+def test_generator_error():
+    assert_that(
+        calling(list).with_args(generator_fixture(NotFoundError)),
+        raises(ElasticsearchNotFoundError),
+    )
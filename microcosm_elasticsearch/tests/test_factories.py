@@ -1,5 +1,13 @@
+from subprocess import check_output
+from sys import executable
+
 from elasticsearch import Elasticsearch
-from hamcrest import assert_that, instance_of, is_
+from hamcrest import (
+    assert_that,
+    empty,
+    instance_of,
+    is_,
+)
 from microcosm.api import create_object_graph
 
 
@@ -32,6 +40,24 @@ def test_configure_elasticsearch_client_with_aws4auth():
     assert_that(graph.elasticsearch_client, is_(instance_of(Elasticsearch)))
 
 
+def test_entry_points_import_lazily():
+    """
+    Loading the entry points does not import optional dependencies that are slow to import.
+
+    See also `benchmarks/import_time.py`.
+
+    """
+    script = "; ".join([
+        "import sys",
+        "import microcosm_elasticsearch.factories",
+        "import microcosm_elasticsearch.index_status.convention",
+        "print(','.join(name for name in ('boto3', 'botocore', 'microcosm_flask') if name in sys.modules))",
+    ])
+    eager = check_output([executable, "-c", script]).decode("utf-8").strip()
+
+    assert_that(eager, is_(empty()))
+
+
 def test_configure_elasticsearch_client_with_python_2_serializer_works():
     """
     Enabling Python 2.x serializer works.
@@ -0,0 +1,82 @@
+"""
+Index status store tests.
+
+"""
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    contains,
+    contains_inanyorder,
+    equal_to,
+    has_properties,
+    is_,
+    none,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.index_status.store import IndexStatusStore
+from microcosm_elasticsearch.tests.fixtures import Clock, in_memory_loader
+
+
+def make_stats(index_total, query_total):
+    return dict(indices=dict(example_v1_test=dict(
+        primaries=dict(docs=dict(count=10)),
+        total=dict(
+            docs=dict(count=20),
+            store=dict(size_in_bytes=1024),
+            indexing=dict(index_total=index_total),
+            search=dict(query_total=query_total),
+            segments=dict(count=3),
+        ),
+    )))
+
+
+class TestIndexStatusStore:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True, loader=in_memory_loader)
+        self.graph.use("example_index")
+        self.graph.elasticsearch_index_registry.createall(force=True)
+        self.clock = Clock()
+        self.store = IndexStatusStore(self.graph, cache_ttl_seconds=10, clock=self.clock)
+        self.client = self.graph.elasticsearch_client
+
+    def test_get_status(self):
+        with patch.object(self.client.indices, "get", wraps=self.client.indices.get) as get:
+            with patch.object(self.client.indices, "stats", wraps=self.client.indices.stats) as stats:
+                status = self.store.get_status()
+                self.store.get_status()
+
+        assert_that(
+            [index_status.name for index_status in status],
+            contains_inanyorder(*self.graph.elasticsearch_index_registry.indexes),
+        )
+        assert_that(status[0].stats["primaries"]["docs"]["count"], is_(equal_to(0)))
+        # one request each for all indexes; the second status is cached
+        assert_that(get.call_count, is_(equal_to(1)))
+        assert_that(stats.call_count, is_(equal_to(1)))
+
+    def test_get_summary(self):
+        with patch.object(self.client.indices, "stats") as stats:
+            stats.return_value = make_stats(index_total=100, query_total=50)
+            first = self.store.get_status(summary=True)
+
+            self.clock.now = 10
+            stats.return_value = make_stats(index_total=200, query_total=100)
+            second = self.store.get_status(summary=True)
+
+        assert_that(first, contains(has_properties(
+            name="example_v1_test",
+            data=none(),
+            summary=has_properties(
+                doc_count=10,
+                store_size_in_bytes=1024,
+                segment_count=3,
+                indexing_rate=none(),
+            ),
+        )))
+        assert_that(second, contains(has_properties(summary=has_properties(
+            indexing_rate=10.0,
+            search_rate=5.0,
+        ))))
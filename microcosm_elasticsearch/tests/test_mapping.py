@@ -0,0 +1,109 @@
+"""
+Test mapping diffs.
+
+"""
+from hamcrest import (
+    assert_that,
+    contains_inanyorder,
+    empty,
+    equal_to,
+    has_entries,
+    has_length,
+    is_,
+)
+
+from microcosm_elasticsearch.mapping import create_mapping, diff_mapping
+from microcosm_elasticsearch.tests.fixtures import Person, Player
+
+
+def test_diff_mapping_unchanged():
+    mapping = create_mapping(Person).to_dict()
+
+    diff = diff_mapping(mapping, mapping)
+
+    assert_that(diff.is_compatible, is_(equal_to(True)))
+    assert_that(diff.has_changes, is_(equal_to(False)))
+
+
+def test_diff_mapping_added_field():
+    diff = diff_mapping(
+        create_mapping(Player).to_dict(),
+        create_mapping(Person).to_dict(),
+    )
+
+    assert_that(diff.is_compatible, is_(equal_to(True)))
+    assert_that(
+        diff.to_body(),
+        is_(equal_to(dict(properties=dict(jersey_number=dict(type="keyword"))))),
+    )
+
+
+def test_diff_mapping_ignores_live_only_fields():
+    diff = diff_mapping(
+        create_mapping(Person).to_dict(),
+        create_mapping(Player).to_dict(),
+    )
+
+    assert_that(diff.is_compatible, is_(equal_to(True)))
+    assert_that(diff.has_changes, is_(equal_to(False)))
+
+
+def test_diff_mapping_added_nested_fields():
+    diff = diff_mapping(
+        dict(properties=dict(
+            address=dict(properties=dict(city=dict(type="text"), zip=dict(type="keyword"))),
+            name=dict(type="text", fields=dict(raw=dict(type="keyword"))),
+        )),
+        dict(properties=dict(
+            address=dict(properties=dict(city=dict(type="text"))),
+            name=dict(type="text"),
+        )),
+    )
+
+    assert_that(diff.is_compatible, is_(equal_to(True)))
+    assert_that(diff.properties, has_entries(
+        address=has_entries(properties=has_length(2)),
+        name=has_entries(fields=has_length(1)),
+    ))
+
+
+def test_diff_mapping_updatable_parameter():
+    diff = diff_mapping(
+        dict(dynamic="strict", properties=dict(code=dict(type="keyword", ignore_above=64))),
+        dict(properties=dict(code=dict(type="keyword", ignore_above=256))),
+    )
+
+    assert_that(diff.is_compatible, is_(equal_to(True)))
+    assert_that(diff.to_body(), has_entries(
+        dynamic="strict",
+        properties=has_entries(code=has_entries(ignore_above=64)),
+    ))
+
+
+def test_diff_mapping_breaking_changes():
+    diff = diff_mapping(
+        dict(
+            _routing=dict(required=True),
+            properties=dict(
+                first=dict(type="keyword"),
+                last=dict(type="text", analyzer="english"),
+                address=dict(properties=dict(city=dict(type="keyword"))),
+            ),
+        ),
+        dict(
+            properties=dict(
+                first=dict(type="text"),
+                last=dict(type="text"),
+                address=dict(properties=dict(city=dict(type="text"))),
+            ),
+        ),
+    )
+
+    assert_that(diff.is_compatible, is_(equal_to(False)))
+    assert_that(diff.conflicts, contains_inanyorder(
+        "mapping parameter '_routing' cannot be changed",
+        "field 'first' changed type from 'text' to 'keyword'",
+        "field 'last' parameter 'analyzer' cannot be changed",
+        "field 'address.city' changed type from 'text' to 'keyword'",
+    ))
+    assert_that(diff.properties, is_(empty()))
@@ -0,0 +1,333 @@
+"""
+Test the in-memory client.
+
+"""
+from elasticsearch.exceptions import NotFoundError, RequestError
+from elasticsearch_dsl.exceptions import ValidationException
+from hamcrest import (
+    all_of,
+    assert_that,
+    calling,
+    contains,
+    contains_inanyorder,
+    empty,
+    equal_to,
+    greater_than,
+    has_entries,
+    has_length,
+    has_property,
+    instance_of,
+    is_,
+    raises,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.errors import ElasticsearchConflictError, ElasticsearchNotFoundError
+from microcosm_elasticsearch.memory.client import InMemoryCluster, InMemoryElasticsearch
+from microcosm_elasticsearch.tests.fixtures import Person, Planet, in_memory_loader
+
+
+def test_configure_in_memory_client():
+    graph = create_object_graph("example", testing=True, loader=in_memory_loader)
+    assert_that(graph.elasticsearch_client, is_(instance_of(InMemoryElasticsearch)))
+
+
+class TestInMemoryStore:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True, loader=in_memory_loader)
+        self.store = self.graph.person_store
+        self.graph.elasticsearch_index_registry.createall(force=True)
+
+        self.kevin = Person(
+            first="Kevin",
+            last="Durant",
+            origin_planet=Planet.EARTH,
+        )
+        self.steph = Person(
+            first="Steph",
+            last="Curry",
+            origin_planet=Planet.MARS,
+        )
+
+    def test_create_retrieve(self):
+        self.store.create(self.kevin)
+
+        assert_that(
+            self.store.retrieve(self.kevin.id),
+            all_of(
+                has_property("id", self.kevin.id),
+                has_property("first", "Kevin"),
+                has_property("origin_planet", Planet.EARTH),
+                has_property("_seq_no", self.kevin._seq_no),
+            ),
+        )
+        assert_that(
+            calling(self.store.create).with_args(self.kevin),
+            raises(ElasticsearchConflictError),
+        )
+
+    def test_update_replace_delete(self):
+        self.store.create(self.kevin)
+
+        self.store.update(self.kevin.id, Person(first="Kevin", last="Garnett"))
+        assert_that(self.store.retrieve(self.kevin.id), has_property("last", "Garnett"))
+
+        stale = self.store.retrieve(self.kevin.id)
+        self.store.modify(self.kevin.id, lambda person: setattr(person, "middle", "Wayne"))
+        assert_that(
+            calling(self.store.replace).with_args(self.kevin.id, stale),
+            raises(ElasticsearchConflictError),
+        )
+
+        assert_that(self.store.delete(self.kevin.id), is_(equal_to(True)))
+        assert_that(
+            calling(self.store.retrieve).with_args(self.kevin.id),
+            raises(ElasticsearchNotFoundError),
+        )
+        assert_that(
+            calling(self.store.delete).with_args(self.kevin.id),
+            raises(ElasticsearchNotFoundError),
+        )
+
+    def test_search_requires_refresh(self):
+        self.store.create(self.kevin)
+        assert_that(self.store.search(), is_(empty()))
+        assert_that(self.store.count(), is_(equal_to(0)))
+
+        with self.store.flushing():
+            self.store.create(self.steph)
+
+        assert_that(self.store.search(), contains_inanyorder(
+            has_property("id", self.kevin.id),
+            has_property("id", self.steph.id),
+        ))
+        assert_that(self.store.count(), is_(equal_to(2)))
+
+    def test_refresh_policy(self):
+        self.store.create(self.kevin, refresh="wait_for")
+        assert_that(self.store.count(), is_(equal_to(1)))
+
+        self.store.update(self.kevin.id, Person(last="Garnett"), refresh=True)
+        assert_that(self.store.search(q="garnett"), contains(has_property("id", self.kevin.id)))
+
+        self.store.bulk([("index", self.steph)], batch_size=1, refresh="true")
+        assert_that(self.store.count(), is_(equal_to(2)))
+
+        self.store.delete(self.steph.id, refresh=True)
+        assert_that(self.store.count(), is_(equal_to(1)))
+
+    def test_store_refresh_policy(self):
+        self.store.refresh = "wait_for"
+
+        self.store.create(self.kevin)
+        self.store.bulk_raw([("index", self.steph.id, dict(first="Steph", origin_planet="MARS"))], batch_size=1)
+        assert_that(self.store.count(), is_(equal_to(2)))
+
+        self.kevin.last = "Garnett"
+        self.store.replace(self.kevin.id, self.kevin, refresh=False)
+        assert_that(self.store.search(q="garnett"), is_(empty()))
+
+        assert_that(
+            calling(self.store.create).with_args(self.kevin, refresh="immediate"),
+            raises(ValueError),
+        )
+
+    def test_bulk_raw_stamps(self):
+        self.store.bulk_raw(
+            [
+                ("index", "kevin", dict(first="Kevin", origin_planet="EARTH", updated_at=1)),
+                ("index", "steph", b'{"first":"Steph","origin_planet":"MARS","updated_at":1,"team":{"id":"x"}}'),
+                ("index", "klay", b'{"first":"Klay","origin_planet":"EARTH","updated_at":1}'),
+            ],
+            batch_size=3,
+            stamp=False,
+        )
+        self.store.bulk_raw(
+            [
+                ("index", "kevin", dict(first="Kevin", origin_planet="EARTH", updated_at=1)),
+                ("index", "steph", b'{"first":"Steph","origin_planet":"MARS","updated_at":1,"team":{"id":"x"}}'),
+            ],
+            batch_size=2,
+        )
+
+        kevin, steph, klay = (
+            self.graph.elasticsearch_client.get(index=self.store.get_index_name(), id=id)["_source"]
+            for id in ("kevin", "steph", "klay")
+        )
+        assert_that(steph["id"], is_(equal_to("steph")))
+        assert_that(steph["team"], is_(equal_to(dict(id="x"))))
+        # NB: pre-serialized and dict documents are stamped alike
+        assert_that(steph["updated_at"], is_(equal_to(kevin["updated_at"])))
+        assert_that(steph["updated_at"], is_(greater_than(1)))
+        assert_that(steph["doctype"], is_(equal_to("person")))
+        assert_that(klay, is_(equal_to(dict(first="Klay", origin_planet="EARTH", updated_at=1))))
+
+    def test_bulk_raw_reimport(self):
+        document = b'{"id":"abc","first":"Kevin","origin_planet":"EARTH"}'
+        with self.store.flushing():
+            self.store.bulk_raw([("index", None, document)], batch_size=1)
+        with self.store.flushing():
+            self.store.bulk_raw([("index", None, document)], batch_size=1)
+
+        # NB: the same document overwrites itself instead of creating a duplicate
+        assert_that(self.store.count(), is_(equal_to(1)))
+        assert_that(self.store.retrieve("abc"), has_property("first", "Kevin"))
+
+    def test_search_query(self):
+        with self.store.flushing():
+            self.store.create(self.kevin)
+            self.store.create(self.steph)
+
+        assert_that(self.store.search(q="kevin"), contains(has_property("id", self.kevin.id)))
+        assert_that(self.store.search(q="KEVIN curry"), has_length(2))
+        assert_that(self.store.search(q="lebron"), is_(empty()))
+
+    def test_bulk(self):
+        with self.store.flushing():
+            self.store.bulk([("index", self.kevin)], batch_size=1)
+            self.store.bulk([("index", self.steph)], batch_size=1, trusted=True)
+
+        people = Person.mget(
+            [self.kevin.id, self.steph.id],
+            index=self.store.get_index_name(),
+            using=self.store.elasticsearch_client,
+        )
+        assert_that(people, contains(
+            has_property("first", "Kevin"),
+            has_property("first", "Steph"),
+        ))
+        assert_that(self.store.count(), is_(equal_to(2)))
+
+    def test_bulk_invalid(self):
+        invalid = Person(first="Steph", origin_planet=Planet.MARS)
+
+        with self.store.flushing():
+            assert_that(
+                calling(self.store.bulk).with_args(
+                    [("index", self.kevin), ("index", invalid)],
+                    batch_size=1,
+                    validate=True,
+                ),
+                raises(ValidationException),
+            )
+
+        # NB: nothing is sent, not even the valid batch
+        assert_that(self.store.count(), is_(equal_to(0)))
+
+    def test_iter_columns(self):
+        with self.store.flushing():
+            self.store.create(self.kevin)
+            self.store.create(self.steph)
+
+        batches = list(self.store.iter_columns(fields=["first"], batch_size=1))
+        assert_that(
+            [batch["first"].values[0] for batch in batches],
+            contains_inanyorder("Kevin", "Steph"),
+        )
+
+
+class TestInMemoryClient:
+
+    def setup_method(self):
+        self.client = InMemoryElasticsearch(cluster=InMemoryCluster())
+        self.client.indices.create(index="people", body=dict(
+            mappings=dict(properties=dict(
+                name=dict(type="text", fields=dict(keyword=dict(type="keyword"))),
+                team=dict(type="keyword"),
+                age=dict(type="integer"),
+            )),
+            aliases=dict(everyone={}),
+        ))
+        for id, name, team, age in [
+            ("1", "Kevin Durant", "Suns", 35),
+            ("2", "Steph Curry", "Warriors", 36),
+            ("3", "Klay Thompson", "Mavericks", 34),
+            ("4", "Draymond Green", "Warriors", 34),
+        ]:
+            self.client.index(index="people", id=id, body=dict(name=name, team=team, age=age))
+        self.client.indices.refresh(index="everyone")
+
+    def search_ids(self, **body):
+        response = self.client.search(index="everyone", body=body)
+        return [hit["_id"] for hit in response["hits"]["hits"]]
+
+    def test_queries(self):
+        assert_that(self.search_ids(query=dict(term=dict(team="Warriors"))), contains_inanyorder("2", "4"))
+        assert_that(self.search_ids(query=dict(term=dict(name="Curry"))), is_(empty()))
+        assert_that(self.search_ids(query=dict(term=dict(name="curry"))), contains("2"))
+        assert_that(self.search_ids(query=dict(terms={"name.keyword": ["Kevin Durant"]})), contains("1"))
+        assert_that(self.search_ids(query=dict(match=dict(name="klay DURANT"))), contains_inanyorder("1", "3"))
+        assert_that(
+            self.search_ids(query=dict(match=dict(name=dict(query="klay durant", operator="and")))),
+            is_(empty()),
+        )
+        assert_that(
+            self.search_ids(query=dict(multi_match=dict(query="Warriors", fields=["name", "team^2"]))),
+            contains_inanyorder("2", "4"),
+        )
+        assert_that(
+            self.search_ids(query=dict(bool=dict(
+                filter=[dict(term=dict(team="Warriors"))],
+                must_not=[dict(match=dict(name="green"))],
+            ))),
+            contains("2"),
+        )
+        assert_that(
+            self.search_ids(query=dict(bool=dict(
+                should=[dict(term=dict(team="Suns")), dict(range=dict(age=dict(gte=36)))],
+            ))),
+            contains_inanyorder("1", "2"),
+        )
+
+    def test_sort_and_paginate(self):
+        sort = [dict(age=dict(order="desc")), "team.keyword"]
+        assert_that(self.search_ids(sort=sort), contains("2", "1", "3", "4"))
+        assert_that(self.search_ids(sort=sort, size=2), contains("2", "1"))
+        assert_that(self.search_ids(sort=sort, **{"from": 3}), contains("4"))
+
+    def test_count(self):
+        assert_that(
+            self.client.count(index="people", body=dict(query=dict(term=dict(team="Warriors")))),
+            has_entries(count=2),
+        )
+
+    def test_refresh(self):
+        self.client.index(index="people", id="5", body=dict(name="Jalen Brunson"))
+        assert_that(self.client.count(index="people")["count"], is_(equal_to(4)))
+
+        self.client.index(index="people", id="6", body=dict(name="Jalen Green"), refresh="wait_for")
+        assert_that(self.client.count(index="people")["count"], is_(equal_to(6)))
+
+    def test_bulk(self):
+        response = self.client.bulk(
+            index="people",
+            body=(
+                b'{"index":{"_id":"5"}}\n{"name":"Jalen Brunson"}\n'
+                b'{"update":{"_id":"1"}}\n{"doc":{"team":"Nets"}}\n'
+                b'{"delete":{"_id":"99"}}\n'
+            ),
+            refresh=True,
+        )
+
+        assert_that(response["errors"], is_(equal_to(False)))
+        assert_that(
+            [next(iter(item.values()))["status"] for item in response["items"]],
+            contains(201, 200, 404),
+        )
+        assert_that(self.client.get(index="people", id="1")["_source"], has_entries(team="Nets"))
+        assert_that(self.search_ids(query=dict(match=dict(name="jalen"))), contains("5"))
+
+    def test_errors(self):
+        assert_that(
+            calling(self.client.get).with_args(index="people", id="99"),
+            raises(NotFoundError),
+        )
+        assert_that(
+            calling(self.client.search).with_args(index="missing"),
+            raises(NotFoundError),
+        )
+        assert_that(
+            calling(self.client.search).with_args(index="people", body=dict(query=dict(fuzzy=dict(name="kevn")))),
+            raises(RequestError),
+        )
@@ -0,0 +1,129 @@
+"""
+Test operation instrumentation.
+
+"""
+from unittest.mock import MagicMock, patch
+
+from elasticsearch.exceptions import NotFoundError
+from hamcrest import (
+    assert_that,
+    calling,
+    contains_inanyorder,
+    equal_to,
+    has_item,
+    is_,
+    raises,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.errors import ElasticsearchNotFoundError
+from microcosm_elasticsearch.tests.fixtures import Person
+
+
+def loader(metadata):
+    return dict(
+        elasticsearch_metrics=dict(
+            enabled="true",
+        ),
+    )
+
+
+class TestMetrics:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True, loader=loader)
+        self.graph.use("metrics")
+        self.store = self.graph.person_store
+        self.search_index = self.graph.example_search_index
+        self.tags = ["index:example_v1_test", "model:person"]
+
+    def histograms(self):
+        return {
+            call.args[0]: (call.args[1], call.kwargs["tags"])
+            for call in self.graph.metrics.histogram.call_args_list
+        }
+
+    def test_disabled_by_default(self):
+        graph = create_object_graph("example", testing=True)
+        graph.use("metrics")
+
+        with patch.object(graph.person_store.elasticsearch_client, "create") as mocked:
+            mocked.return_value = dict()
+            graph.person_store.create(Person(first="Kevin", last="Durant"))
+
+        assert_that(graph.metrics.histogram.called, is_(equal_to(False)))
+
+    def test_create(self):
+        with patch.object(self.store.elasticsearch_client, "create") as mocked:
+            mocked.return_value = dict()
+            self.store.create(Person(first="Kevin", last="Durant"))
+
+        assert_that(self.histograms()["elasticsearch.create.time"][1], is_(equal_to(self.tags)))
+
+    def test_error(self):
+        with patch.object(self.store.elasticsearch_client, "get") as mocked:
+            mocked.side_effect = NotFoundError(404, "not_found", {})
+            assert_that(
+                calling(self.store.retrieve).with_args("1"),
+                raises(ElasticsearchNotFoundError),
+            )
+
+        self.graph.metrics.increment.assert_called_once_with(
+            "elasticsearch.retrieve.error",
+            tags=self.tags + ["error:ElasticsearchNotFoundError"],
+        )
+        assert_that(self.histograms(), has_item("elasticsearch.retrieve.time"))
+
+    def test_search(self):
+        response = dict(took=3, hits=dict(total=dict(value=0, relation="eq"), hits=[]))
+
+        with patch.object(self.search_index.elasticsearch_client, "search") as mocked:
+            mocked.return_value = response
+            self.store.search(read_only=True)
+
+        histograms = self.histograms()
+        assert_that(histograms, contains_inanyorder(
+            "elasticsearch.search.took",
+            "elasticsearch.search.network",
+            "elasticsearch.search.hydrate",
+            "elasticsearch.search.time",
+        ))
+        assert_that(histograms["elasticsearch.search.took"], is_(equal_to((3, self.tags))))
+
+    def test_bulk(self):
+        client = MagicMock()
+        client.bulk.return_value = dict(took=5, items=[dict(index=dict(_id="1", status=201))])
+        self.store.elasticsearch_client = client
+
+        self.store.bulk([("index", Person(id="1", first="Kevin", last="Durant"))], batch_size=1, trusted=True)
+
+        histograms = self.histograms()
+        assert_that(histograms, contains_inanyorder(
+            "elasticsearch.bulk.serialize",
+            "elasticsearch.bulk.encode",
+            "elasticsearch.bulk.items",
+            "elasticsearch.bulk.bytes",
+            "elasticsearch.bulk.took",
+            "elasticsearch.bulk.network",
+            "elasticsearch.bulk.time",
+        ))
+        assert_that(histograms["elasticsearch.bulk.items"], is_(equal_to((1, self.tags))))
+        assert_that(
+            histograms["elasticsearch.bulk.bytes"][0],
+            is_(equal_to(len(client.bulk.call_args.kwargs["body"]))),
+        )
+
+    def test_bulk_serialize_once(self):
+        client = MagicMock()
+        client.bulk.return_value = dict(took=5, items=[dict(index=dict(_id="1", status=201))])
+        self.store.elasticsearch_client = client
+
+        self.store.bulk(
+            [("index", Person(id=str(index), first="Kevin", last="Durant")) for index in range(3)],
+            batch_size=1,
+            trusted=True,
+        )
+
+        names = [call.args[0] for call in self.graph.metrics.histogram.call_args_list]
+        assert_that(names.count("elasticsearch.bulk.serialize"), is_(equal_to(1)))
+        assert_that(names.count("elasticsearch.bulk.encode"), is_(equal_to(3)))
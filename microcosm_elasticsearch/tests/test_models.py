@@ -0,0 +1,92 @@
+"""
+Test model equality.
+
+"""
+from hamcrest import assert_that, equal_to, is_
+
+from microcosm_elasticsearch.tests.fixtures import Person, Planet, Player
+
+
+def assert_equality(left, right, expected):
+    # NB: equality must agree with comparing serialized members
+    assert_that(left._members() == right._members(), is_(equal_to(expected)))
+    assert_that(left == right, is_(equal_to(expected)))
+    assert_that(right == left, is_(equal_to(expected)))
+    assert_that(left != right, is_(equal_to(not expected)))
+
+
+def test_equal():
+    assert_equality(
+        Person(id="1", first="Kevin", last="Durant", origin_planet=Planet.EARTH, updated_at=1),
+        Person(id="1", first="Kevin", last="Durant", origin_planet=Planet.EARTH, updated_at=1),
+        True,
+    )
+
+
+def test_not_equal_id():
+    assert_equality(
+        Person(id="1", first="Kevin", last="Durant"),
+        Person(id="2", first="Kevin", last="Durant"),
+        False,
+    )
+
+
+def test_not_equal_updated_at():
+    assert_equality(
+        Person(id="1", first="Kevin", updated_at=1),
+        Person(id="1", first="Kevin", updated_at=2),
+        False,
+    )
+
+
+def test_not_equal_field():
+    assert_equality(
+        Person(id="1", first="Kevin", last="Durant"),
+        Person(id="1", first="Kevin", last="Garnett"),
+        False,
+    )
+
+
+def test_not_equal_type():
+    assert_that(Person(id="1") == Player(id="1"), is_(equal_to(False)))
+
+
+def test_equal_serialized_enum():
+    assert_equality(
+        Person(id="1", origin_planet=Planet.MARS),
+        Person(id="1", origin_planet="MARS"),
+        True,
+    )
+
+
+def test_equal_empty_values():
+    assert_equality(
+        Person(id="1", middle=None, nicknames=[]),
+        Person(id="1"),
+        True,
+    )
+
+
+def test_not_equal_serialized_none():
+    # NB: enum fields serialize an explicit None
+    assert_equality(
+        Person(id="1", origin_planet=None),
+        Person(id="1"),
+        False,
+    )
+
+
+def test_equal_ignores_non_persistent_keys():
+    assert_equality(
+        Person(id="1", index="foo"),
+        Person(id="1", doc_type="bar"),
+        True,
+    )
+
+
+def test_equal_list_and_tuple():
+    assert_equality(
+        Person(id="1", origin_planet=[Planet.EARTH, Planet.MARS]),
+        Person(id="1", origin_planet=("EARTH", "MARS")),
+        True,
+    )
@@ -0,0 +1,209 @@
+"""
+Test bulk request serialization.
+
+"""
+from unittest.mock import MagicMock, patch
+
+from elasticsearch_dsl.exceptions import ValidationException
+from hamcrest import (
+    assert_that,
+    calling,
+    contains,
+    equal_to,
+    is_,
+    raises,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.ndjson import iter_batches, send_bulk, to_bulk_lines
+from microcosm_elasticsearch.tests.fixtures import Person, Planet
+
+
+def test_to_bulk_lines():
+    lines = to_bulk_lines(dict(
+        _op_type="index",
+        _id="1",
+        _index="foo",
+        _routing="tenant",
+        _source=dict(first="Kevin", origin_planet=Planet.EARTH),
+    ))
+
+    assert_that(b"".join(lines), is_(equal_to(
+        b'{"index":{"_id":"1","_index":"foo","routing":"tenant"}}\n'
+        b'{"first":"Kevin","origin_planet":"EARTH"}\n'
+    )))
+
+
+def test_to_bulk_lines_delete():
+    lines = to_bulk_lines(dict(_op_type="delete", _id="1", if_seq_no=1, if_primary_term=2))
+
+    assert_that(b"".join(lines), is_(equal_to(
+        b'{"delete":{"_id":"1","if_seq_no":1,"if_primary_term":2}}\n'
+    )))
+
+
+def test_to_bulk_lines_update():
+    lines = to_bulk_lines(dict(_op_type="update", _id="1", retry_on_conflict=3, doc=dict(first="Kevin")))
+
+    assert_that(b"".join(lines), is_(equal_to(
+        b'{"update":{"_id":"1","retry_on_conflict":3}}\n'
+        b'{"doc":{"first":"Kevin"}}\n'
+    )))
+
+
+def test_to_bulk_lines_preserialized():
+    lines = to_bulk_lines(dict(_id="1", _source=b'{"first":"Kevin"}'))
+
+    assert_that(b"".join(lines), is_(equal_to(
+        b'{"index":{"_id":"1"}}\n'
+        b'{"first":"Kevin"}\n'
+    )))
+
+
+def test_iter_batches():
+    assert_that(
+        list(iter_batches(iter(range(5)), 2)),
+        contains([0, 1], [2, 3], [4]),
+    )
+
+
+def test_send_bulk():
+    client = MagicMock()
+    client.bulk.return_value = dict(items=[
+        dict(index=dict(_id="1", status=201)),
+        dict(delete=dict(_id="2", status=404, result="not_found")),
+    ])
+
+    success, errors = send_bulk(client, [
+        dict(_id="1", _source=dict(first="Kevin")),
+        dict(_op_type="delete", _id="2"),
+    ], index="foo")
+
+    assert_that(success, is_(equal_to(1)))
+    assert_that(errors, contains(
+        dict(delete=dict(_id="2", status=404, result="not_found")),
+    ))
+
+
+class TestTrustedBulk:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True)
+        self.store = self.graph.person_store
+        self.kevin = Person(
+            id="1",
+            first="Kevin",
+            last="Durant",
+            origin_planet=Planet.EARTH,
+        )
+
+    def test_bulk_trusted(self):
+        with patch.object(self.store.elasticsearch_client, "bulk") as mocked:
+            mocked.return_value = dict(items=[dict(index=dict(_id="1", status=201))])
+            results = self.store.bulk([("index", self.kevin)], batch_size=1, trusted=True)
+
+        assert_that(results, contains((1, [])))
+        assert_that(mocked.call_args.kwargs["body"], is_(equal_to(
+            b'{"index":{"_id":"1","_index":"example_v1_test"}}\n'
+            b'{"id":"1","first":"Kevin","last":"Durant","origin_planet":"EARTH","doctype":"person"}\n'
+        )))
+
+    def test_bulk_validate(self):
+        invalid = Person(id="2", first="Steph")
+
+        with patch.object(self.store.elasticsearch_client, "bulk"):
+            assert_that(
+                calling(self.store.bulk).with_args([("index", invalid)], batch_size=1, validate=True),
+                raises(ValidationException),
+            )
+
+    def test_bulk_validate_sample_rate(self):
+        invalid = Person(id="2", first="Steph")
+
+        with patch.object(self.store.elasticsearch_client, "bulk") as mocked:
+            mocked.return_value = dict(items=[dict(index=dict(_id="2", status=201))])
+            with patch("microcosm_elasticsearch.store.random") as mocked_random:
+                mocked_random.return_value = 0.5
+                self.store.bulk([("index", invalid)], batch_size=1, trusted=True, validate_sample_rate=0.1)
+
+                mocked_random.return_value = 0.05
+                assert_that(
+                    calling(self.store.bulk).with_args(
+                        [("index", invalid)],
+                        batch_size=1,
+                        trusted=True,
+                        validate_sample_rate=0.1,
+                    ),
+                    raises(ValidationException),
+                )
+
+
+class TestRawBulk:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True)
+        self.store = self.graph.person_store
+
+    def bulk_raw(self, actions, **kwargs):
+        with patch.object(self.store, "new_timestamp") as mocked_timestamp:
+            mocked_timestamp.return_value = 1000
+            with patch.object(self.store, "new_object_id") as mocked_object_id:
+                mocked_object_id.return_value = "new"
+                with patch.object(self.store.elasticsearch_client, "bulk") as mocked:
+                    mocked.return_value = dict(items=[dict(index=dict(status=201))])
+                    self.store.bulk_raw(actions, batch_size=10, **kwargs)
+
+        return mocked.call_args.kwargs["body"].splitlines()
+
+    def test_bulk_raw_dict(self):
+        lines = self.bulk_raw([
+            ("index", None, dict(first="Kevin")),
+            ("create", "2", dict(first="Steph", created_at=1)),
+            ("index", None, dict(id="3", first="Klay", created_at=1)),
+        ])
+
+        assert_that(lines, contains(
+            b'{"index":{"_id":"new","_index":"example_v1_test"}}',
+            b'{"first":"Kevin","id":"new","updated_at":1000,"doctype":"person","created_at":1000}',
+            b'{"create":{"_id":"2","_index":"example_v1_test"}}',
+            b'{"first":"Steph","created_at":1000,"id":"2","updated_at":1000,"doctype":"person"}',
+            b'{"index":{"_id":"3","_index":"example_v1_test"}}',
+            b'{"id":"3","first":"Klay","created_at":1,"updated_at":1000,"doctype":"person"}',
+        ))
+
+    def test_bulk_raw_bytes(self):
+        lines = self.bulk_raw([
+            ("index", "1", b'{"first":"Kevin","created_at":1}'),
+            ("update", "2", b'{"first":"Steph"}'),
+            ("delete", "3", None),
+        ], routing="tenant")
+
+        assert_that(lines, contains(
+            b'{"index":{"_id":"1","_index":"example_v1_test","routing":"tenant"}}',
+            b'{"first":"Kevin","created_at":1,"id":"1","updated_at":1000,"doctype":"person"}',
+            b'{"update":{"_id":"2","_index":"example_v1_test","routing":"tenant"}}',
+            b'{"doc":{"first":"Steph","updated_at":1000}}',
+            b'{"delete":{"_id":"3","_index":"example_v1_test","routing":"tenant"}}',
+        ))
+
+    def test_bulk_raw_bytes_without_identifier(self):
+        lines = self.bulk_raw([
+            ("index", None, b'{"id":"abc","first":"Kevin"}'),
+            ("index", None, b'{"first":"Steph"}'),
+        ])
+
+        # NB: the document's own id wins over a new one
+        assert_that(lines, contains(
+            b'{"index":{"_id":"abc","_index":"example_v1_test"}}',
+            b'{"id":"abc","first":"Kevin","updated_at":1000,"doctype":"person","created_at":1000}',
+            b'{"index":{"_id":"new","_index":"example_v1_test"}}',
+            b'{"first":"Steph","id":"new","updated_at":1000,"doctype":"person","created_at":1000}',
+        ))
+
+    def test_bulk_raw_bytes_as_is(self):
+        lines = self.bulk_raw([("index", "1", b'{"first": "Kevin"}')], stamp=False)
+
+        assert_that(lines, contains(
+            b'{"index":{"_id":"1","_index":"example_v1_test"}}',
+            b'{"first": "Kevin"}',
+        ))
@@ -0,0 +1,149 @@
+"""
+Test slow query logging and query profiling.
+
+"""
+from unittest.mock import Mock, patch
+
+from hamcrest import (
+    assert_that,
+    contains,
+    equal_to,
+    has_entries,
+    is_,
+)
+from microcosm.api import create_object_graph
+
+import microcosm_elasticsearch.tests.fixtures  # noqa: F401
+from microcosm_elasticsearch.profiling import summarize_profile
+
+
+PROFILE = dict(shards=[
+    dict(
+        id="[node][example_v1_test][0]",
+        searches=[dict(
+            query=[dict(
+                type="BooleanQuery",
+                description="+first:kevin",
+                time_in_nanos=2000000,
+            )],
+            rewrite_time=1000000,
+            collector=[dict(name="SimpleTopScoreDocCollector", reason="search_top_hits", time_in_nanos=500000)],
+        )],
+        aggregations=[],
+    ),
+    dict(
+        id="[node][example_v1_test][1]",
+        searches=[dict(
+            query=[dict(
+                type="BooleanQuery",
+                description="+first:kevin",
+                time_in_nanos=8000000,
+            )],
+            rewrite_time=0,
+            collector=[],
+        )],
+        aggregations=[dict(type="TermsAggregator", description="by_last", time_in_nanos=1000000)],
+    ),
+])
+
+
+def search_response(**kwargs):
+    return dict(
+        took=250,
+        timed_out=False,
+        _shards=dict(total=2, successful=2, skipped=0, failed=0),
+        hits=dict(total=dict(value=0, relation="eq"), hits=[]),
+        **kwargs
+    )
+
+
+def test_summarize_profile():
+    assert_that(summarize_profile(PROFILE), contains(
+        has_entries(
+            id="[node][example_v1_test][1]",
+            query_millis=8.0,
+            collector_millis=0,
+            aggregation_millis=1.0,
+            total_millis=9.0,
+        ),
+        has_entries(
+            id="[node][example_v1_test][0]",
+            query_millis=2.0,
+            rewrite_millis=1.0,
+            collector_millis=0.5,
+            total_millis=3.5,
+            queries=contains(dict(type="BooleanQuery", description="+first:kevin", millis=2.0)),
+        ),
+    ))
+
+
+def test_search_profile():
+    graph = create_object_graph("example", testing=True)
+    store = graph.person_store
+
+    with patch.object(store.elasticsearch_client, "search") as mocked:
+        mocked.return_value = search_response(profile=PROFILE)
+        results, profile = store.search(read_only=True, profile=True)
+
+    assert_that(mocked.call_args.kwargs["body"], has_entries(profile=True))
+    assert_that(results, is_(equal_to([])))
+    assert_that(profile[0], has_entries(id="[node][example_v1_test][1]"))
+
+
+class TestSlowQueryLog:
+
+    def setup_graph(self, threshold_millis):
+        def loader(metadata):
+            return dict(
+                elasticsearch_slow_query_log=dict(
+                    threshold_millis=threshold_millis,
+                ),
+            )
+
+        self.graph = create_object_graph("example", testing=True, loader=loader)
+        self.store = self.graph.person_store
+
+    def search(self, **kwargs):
+        with patch.object(self.store.elasticsearch_client, "search") as mocked:
+            mocked.return_value = search_response(**kwargs)
+            with patch.object(self.graph.elasticsearch_slow_query_log, "logger") as mocked_logger:
+                self.store.search(read_only=True, profile="profile" in kwargs)
+
+        return mocked_logger
+
+    def test_slow_query(self):
+        self.setup_graph("100")
+        logger = self.search()
+
+        assert_that(logger.warning.call_count, is_(equal_to(1)))
+        assert_that(logger.warning.call_args.kwargs["extra"], has_entries(
+            index="example_v1_test",
+            took=250,
+            shards=has_entries(total=2),
+            query=has_entries(seq_no_primary_term=True),
+        ))
+
+    def test_slow_profiled_query(self):
+        self.setup_graph("100")
+        logger = self.search(profile=PROFILE)
+
+        assert_that(logger.warning.call_args.kwargs["extra"], has_entries(
+            shard_timings=contains(
+                has_entries(id="[node][example_v1_test][1]", query_millis=8.0, total_millis=9.0),
+                has_entries(id="[node][example_v1_test][0]", query_millis=2.0, total_millis=3.5),
+            ),
+        ))
+
+    def test_fast_query(self):
+        self.setup_graph("1000")
+        logger = self.search()
+
+        assert_that(logger.warning.called, is_(equal_to(False)))
+
+    def test_fast_query_not_unwrapped(self):
+        self.setup_graph("1000")
+        response = Mock(took=5)
+
+        self.graph.elasticsearch_slow_query_log.record("example_v1_test", dict(), response)
+
+        assert_that(response.to_dict.called, is_(equal_to(False)))
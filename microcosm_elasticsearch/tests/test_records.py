@@ -0,0 +1,129 @@
+"""
+Test read-only records.
+
+"""
+from datetime import datetime
+
+from hamcrest import (
+    all_of,
+    assert_that,
+    calling,
+    contains,
+    equal_to,
+    has_entry,
+    has_properties,
+    instance_of,
+    is_,
+    none,
+    raises,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.records import Record, record_class_for
+from microcosm_elasticsearch.tests.fixtures import Person, Planet, Player
+
+
+def make_hit(**source):
+    return dict(
+        _id=source["id"],
+        _index="example_v1_test",
+        _score=1.0,
+        _source=source,
+    )
+
+
+def test_record_class_for():
+    record_class = record_class_for(Player)
+
+    assert_that(record_class, is_(equal_to(record_class_for(Player))))
+    assert_that(record_class.__name__, is_(equal_to("PlayerRecord")))
+    assert_that(record_class.__slots__, is_(equal_to(tuple(Player._doc_type.mapping))))
+
+
+def test_from_hit():
+    record = record_class_for(Person).from_hit(
+        make_hit(id="1", first="Kevin", origin_planet="EARTH", doctype="person", extra="ignored"),
+    )
+
+    assert_that(record, has_properties(
+        id="1",
+        first="Kevin",
+        middle=none(),
+        origin_planet=Planet.EARTH,
+        _id="1",
+        _score=1.0,
+    ))
+    assert_that(
+        calling(getattr).with_args(record, "extra"),
+        raises(AttributeError),
+    )
+
+
+def test_read_only():
+    record = record_class_for(Person).from_hit(make_hit(id="1", first="Kevin"))
+
+    assert_that(
+        calling(setattr).with_args(record, "first", "Steph"),
+        raises(AttributeError),
+    )
+    assert_that(
+        calling(setattr).with_args(record, "other", "value"),
+        raises(AttributeError),
+    )
+
+
+def test_to_model():
+    record = record_class_for(Person).from_hit(
+        make_hit(id="1", first="Kevin", last="Durant", origin_planet="MARS", doctype="person"),
+    )
+
+    assert_that(
+        record.to_model(),
+        is_(equal_to(Person(id="1", first="Kevin", last="Durant", origin_planet=Planet.MARS))),
+    )
+
+
+def test_to_model_with_dates():
+    hit = make_hit(
+        id="1",
+        first="Kevin",
+        last="Durant",
+        origin_planet="MARS",
+        doctype="person",
+        created_at=1500000000000,
+        updated_at="2020-01-01T00:00:00",
+    )
+    record = record_class_for(Person).from_hit(hit)
+
+    assert_that(record, has_properties(
+        created_at=instance_of(datetime),
+        updated_at=equal_to(datetime(2020, 1, 1)),
+    ))
+    assert_that(record.to_model(), is_(equal_to(Person.from_es(hit))))
+
+
+def test_to_records_polymorphic():
+    graph = create_object_graph("example", testing=True)
+    search_index = graph.example_search_index
+    # NB: registers doc types
+    graph.person_store
+    graph.player_store
+
+    records = search_index._to_records(dict(hits=dict(hits=[
+        make_hit(id="1", first="Kevin", doctype="person"),
+        make_hit(id="2", first="Steph", jersey_number="30", doctype="player"),
+        make_hit(id="3", doctype="unknown"),
+    ])))
+
+    assert_that(records, contains(
+        all_of(instance_of(record_class_for(Person)), has_properties(id="1")),
+        all_of(instance_of(record_class_for(Player)), has_properties(id="2", jersey_number="30")),
+        has_entry("_id", "3"),
+    ))
+
+
+def test_record_is_compact():
+    record = record_class_for(Person).from_hit(make_hit(id="1"))
+
+    assert_that(isinstance(record, Record), is_(equal_to(True)))
+    assert_that(hasattr(record, "__dict__"), is_(equal_to(False)))
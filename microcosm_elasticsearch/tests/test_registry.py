@@ -2,10 +2,20 @@
 Test registry management.
 
 """
-from hamcrest import assert_that, equal_to, is_
+from hamcrest import (
+    assert_that,
+    calling,
+    equal_to,
+    has_key,
+    is_,
+    raises,
+)
 from microcosm.api import create_object_graph
 
+from microcosm_elasticsearch.errors import ElasticsearchMappingConflictError
+from microcosm_elasticsearch.mapping import create_mapping
 from microcosm_elasticsearch.registry import IndexRegistry
+from microcosm_elasticsearch.tests.fixtures import Person, Player
 
 
 def test_name_for():
@@ -52,3 +62,52 @@ def test_register_with_settings():
         index.stats()["_shards"]["successful"],
         is_(equal_to(number_of_shards)),
     )
+
+
+def test_createall_updates_mapping():
+    graph = create_object_graph("example", testing=True)
+    graph.elasticsearch_index_registry.register(
+        name="foo",
+        version="v1",
+        mapping=create_mapping(Person),
+    )
+    graph.elasticsearch_index_registry.createall(force=True)
+
+    # re-register the same index with an additional field
+    graph = create_object_graph("example", testing=True)
+    index = graph.elasticsearch_index_registry.register(
+        name="foo",
+        version="v1",
+        mapping=create_mapping(Player),
+    )
+    graph.elasticsearch_index_registry.createall()
+
+    assert_that(
+        index.get_mapping()[index._name]["mappings"]["properties"],
+        has_key("jersey_number"),
+    )
+
+
+def test_createall_breaking_mapping_change():
+    graph = create_object_graph("example", testing=True)
+    graph.elasticsearch_index_registry.register(
+        name="foo",
+        version="v1",
+        mapping=create_mapping(Person),
+    )
+    graph.elasticsearch_index_registry.createall(force=True)
+
+    mapping = create_mapping(Person)
+    mapping.field("first", "keyword")
+
+    graph = create_object_graph("example", testing=True)
+    graph.elasticsearch_index_registry.register(
+        name="foo",
+        version="v1",
+        mapping=mapping,
+    )
+
+    assert_that(
+        calling(graph.elasticsearch_index_registry.createall),
+        raises(ElasticsearchMappingConflictError),
+    )
@@ -0,0 +1,147 @@
+"""
+Test replaying captured searches.
+
+"""
+from hamcrest import (
+    assert_that,
+    close_to,
+    contains,
+    equal_to,
+    has_entries,
+    is_,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.replay import (
+    Replay,
+    Result,
+    load_queries,
+    summarize,
+    to_histogram,
+)
+from microcosm_elasticsearch.tests.fixtures import Person, Planet, in_memory_loader
+
+
+def test_summarize():
+    assert_that(summarize(range(1, 101)), has_entries(p50=51, p95=96, p99=100, mean=50.5, max=100))
+    assert_that(summarize([]), has_entries(p50=None, mean=None))
+
+
+def test_to_histogram():
+    assert_that(
+        to_histogram([0.5, 1, 1.5, 7, 6000]),
+        has_entries({"<=1": 2, "<=2": 1, "<=10": 1, "<=5000": 0, ">5000": 1}),
+    )
+
+
+def test_report():
+    replay = Replay(None)
+    report = replay.report(
+        [
+            Result(10.0, took_millis=4),
+            Result(20.0, took_millis=5),
+            Result(30.0),
+            Result(1.0, error="NotFoundError"),
+        ],
+        elapsed_seconds=2.0,
+    )
+
+    assert_that(report, has_entries(
+        requests=4,
+        errors=1,
+        error_rate=0.25,
+        error_types=dict(NotFoundError=1),
+        throughput=2.0,
+        client=has_entries(p50=20.0, max=30.0),
+        took=has_entries(p50=5, max=5),
+        overhead=has_entries(p50=15.0, max=15.0),
+    ))
+
+
+class TestReplay:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True, loader=in_memory_loader)
+        self.store = self.graph.person_store
+        self.search_index = self.graph.example_search_index
+        self.graph.elasticsearch_index_registry.createall(force=True)
+
+        with self.store.flushing():
+            self.store.create(Person(first="Kevin", last="Durant", origin_planet=Planet.EARTH))
+            self.store.create(Person(first="Steph", last="Curry", origin_planet=Planet.MARS))
+
+        self.replay = Replay(
+            self.graph.elasticsearch_client,
+            index_name=self.store.get_index_name(),
+            search_index=self.search_index,
+            concurrency=2,
+        )
+
+    def test_load_queries(self, tmp_path):
+        path = tmp_path / "queries.ndjson"
+        path.write_bytes(b'{"query":{"match_all":{}}}\n\n{"kwargs":{"q":"kevin"}}\n')
+
+        assert_that(load_queries(str(path)), contains(
+            dict(query=dict(match_all={})),
+            dict(kwargs=dict(q="kevin")),
+        ))
+
+    def test_run(self):
+        queries = [
+            dict(query=dict(match=dict(first="kevin"))),
+            dict(body=dict(query=dict(match_all={}))),
+            dict(kwargs=dict(q="steph")),
+            dict(index="missing", body=dict(query=dict(match_all={}))),
+        ]
+
+        report = self.replay.run(queries, requests=8)
+
+        assert_that(report, has_entries(
+            requests=8,
+            errors=2,
+            error_types=dict(NotFoundError=2),
+            took=has_entries(p50=0),
+        ))
+        assert_that(sum(report["histogram"].values()), is_(equal_to(6)))
+
+    def test_run_rate(self):
+        now = [0.0]
+        delays = []
+
+        def sleep(seconds):
+            delays.append(seconds)
+            now[0] += seconds
+
+        replay = Replay(
+            self.graph.elasticsearch_client,
+            index_name=self.store.get_index_name(),
+            rate=10,
+            clock=lambda: now[0],
+            sleep=sleep,
+        )
+
+        report = replay.run([dict(query=dict(match_all={}))], requests=3)
+
+        assert_that(delays, contains(0.1, 0.1))
+        assert_that(report, has_entries(requests=3, seconds=0.2, throughput=15.0))
+
+    def test_run_rate_counts_queueing(self):
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        def send(query):
+            # NB: every search takes 300ms, slower than the schedule of a search per 100ms
+            now[0] += 0.3
+            return dict(took=100)
+
+        replay = Replay(None, rate=10, clock=lambda: now[0], sleep=sleep)
+        replay.send = send
+
+        report = replay.run([dict(query=dict(match_all={}))], requests=3)
+
+        # NB: searches are sent at 0, 300ms and 600ms; scheduled at 0, 100ms and 200ms
+        assert_that(report["client"], has_entries(p50=close_to(500, 0.001), max=close_to(700, 0.001)))
+        assert_that(report["queue"], has_entries(p50=close_to(200, 0.001), max=close_to(400, 0.001)))
+        assert_that(report["overhead"], has_entries(max=close_to(200, 0.001)))
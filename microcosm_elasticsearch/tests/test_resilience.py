@@ -0,0 +1,315 @@
+"""
+Test the circuit breaker, concurrency limiter, retry and hedging policies.
+
+"""
+from threading import BoundedSemaphore, Event
+from unittest.mock import Mock, patch
+
+from elasticsearch.exceptions import (
+    ConnectionError,
+    ConnectionTimeout,
+    NotFoundError,
+    TransportError,
+)
+from hamcrest import (
+    assert_that,
+    calling,
+    equal_to,
+    instance_of,
+    is_,
+    none,
+    raises,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.errors import (
+    ElasticsearchNotFoundError,
+    ElasticsearchUnavailableError,
+)
+from microcosm_elasticsearch.resilience import (
+    CircuitBreaker,
+    ConcurrencyLimiter,
+    HedgingPolicy,
+    ResilientTransport,
+    RetryPolicy,
+    is_failure,
+    is_transient,
+)
+from microcosm_elasticsearch.tests.fixtures import Clock, Person, Planet
+
+
+def test_is_failure():
+    assert_that(is_failure(ConnectionError("N/A", "refused", None)), is_(equal_to(True)))
+    assert_that(is_failure(TransportError(503, "unavailable")), is_(equal_to(True)))
+    assert_that(is_failure(TransportError(429, "es_rejected_execution_exception")), is_(equal_to(True)))
+    assert_that(is_failure(NotFoundError(404, "not_found")), is_(equal_to(False)))
+    assert_that(is_failure(ValueError()), is_(equal_to(False)))
+
+
+class TestCircuitBreaker:
+
+    def setup_method(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker(
+            failure_rate=0.5,
+            minimum_calls=4,
+            window_size=4,
+            slow_call_millis=1000,
+            open_seconds=10,
+            clock=self.clock,
+        )
+
+    def call(self, failed, elapsed_millis=1):
+        self.breaker.acquire()
+        self.breaker.record(failed, elapsed_millis)
+
+    def test_opens_on_failure_rate(self):
+        for failed in (False, True, False):
+            self.call(failed)
+        assert_that(self.breaker.state, is_(equal_to(CircuitBreaker.CLOSED)))
+
+        self.call(False, elapsed_millis=5000)
+        assert_that(self.breaker.state, is_(equal_to(CircuitBreaker.OPEN)))
+        assert_that(calling(self.breaker.acquire), raises(ElasticsearchUnavailableError))
+
+    def test_half_open_probe(self):
+        self.breaker.open()
+
+        self.clock.now = 10
+        self.breaker.acquire()
+        assert_that(self.breaker.state, is_(equal_to(CircuitBreaker.HALF_OPEN)))
+        assert_that(calling(self.breaker.acquire), raises(ElasticsearchUnavailableError))
+
+        self.breaker.record(True, 1)
+        assert_that(self.breaker.state, is_(equal_to(CircuitBreaker.OPEN)))
+
+        self.clock.now = 20
+        self.call(False)
+        assert_that(self.breaker.state, is_(equal_to(CircuitBreaker.CLOSED)))
+
+
+def test_concurrency_limiter():
+    limiter = ConcurrencyLimiter(max_in_flight=1)
+
+    with limiter.limiting():
+        assert_that(calling(limiter.limiting().__enter__), raises(ElasticsearchUnavailableError))
+
+    with limiter.limiting():
+        pass
+
+
+def test_fail_fast():
+    def loader(metadata):
+        return dict(
+            elasticsearch_client=dict(
+                # NB: nothing listens here; connections are refused
+                host="localhost:1",
+                use_circuit_breaker="true",
+                circuit_breaker_minimum_calls="2",
+                max_in_flight="10",
+            ),
+        )
+
+    graph = create_object_graph("example", testing=True, loader=loader)
+    client = graph.elasticsearch_client
+    assert_that(client.transport, is_(instance_of(ResilientTransport)))
+
+    for _ in range(2):
+        assert_that(calling(client.get).with_args(index="example", id="1"), raises(ConnectionError))
+
+    assert_that(
+        calling(client.get).with_args(index="example", id="1"),
+        raises(ElasticsearchUnavailableError),
+    )
+
+
+def test_unavailable_error():
+    error = ElasticsearchUnavailableError()
+    assert_that(error.retryable, is_(equal_to(True)))
+    assert_that(error.status_code, is_(equal_to(503)))
+
+
+def test_is_transient():
+    assert_that(is_transient(ConnectionTimeout("TIMEOUT", "timed out", None)), is_(equal_to(True)))
+    assert_that(is_transient(TransportError(429, "es_rejected_execution_exception")), is_(equal_to(True)))
+    assert_that(is_transient(TransportError(500, "internal_server_error")), is_(equal_to(False)))
+    assert_that(is_transient(NotFoundError(404, "not_found")), is_(equal_to(False)))
+
+
+class TestRetryPolicy:
+
+    def setup_method(self):
+        self.delays = []
+        self.policy = RetryPolicy(
+            max_attempts=3,
+            base_delay_millis=100,
+            budget_ratio=0.5,
+            budget_tokens=2,
+            sleep=self.delays.append,
+            random=lambda: 1.0,
+        )
+
+    def test_retry_with_backoff(self):
+        func = Mock(side_effect=[TransportError(503, "unavailable"), TransportError(429, "rejected"), "result"])
+
+        assert_that(self.policy.run(func), is_(equal_to("result")))
+        assert_that(func.call_count, is_(equal_to(3)))
+        assert_that(self.delays, is_(equal_to([0.1, 0.2])))
+
+    def test_max_attempts(self):
+        func = Mock(side_effect=TransportError(503, "unavailable"))
+
+        assert_that(calling(self.policy.run).with_args(func), raises(TransportError))
+        assert_that(func.call_count, is_(equal_to(3)))
+
+    def test_not_transient(self):
+        func = Mock(side_effect=NotFoundError(404, "not_found"))
+
+        assert_that(calling(self.policy.run).with_args(func), raises(NotFoundError))
+        assert_that(func.call_count, is_(equal_to(1)))
+
+    def test_budget(self):
+        func = Mock(side_effect=TransportError(503, "unavailable"))
+
+        assert_that(calling(self.policy.run).with_args(func), raises(TransportError))
+        assert_that(calling(self.policy.run).with_args(func), raises(TransportError))
+        # 2 retries spent of a budget of 2 tokens, plus half a token earned per operation
+        assert_that(func.call_count, is_(equal_to(4)))
+
+
+class TestRetriedOperations:
+
+    def setup_method(self):
+        def loader(metadata):
+            return dict(
+                elasticsearch_retry_policy=dict(
+                    max_attempts="2",
+                ),
+            )
+
+        self.graph = create_object_graph("example", testing=True, loader=loader)
+        self.graph.elasticsearch_retry_policy.sleep = Mock()
+        self.store = self.graph.person_store
+
+    def test_search(self):
+        with patch.object(self.store.elasticsearch_client, "search") as mocked:
+            mocked.side_effect = [
+                TransportError(503, "unavailable"),
+                dict(took=1, hits=dict(total=dict(value=0, relation="eq"), hits=[])),
+            ]
+            assert_that(self.store.search(read_only=True), is_(equal_to([])))
+
+        assert_that(mocked.call_count, is_(equal_to(2)))
+
+    def test_retrieve_not_found(self):
+        with patch.object(self.store.elasticsearch_client, "get") as mocked:
+            mocked.side_effect = NotFoundError(404, "not_found")
+            assert_that(calling(self.store.retrieve).with_args("1"), raises(ElasticsearchNotFoundError))
+
+        assert_that(mocked.call_count, is_(equal_to(1)))
+
+    def test_replace(self):
+        person = Person(id="1", first="Kevin", last="Durant", origin_planet=Planet.EARTH)
+        with patch.object(self.store.elasticsearch_client, "index") as mocked:
+            mocked.side_effect = [
+                TransportError(503, "unavailable"),
+                dict(result="created", _seq_no=1, _primary_term=1),
+            ]
+            self.store.replace(person.id, person)
+
+        assert_that(mocked.call_count, is_(equal_to(2)))
+
+    def test_conditional_replace_not_retried(self):
+        person = Person(id="1", first="Kevin", last="Durant", origin_planet=Planet.EARTH)
+        person._seq_no, person._primary_term = 1, 1
+        with patch.object(self.store.elasticsearch_client, "index") as mocked:
+            mocked.side_effect = TransportError(503, "unavailable")
+            assert_that(
+                calling(self.store.replace).with_args(person.id, person),
+                raises(TransportError),
+            )
+
+        assert_that(mocked.call_count, is_(equal_to(1)))
+
+
+class TestHedgingPolicy:
+
+    def setup_method(self):
+        self.policy = self.create_policy()
+        self.released = Event()
+        self.preferences = []
+
+    def create_policy(self, **kwargs):
+        return HedgingPolicy(
+            enabled=True,
+            percentile=50,
+            min_delay_millis=1,
+            minimum_samples=2,
+            budget_ratio=0,
+            budget_tokens=1,
+            **kwargs
+        )
+
+    def send(self, preference):
+        self.preferences.append(preference)
+        if preference == "user-1":
+            # the original request is slow
+            self.released.wait(1)
+            return "primary"
+        return "hedge"
+
+    def run(self):
+        on_hedge = Mock()
+        try:
+            return self.policy.run(self.send, preference="user-1", on_hedge=on_hedge), on_hedge.call_count
+        finally:
+            self.released.set()
+
+    def test_not_enough_samples(self):
+        self.released.set()
+        assert_that(self.run(), is_(equal_to(("primary", 0))))
+
+    def test_hedge(self):
+        for _ in range(2):
+            self.policy.latencies.record(5)
+
+        assert_that(self.run(), is_(equal_to(("hedge", 1))))
+        assert_that(self.preferences, is_(equal_to(["user-1", "user-1:hedge"])))
+
+    def test_budget(self):
+        for _ in range(2):
+            self.policy.latencies.record(5)
+        self.policy.budget.withdraw()
+
+        assert_that(self.run(), is_(equal_to(("primary", 0))))
+        assert_that(self.preferences, is_(equal_to(["user-1"])))
+
+    def test_workers_busy(self):
+        self.policy = self.create_policy(max_workers=1)
+        for _ in range(2):
+            self.policy.latencies.record(5)
+
+        # NB: the hedge is dropped instead of waiting for the primary's worker
+        assert_that(self.run(), is_(equal_to(("primary", 0))))
+        assert_that(self.preferences, is_(equal_to(["user-1"])))
+
+    def test_no_workers(self):
+        for _ in range(2):
+            self.policy.latencies.record(5)
+        self.policy.workers = BoundedSemaphore(0)
+        self.released.set()
+
+        # NB: the primary runs on the caller's thread
+        assert_that(self.run(), is_(equal_to(("primary", 0))))
+        assert_that(self.policy.executor, is_(none()))
+
+
+def test_search_preference():
+    graph = create_object_graph("example", testing=True)
+    store = graph.person_store
+
+    with patch.object(store.elasticsearch_client, "search") as mocked:
+        mocked.return_value = dict(took=1, hits=dict(total=dict(value=0, relation="eq"), hits=[]))
+        store.search(read_only=True, preference="user-1")
+
+    assert_that(mocked.call_args.kwargs["preference"], is_(equal_to("user-1")))
@@ -0,0 +1,162 @@
+"""
+Test custom routing.
+
+"""
+from unittest.mock import patch
+
+from elasticsearch_dsl import Keyword, Text
+from hamcrest import (
+    assert_that,
+    calling,
+    contains,
+    equal_to,
+    has_entries,
+    has_entry,
+    has_property,
+    is_,
+    none,
+    raises,
+)
+from microcosm.api import binding, create_object_graph
+
+from microcosm_elasticsearch.errors import ElasticsearchError, ElasticsearchNotFoundError
+from microcosm_elasticsearch.mapping import create_mapping
+from microcosm_elasticsearch.models import Model
+from microcosm_elasticsearch.searching import SearchIndex
+from microcosm_elasticsearch.store import Store
+
+
+class Account(Model):
+    __routing_field__ = "tenant_id"
+
+    tenant_id = Keyword(required=True)
+    name = Text()
+
+
+@binding("account_index")
+def create_account_index(graph):
+    return graph.elasticsearch_index_registry.register(
+        name="account",
+        version="v1",
+        mapping=create_mapping(Account, routing_required=True),
+    )
+
+
+@binding("account_search_index")
+class AccountSearchIndex(SearchIndex):
+
+    def __init__(self, graph):
+        super().__init__(graph, graph.account_index)
+
+
+@binding("account_store")
+class AccountStore(Store):
+
+    def __init__(self, graph):
+        super().__init__(graph, graph.account_index, Account, graph.account_search_index)
+
+
+def test_get_routing():
+    assert_that(Account(tenant_id="tenant").get_routing(), is_(equal_to("tenant")))
+    assert_that(Account().get_routing(), is_(none()))
+    assert_that(Model().get_routing(), is_(none()))
+
+
+def test_create_mapping_routing_required():
+    assert_that(
+        create_mapping(Account, routing_required=True).to_dict(),
+        has_entry("_routing", dict(required=True)),
+    )
+
+
+def test_search_routing_params():
+    graph = create_object_graph("example", testing=True)
+    search_index = graph.account_search_index
+
+    assert_that(
+        search_index._search(routing="tenant")._params,
+        has_entries(routing="tenant"),
+    )
+    assert_that(
+        search_index._search(routing=["one", "two"])._params,
+        has_entries(routing="one,two"),
+    )
+
+
+def test_create_applies_routing():
+    graph = create_object_graph("example", testing=True)
+    store = graph.account_store
+
+    with patch.object(store.elasticsearch_client, "create") as mocked:
+        store.create(Account(tenant_id="tenant", name="Acme"))
+
+    assert_that(mocked.call_args.kwargs, has_entries(routing="tenant"))
+
+
+class TestRouting:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True)
+        self.store = self.graph.account_store
+        self.graph.elasticsearch_index_registry.createall(force=True)
+
+        self.acme = Account(
+            tenant_id="one",
+            name="Acme",
+        )
+        self.initech = Account(
+            tenant_id="two",
+            name="Initech",
+        )
+
+    def test_retrieve(self):
+        self.store.create(self.acme)
+
+        assert_that(
+            self.store.retrieve(self.acme.id, routing="one"),
+            has_property("name", "Acme"),
+        )
+
+    def test_retrieve_requires_routing(self):
+        self.store.create(self.acme)
+
+        assert_that(
+            calling(self.store.retrieve).with_args(self.acme.id),
+            raises(ElasticsearchError),
+        )
+
+    def test_update(self):
+        self.store.create(self.acme)
+        self.acme.name = "Acme Corp"
+
+        assert_that(
+            self.store.update(self.acme.id, self.acme),
+            has_property("name", "Acme Corp"),
+        )
+
+    def test_delete(self):
+        self.store.create(self.acme)
+        self.store.delete(self.acme.id, routing="one")
+
+        assert_that(
+            calling(self.store.retrieve).with_args(self.acme.id, routing="one"),
+            raises(ElasticsearchNotFoundError),
+        )
+
+    def test_bulk_and_search(self):
+        with self.store.flushing():
+            self.store.bulk(
+                actions=[
+                    ("index", self.acme),
+                    ("index", self.initech),
+                ],
+                batch_size=2,
+            )
+
+        assert_that(
+            self.store.search(routing="two"),
+            contains(
+                has_property("id", self.initech.id),
+            ),
+        )
+        assert_that(self.store.count(routing="one"), is_(equal_to(1)))
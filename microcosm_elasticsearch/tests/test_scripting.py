@@ -0,0 +1,91 @@
+"""
+Test scripted updates.
+
+"""
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains,
+    equal_to,
+    has_entries,
+    is_,
+    raises,
+    starts_with,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.scripting import (
+    INCREMENT_SCRIPT,
+    TOUCH_SCRIPT,
+    ScriptedUpdate,
+    add_to_set,
+    increment,
+)
+from microcosm_elasticsearch.tests.fixtures import Person
+
+
+def test_to_script():
+    update = ScriptedUpdate("id", "ctx._source.first = params.first", params=dict(first="Kevin"))
+
+    assert_that(
+        update.to_script(updated_at=1000),
+        has_entries(
+            source=starts_with(TOUCH_SCRIPT),
+            lang="painless",
+            params=dict(first="Kevin", updated_at=1000),
+        ),
+    )
+
+
+def test_increment():
+    update = increment("id", "visits", 2)
+
+    assert_that(update.script, is_(equal_to(INCREMENT_SCRIPT)))
+    assert_that(update.params, is_(equal_to(dict(field="visits", value=2))))
+
+
+def test_bulk_scripted_update():
+    graph = create_object_graph("example", testing=True)
+    store = graph.person_store
+    kevin = Person(first="Kevin", last="Durant")
+
+    with patch.object(store, "new_timestamp") as mocked_timestamp:
+        mocked_timestamp.return_value = 1000
+        with patch("microcosm_elasticsearch.store.bulk") as mocked_bulk:
+            store.bulk(
+                actions=[
+                    ("update", add_to_set("id", "tags", "mvp", upsert=kevin, retry_on_conflict=3)),
+                ],
+                batch_size=1,
+            )
+
+    assert_that(
+        mocked_bulk.call_args.kwargs["actions"],
+        contains(
+            has_entries(
+                _op_type="update",
+                _id="id",
+                _index=store.get_index_name(),
+                retry_on_conflict=3,
+                script=has_entries(params=dict(field="tags", value="mvp", updated_at=1000)),
+                upsert=has_entries(id="id", first="Kevin", created_at=1000, updated_at=1000),
+            ),
+        ),
+    )
+
+
+def test_bulk_scripted_update_requires_update_action():
+    graph = create_object_graph("example", testing=True)
+    store = graph.person_store
+
+    assert_that(
+        calling(store.bulk).with_args(
+            actions=[
+                ("index", increment("id", "visits")),
+            ],
+            batch_size=1,
+        ),
+        raises(ValueError),
+    )
@@ -2,15 +2,24 @@
 Test Elasticsearch searching.
 
 """
+from unittest.mock import patch
+
 from hamcrest import (
+    all_of,
     assert_that,
     contains,
+    contains_inanyorder,
     equal_to,
+    has_entries,
     has_properties,
+    instance_of,
     is_,
+    not_,
 )
 from microcosm.api import create_object_graph
 
+from microcosm_elasticsearch.records import record_class_for
+from microcosm_elasticsearch.searching import SearchIndex
 from microcosm_elasticsearch.tests.fixtures import Person, PersonSearchIndex, Player
 
 
@@ -41,6 +50,7 @@ class TestIndexSearch:
             self.player_store.create(self.steph)
 
         assert_that(self.search_index.count(), is_(equal_to(2)))
+        assert_that(self.search_index.count(request_cache=True), is_(equal_to(2)))
 
     def test_search(self):
         with self.person_store.flushing():
@@ -57,6 +67,25 @@ class TestIndexSearch:
             ),
         )
 
+    def test_search_read_only(self):
+        with self.person_store.flushing():
+            self.person_store.create(self.kevin)
+            self.player_store.create(self.steph)
+
+        assert_that(
+            self.search_index.search(read_only=True),
+            contains_inanyorder(
+                all_of(
+                    instance_of(record_class_for(Person)),
+                    has_properties(id=self.kevin.id, first="Kevin", last="Durant"),
+                ),
+                all_of(
+                    instance_of(record_class_for(Player)),
+                    has_properties(id=self.steph.id, jersey_number="30"),
+                ),
+            ),
+        )
+
     def test_count_single_type(self):
         with self.person_store.flushing():
             self.person_store.create(self.kevin)
@@ -109,3 +138,94 @@ class TestIndexSearch:
                 ),
             ),
         )
+
+    def test_aggregate(self):
+        with self.person_store.flushing():
+            self.person_store.create(self.kevin)
+
+        with self.player_store.flushing():
+            self.player_store.create(self.steph)
+
+        aggregations = self.search_index.aggregate(
+            dict(by_doctype=dict(terms=dict(field="doctype"))),
+            request_cache=True,
+        )
+        assert_that(
+            [bucket["key"] for bucket in aggregations["by_doctype"]["buckets"]],
+            contains_inanyorder("person", "player"),
+        )
+        assert_that(
+            self.search_index.request_cache_stats(),
+            has_entries(miss_count=instance_of(int)),
+        )
+
+
+class TenantSearchIndex(SearchIndex):
+
+    @property
+    def request_cache(self):
+        return True
+
+    def get_preference(self, preference=None, tenant=None, **kwargs):
+        return preference or tenant
+
+
+class TestRequestCache:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True)
+        self.search_index = TenantSearchIndex(self.graph, self.graph.example_index)
+        self.response = dict(
+            took=1,
+            hits=dict(total=dict(value=2, relation="eq"), hits=[]),
+            aggregations=dict(by_last=dict(buckets=[])),
+        )
+
+    def test_count(self):
+        with patch.object(self.search_index.elasticsearch_client, "search") as mocked:
+            mocked.return_value = self.response
+            assert_that(self.search_index.count(tenant="tenant-1"), is_(equal_to(2)))
+
+        assert_that(mocked.call_args.kwargs, has_entries(
+            body=all_of(
+                has_entries(size=0, track_total_hits=True),
+                not_(has_entries(sort=instance_of(list))),
+            ),
+            preference="tenant-1",
+            request_cache=True,
+        ))
+
+    def test_count_index_default(self):
+        search_index = self.graph.example_search_index
+
+        with patch.object(search_index.elasticsearch_client, "count") as mocked:
+            mocked.return_value = dict(count=2)
+            assert_that(search_index.count(preference="user-1"), is_(equal_to(2)))
+
+        assert_that(mocked.call_args.kwargs, all_of(
+            has_entries(preference="user-1"),
+            not_(has_entries(request_cache=instance_of(bool))),
+        ))
+
+    def test_aggregate(self):
+        with patch.object(self.search_index.elasticsearch_client, "search") as mocked:
+            mocked.return_value = self.response
+            aggregations = self.search_index.aggregate(dict(by_last=dict(terms=dict(field="last"))))
+
+        assert_that(aggregations, has_entries(by_last=has_entries(buckets=[])))
+        assert_that(mocked.call_args.kwargs, has_entries(
+            body=has_entries(size=0, aggs=has_entries(by_last=instance_of(dict))),
+            request_cache=True,
+        ))
+
+    def test_request_cache_stats(self):
+        with patch.object(self.search_index.elasticsearch_client.indices, "stats") as mocked:
+            mocked.return_value = dict(_all=dict(total=dict(request_cache=dict(
+                memory_size_in_bytes=1024,
+                evictions=0,
+                hit_count=3,
+                miss_count=1,
+            ))))
+            stats = self.search_index.request_cache_stats()
+
+        assert_that(stats, has_entries(hit_count=3, miss_count=1, hit_rate=0.75))
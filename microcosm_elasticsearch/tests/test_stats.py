@@ -0,0 +1,90 @@
+"""
+Test the stats exporter.
+
+"""
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    has_entries,
+    has_key,
+    is_,
+    not_,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.stats import StatsExporter
+from microcosm_elasticsearch.tests.fixtures import Clock
+
+
+def make_index_stats(index_total, index_time, query_total, query_time):
+    return dict(indices=dict(example_v1_test=dict(
+        primaries=dict(docs=dict(count=100)),
+        total=dict(
+            store=dict(size_in_bytes=4096),
+            indexing=dict(index_total=index_total, index_time_in_millis=index_time),
+            search=dict(query_total=query_total, query_time_in_millis=query_time),
+            refresh=dict(total_time_in_millis=index_time),
+            merges=dict(total_time_in_millis=0),
+        ),
+    )))
+
+
+def make_nodes_stats(rejected):
+    return dict(nodes=dict(
+        node1=dict(thread_pool=dict(search=dict(rejected=rejected, queue=1, active=2))),
+        node2=dict(thread_pool=dict(search=dict(rejected=rejected, queue=0, active=1))),
+    ))
+
+
+class TestStatsExporter:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True)
+        self.graph.use("example_index")
+        self.clock = Clock()
+        self.exporter = StatsExporter(self.graph, clock=self.clock)
+        self.client = self.exporter.elasticsearch_client
+
+    def export(self, index_stats, nodes_stats):
+        self.graph.metrics.reset_mock()
+        with patch.object(self.client.indices, "stats", return_value=index_stats), \
+                patch.object(self.client.cluster, "health", return_value=dict(cluster_name="test", status="yellow")), \
+                patch.object(self.client.nodes, "stats", return_value=nodes_stats):
+            self.exporter.export()
+
+        return {
+            (call.args[0], tuple(call.kwargs["tags"])): call.args[1]
+            for call in self.graph.metrics.gauge.call_args_list
+        }
+
+    def test_export(self):
+        gauges = self.export(make_index_stats(1000, 2000, 500, 100), make_nodes_stats(rejected=5))
+        assert_that(gauges, has_entries({
+            ("elasticsearch.cluster.status", ("cluster:test",)): 1,
+            ("elasticsearch.index.doc_count", ("index:example_v1_test",)): 100,
+            ("elasticsearch.index.store_size", ("index:example_v1_test",)): 4096,
+            ("elasticsearch.thread_pool.queue", ("thread_pool:search",)): 1,
+            ("elasticsearch.thread_pool.active", ("thread_pool:search",)): 3,
+        }))
+        assert_that(gauges, is_(not_(has_key(("elasticsearch.index.query_rate", ("index:example_v1_test",))))))
+
+        self.clock.now = 10
+        gauges = self.export(make_index_stats(2000, 4000, 1500, 600), make_nodes_stats(rejected=10))
+        assert_that(gauges, has_entries({
+            ("elasticsearch.index.indexing_rate", ("index:example_v1_test",)): 100.0,
+            ("elasticsearch.index.indexing_latency", ("index:example_v1_test",)): 2.0,
+            ("elasticsearch.index.query_rate", ("index:example_v1_test",)): 100.0,
+            ("elasticsearch.index.query_latency", ("index:example_v1_test",)): 0.5,
+            ("elasticsearch.index.refresh_time", ("index:example_v1_test",)): 200.0,
+            ("elasticsearch.index.merge_time", ("index:example_v1_test",)): 0.0,
+            ("elasticsearch.thread_pool.rejected_rate", ("thread_pool:search",)): 1.0,
+        }))
+
+    def test_counter_reset(self):
+        self.export(make_index_stats(1000, 2000, 500, 100), make_nodes_stats(rejected=5))
+
+        self.clock.now = 10
+        gauges = self.export(make_index_stats(10, 20, 5, 1), make_nodes_stats(rejected=0))
+        assert_that(gauges, is_(not_(has_key(("elasticsearch.index.indexing_rate", ("index:example_v1_test",))))))
+        assert_that(gauges, is_(not_(has_key(("elasticsearch.thread_pool.rejected_rate", ("thread_pool:search",))))))
@@ -10,18 +10,22 @@ from hamcrest import (
     assert_that,
     calling,
     contains,
+    empty,
     equal_to,
     has_entry,
     has_key,
     has_property,
     is_,
+    is_not,
     none,
+    not_none,
     raises,
 )
 from microcosm.api import create_object_graph
 
 from microcosm_elasticsearch.assertions import assert_that_eventually, assert_that_not_eventually
 from microcosm_elasticsearch.errors import ElasticsearchConflictError, ElasticsearchNotFoundError
+from microcosm_elasticsearch.scripting import INCREMENT_SCRIPT, increment
 from microcosm_elasticsearch.tests.fixtures import Person, Planet, SelectorAttribute
 
 
@@ -221,6 +225,42 @@ class TestStore:
             ),
         )
 
+    def test_delete_matching(self):
+        with self.store.flushing():
+            self.store.create(self.kevin)
+            self.store.create(self.steph)
+
+        response = self.store.delete_matching(q=self.kevin.first, poll_interval_seconds=0.1)
+        self.store.get_index().refresh()
+
+        assert_that(response, has_entry("deleted", 1))
+        assert_that(
+            self.store.search(),
+            contains(
+                has_property("id", self.steph.id),
+            ),
+        )
+
+    def test_update_matching(self):
+        with self.store.flushing():
+            self.store.create(self.kevin)
+            self.store.create(self.steph)
+
+        statuses = []
+        response = self.store.update_matching(
+            "ctx._source.middle = params.middle",
+            params=dict(middle="MVP"),
+            q=self.steph.first,
+            requests_per_second=100,
+            poll_interval_seconds=0.1,
+            progress=statuses.append,
+        )
+
+        assert_that(response, has_entry("updated", 1))
+        assert_that(statuses, is_not(empty()))
+        assert_that(self.store.retrieve(self.steph.id), has_property("middle", "MVP"))
+        assert_that(self.store.retrieve(self.kevin.id), has_property("middle", none()))
+
     def test_update_not_found(self):
         assert_that(
             calling(self.store.update).with_args(self.store.new_object_id(), self.kevin),
@@ -241,6 +281,59 @@ class TestStore:
             ),
         )
 
+    def test_update_script(self):
+        self.store.create(self.kevin)
+
+        updated = self.store.update_script(
+            self.kevin.id,
+            "ctx._source.middle = params.middle",
+            params=dict(middle="MVP"),
+        )
+        assert_that(
+            updated,
+            all_of(
+                has_property("id", self.kevin.id),
+                has_property("first", "Kevin"),
+                has_property("middle", "MVP"),
+            ),
+        )
+        assert_that(
+            self.store.retrieve(self.kevin.id),
+            has_property("middle", "MVP"),
+        )
+
+    def test_update_script_not_found(self):
+        assert_that(
+            calling(self.store.update_script).with_args(self.kevin.id, INCREMENT_SCRIPT),
+            raises(ElasticsearchNotFoundError),
+        )
+
+    def test_update_script_upsert(self):
+        for _ in range(2):
+            update = increment(self.kevin.id, "visits")
+            self.store.update_script(update.id, update.script, update.params, upsert=self.kevin)
+
+        assert_that(
+            self.store.retrieve(self.kevin.id),
+            all_of(
+                has_property("first", "Kevin"),
+                has_property("visits", 1),
+            ),
+        )
+
+    def test_bulk_update_script(self):
+        self.store.create(self.kevin)
+        self.store.bulk(
+            actions=[
+                ("update", increment(self.kevin.id, "visits", 2)),
+            ],
+            batch_size=1,
+        )
+        assert_that(
+            self.store.retrieve(self.kevin.id),
+            has_property("visits", 2),
+        )
+
     def test_replace_not_found(self):
         self.kevin.middle = "MVP"
         self.store.replace(self.kevin.id, self.kevin)
@@ -268,6 +361,88 @@ class TestStore:
             ),
         )
 
+    def test_update_conflict(self):
+        self.store.create(self.kevin)
+        stale = self.store.retrieve(self.kevin.id)
+
+        self.kevin.middle = "MVP"
+        self.store.update(self.kevin.id, self.kevin)
+
+        stale.middle = "Stale"
+        assert_that(
+            calling(self.store.update).with_args(self.kevin.id, stale),
+            raises(ElasticsearchConflictError),
+        )
+
+    def test_replace_conflict(self):
+        self.store.create(self.kevin)
+        stale = self.store.retrieve(self.kevin.id)
+
+        self.store.replace(self.kevin.id, self.kevin)
+
+        assert_that(
+            calling(self.store.replace).with_args(self.kevin.id, stale),
+            raises(ElasticsearchConflictError),
+        )
+
+    def test_delete_conflict(self):
+        self.store.create(self.kevin)
+
+        assert_that(
+            calling(self.store.delete).with_args(
+                self.kevin.id,
+                if_seq_no=self.kevin._seq_no + 1,
+                if_primary_term=self.kevin._primary_term,
+            ),
+            raises(ElasticsearchConflictError),
+        )
+
+    def test_search_carries_seq_no(self):
+        with self.store.flushing():
+            self.store.create(self.kevin)
+
+        assert_that(
+            self.store.search(),
+            contains(
+                all_of(
+                    has_property("_seq_no", self.kevin._seq_no),
+                    has_property("_primary_term", self.kevin._primary_term),
+                ),
+            ),
+        )
+
+    def test_modify(self):
+        self.store.create(self.kevin)
+
+        def set_middle(instance):
+            instance.middle = "MVP"
+
+        self.store.modify(self.kevin.id, set_middle)
+        assert_that(
+            self.store.retrieve(self.kevin.id),
+            has_property("middle", "MVP"),
+        )
+
+    def test_modify_retries(self):
+        with patch.object(self.store, "retrieve") as mocked_retrieve:
+            with patch.object(self.store, "replace") as mocked_replace:
+                mocked_replace.side_effect = [ElasticsearchConflictError, self.kevin]
+                result = self.store.modify(self.kevin.id, lambda instance: None)
+
+        assert_that(result, is_(equal_to(self.kevin)))
+        assert_that(mocked_retrieve.call_count, is_(equal_to(2)))
+
+    def test_modify_retries_exhausted(self):
+        with patch.object(self.store, "retrieve"):
+            with patch.object(self.store, "replace") as mocked_replace:
+                mocked_replace.side_effect = ElasticsearchConflictError
+                assert_that(
+                    calling(self.store.modify).with_args(self.kevin.id, lambda instance: None, retries=2),
+                    raises(ElasticsearchConflictError),
+                )
+
+        assert_that(mocked_replace.call_count, is_(equal_to(3)))
+
     def test_bulk(self):
         self.store.bulk(
             actions=[
@@ -285,6 +460,47 @@ class TestStore:
             ),
         )
 
+    def test_bulk_trusted(self):
+        with self.store.flushing():
+            results = self.store.bulk(
+                actions=[
+                    ("index", self.kevin),
+                    ("delete", self.steph),
+                ],
+                batch_size=2,
+                trusted=True,
+            )
+
+        assert_that(results[0][0], is_(equal_to(1)))
+        assert_that(results[0][1][0]["delete"], has_entry("result", "not_found"))
+        assert_that(
+            self.store.retrieve(self.kevin.id),
+            all_of(
+                has_property("first", "Kevin"),
+                has_property("origin_planet", Planet.EARTH),
+            ),
+        )
+
+    def test_bulk_raw(self):
+        results = self.store.bulk_raw(
+            actions=[
+                ("index", None, dict(first="Kevin", last="Durant", origin_planet="EARTH")),
+                ("create", "steph", b'{"first": "Steph", "last": "Curry"}'),
+            ],
+            batch_size=1,
+        )
+
+        assert_that(results, contains((1, []), (1, [])))
+        assert_that(
+            self.store.retrieve("steph"),
+            all_of(
+                has_property("id", "steph"),
+                has_property("first", "Steph"),
+                has_property("doctype", "person"),
+                has_property("created_at", not_none()),
+            ),
+        )
+
     def test_bulk_with_report(self):
         results = self.store.bulk(
             actions=[
@@ -0,0 +1,58 @@
+"""
+Test task polling.
+
+"""
+from unittest.mock import MagicMock
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains,
+    equal_to,
+    is_,
+    raises,
+)
+
+from microcosm_elasticsearch.errors import ElasticsearchError
+from microcosm_elasticsearch.tasks import wait_for_task
+
+
+def test_wait_for_task():
+    client = MagicMock()
+    client.tasks.get.side_effect = [
+        dict(completed=False, task=dict(status=dict(total=2, deleted=1))),
+        dict(completed=True, task=dict(status=dict(total=2, deleted=2)), response=dict(deleted=2)),
+    ]
+    statuses = []
+
+    response = wait_for_task(client, "node:1", poll_interval_seconds=0, progress=statuses.append)
+
+    assert_that(response, is_(equal_to(dict(deleted=2))))
+    assert_that(statuses, contains(
+        dict(total=2, deleted=1),
+        dict(total=2, deleted=2),
+    ))
+
+
+def test_wait_for_task_error():
+    client = MagicMock()
+    client.tasks.get.return_value = dict(completed=True, task=dict(), error=dict(type="failure"))
+
+    assert_that(
+        calling(wait_for_task).with_args(client, "node:1", poll_interval_seconds=0),
+        raises(ElasticsearchError),
+    )
+
+
+def test_wait_for_task_failures():
+    client = MagicMock()
+    client.tasks.get.return_value = dict(
+        completed=True,
+        task=dict(),
+        response=dict(deleted=1, failures=[dict(id="2", cause=dict(type="es_rejected_execution_exception"))]),
+    )
+
+    assert_that(
+        calling(wait_for_task).with_args(client, "node:1", poll_interval_seconds=0),
+        raises(ElasticsearchError, "es_rejected_execution_exception"),
+    )
@@ -0,0 +1,126 @@
+"""
+Test query templates.
+
+"""
+from json import loads
+from unittest.mock import patch
+
+from hamcrest import (
+    all_of,
+    assert_that,
+    calling,
+    contains,
+    equal_to,
+    has_entries,
+    has_properties,
+    instance_of,
+    is_,
+    raises,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.memory.client import InMemoryCluster, InMemoryElasticsearch
+from microcosm_elasticsearch.templates import Param, QueryTemplate
+from microcosm_elasticsearch.tests.fixtures import Person, PersonSearchIndex
+
+
+class TemplatedSearchIndex(PersonSearchIndex):
+
+    by_last = QueryTemplate(
+        dict(
+            query=dict(bool=dict(filter=[dict(terms=dict(last=Param("last")))])),
+            size=Param("limit", default=10),
+            seq_no_primary_term=True,
+        ),
+    )
+
+    by_first = QueryTemplate(
+        dict(query=dict(match=dict(first=Param("first")))),
+        id="person_by_first",
+    )
+
+
+def test_render():
+    body = TemplatedSearchIndex.by_last.render(dict(last=["durant", "Cur\"ry"]))
+
+    assert_that(loads(body), is_(equal_to(dict(
+        query=dict(bool=dict(filter=[dict(terms=dict(last=["durant", "Cur\"ry"]))])),
+        size=10,
+        seq_no_primary_term=True,
+    ))))
+
+
+def test_resolve():
+    template = TemplatedSearchIndex.by_last
+
+    assert_that(template.resolve(dict(last=["durant"], limit=1)), has_entries(limit=1))
+    assert_that(calling(template.resolve).with_args(dict()), raises(ValueError, "Missing"))
+    assert_that(calling(template.resolve).with_args(dict(last=[], first="")), raises(ValueError, "Unknown"))
+
+
+def test_to_script():
+    assert_that(TemplatedSearchIndex.by_first.to_script(), is_(equal_to(dict(
+        script=dict(
+            lang="mustache",
+            source='{"query":{"match":{"first":{{#toJson}}first{{/toJson}}}}}',
+        ),
+    ))))
+
+
+class TestSearchTemplate:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True)
+        self.search_index = TemplatedSearchIndex(self.graph, self.graph.example_index, Person)
+
+    def test_put_templates(self):
+        with patch.object(self.search_index.elasticsearch_client, "put_script") as mocked:
+            self.search_index.put_templates()
+
+        mocked.assert_called_once_with(id="person_by_first", body=TemplatedSearchIndex.by_first.to_script())
+
+    def test_stored_template(self):
+        with patch.object(self.search_index.elasticsearch_client, "search_template") as mocked:
+            mocked.return_value = dict(took=1, hits=dict(total=dict(value=0, relation="eq"), hits=[]))
+            self.search_index.search_template(
+                TemplatedSearchIndex.by_first,
+                params=dict(first="Kevin"),
+                preference="user-1",
+            )
+
+        assert_that(mocked.call_args.kwargs, has_entries(
+            body=dict(id="person_by_first", params=dict(first="Kevin")),
+            preference="user-1",
+        ))
+
+    def test_precompiled_template(self):
+        self.search_index.elasticsearch_client = InMemoryElasticsearch(cluster=InMemoryCluster())
+        client = self.search_index.elasticsearch_client
+        for id, first, last in [("1", "Kevin", "Durant"), ("2", "Steph", "Curry")]:
+            client.index(
+                index=self.search_index.index_name,
+                id=id,
+                body=dict(
+                    id=id,
+                    first=first,
+                    last=last,
+                    origin_planet="EARTH",
+                    doctype="person",
+                    created_at=1000,
+                    updated_at=1000,
+                ),
+                refresh=True,
+            )
+
+        assert_that(
+            self.search_index.search_template(TemplatedSearchIndex.by_last, params=dict(last=["durant"])),
+            contains(all_of(instance_of(Person), has_properties(first="Kevin"))),
+        )
+        assert_that(
+            self.search_index.search_template(
+                TemplatedSearchIndex.by_last,
+                params=dict(last=["durant", "curry"], limit=1),
+                read_only=True,
+            ),
+            contains(has_properties(last="Durant")),
+        )
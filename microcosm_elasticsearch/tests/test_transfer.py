@@ -0,0 +1,143 @@
+"""
+Test streaming indexes to and from NDJSON files.
+
+"""
+from io import StringIO
+from json import loads
+from os import listdir
+
+from hamcrest import (
+    assert_that,
+    contains,
+    contains_inanyorder,
+    equal_to,
+    has_entries,
+    has_properties,
+    is_,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_elasticsearch.tests.fixtures import Person, Planet, in_memory_loader
+from microcosm_elasticsearch.transfer import (
+    Checkpoint,
+    Progress,
+    export_indexes,
+    import_file,
+    import_stores,
+    open_file,
+)
+
+
+class TestTransfer:
+
+    def setup_method(self):
+        self.graph = create_object_graph("example", testing=True, loader=in_memory_loader)
+        self.client = self.graph.elasticsearch_client
+        self.store = self.graph.person_store
+        self.graph.elasticsearch_index_registry.createall(force=True)
+        self.index_name = self.store.get_index_name()
+
+        self.people = [
+            Person(first=f"Person{index}", last="Doe", origin_planet=Planet.EARTH)
+            for index in range(10)
+        ]
+        with self.store.flushing():
+            for person in self.people:
+                self.store.create(person)
+
+    def export(self, directory, **kwargs):
+        return export_indexes(self.client, [self.index_name], str(directory), stream=None, **kwargs)
+
+    def reimport(self, directory, **kwargs):
+        self.graph.elasticsearch_index_registry.createall(force=True)
+        with self.store.flushing():
+            counts = import_stores([self.store], str(directory), stream=None, **kwargs)
+        return counts
+
+    def test_export_import(self, tmp_path):
+        original = self.store.retrieve(self.people[0].id)
+        assert_that(self.export(tmp_path), has_entries({self.index_name: 10}))
+        assert_that(listdir(tmp_path), contains_inanyorder(f"{self.index_name}.000.ndjson", "export.checkpoint.json"))
+
+        with open_file(str(tmp_path / f"{self.index_name}.000.ndjson"), "rb") as file:
+            lines = [loads(line) for line in file]
+        assert_that(lines[0], has_entries(_id=self.people[0].id, _source=has_entries(first="Person0")))
+
+        assert_that(self.reimport(tmp_path), has_entries({self.index_name: (10, 0)}))
+        assert_that(self.store.count(), is_(equal_to(10)))
+        # NB: documents are imported as-is
+        assert_that(
+            self.store.retrieve(self.people[0].id),
+            has_properties(first="Person0", updated_at=original.updated_at),
+        )
+
+    def test_parallel_gzip(self, tmp_path):
+        assert_that(self.export(tmp_path, workers=2, slices=3, batch_size=2, compress=True), has_entries({
+            self.index_name: 10,
+        }))
+        assert_that(listdir(tmp_path), contains_inanyorder(
+            "export.checkpoint.json",
+            f"{self.index_name}.000.ndjson.gz",
+            f"{self.index_name}.001.ndjson.gz",
+            f"{self.index_name}.002.ndjson.gz",
+        ))
+
+        assert_that(self.reimport(tmp_path, workers=3, batch_size=3), has_entries({self.index_name: (10, 0)}))
+        assert_that(
+            [person.id for person in self.store.search(limit=20)],
+            contains_inanyorder(*[person.id for person in self.people]),
+        )
+
+    def test_resume_export(self, tmp_path):
+        self.export(tmp_path, slices=2)
+        # NB: a re-export of an incomplete slice
+        checkpoint = Checkpoint(str(tmp_path / "export.checkpoint.json"), resume=True)
+        del checkpoint.state[f"{self.index_name}.001.ndjson"]
+        checkpoint.set(f"{self.index_name}.000.ndjson", checkpoint.get(f"{self.index_name}.000.ndjson"))
+
+        assert_that(self.export(tmp_path, slices=2, resume=True), has_entries({self.index_name: 10}))
+        assert_that(self.reimport(tmp_path), has_entries({self.index_name: (10, 0)}))
+
+    def test_resume_import(self, tmp_path):
+        self.export(tmp_path)
+        name = f"{self.index_name}.000.ndjson"
+        Checkpoint(str(tmp_path / "import.checkpoint.json")).set(
+            name,
+            dict(lines=4, written=4, failed=0, complete=False),
+        )
+
+        assert_that(self.reimport(tmp_path, resume=True), has_entries({self.index_name: (10, 0)}))
+        # NB: only the remaining lines were imported
+        assert_that(self.store.count(), is_(equal_to(6)))
+
+    def test_import_file(self, tmp_path):
+        path = tmp_path / "invalid.ndjson"
+        path.write_bytes(
+            b'{"_id":"1","_source":{"first":"Kevin"}}\n'
+            b"\n"
+            b'{"_id":"2","_routing":"2","_source":{"first":"Steph"}}\n'
+        )
+        batches = []
+
+        assert_that(
+            import_file(self.store, str(path), batch_size=2, on_batch=lambda *args: batches.append(args)),
+            is_(equal_to((2, 0))),
+        )
+        assert_that(batches, contains((2, 1, 0), (1, 1, 0)))
+
+
+def test_progress():
+    stream = StringIO()
+    now = [0.0]
+    progress = Progress("export", total=30, stream=stream, clock=lambda: now[0])
+
+    for seconds in (1.0, 1.5, 2.0):
+        now[0] = seconds
+        progress.add(10)
+    progress.finish()
+
+    assert_that(stream.getvalue(), is_(equal_to(
+        "export: 10/30 documents (10 documents/second)\r"
+        "export: 30/30 documents (15 documents/second)\r"
+        "export: 30/30 documents (15 documents/second)\n"
+    )))
@@ -0,0 +1,388 @@
+"""
+Stream indexes to and from NDJSON files (e.g. to move indexes between environments).
+
+Exports scroll each index (optionally as parallel slices) and write one file per slice:
+
+    <directory>/<index name>.<slice>.ndjson[.gz]
+
+Each line holds a hit's `_id`, `_routing` (if any) and `_source`. Imports stream these files
+back through `Store.bulk_raw`, one batch at a time; documents are written as-is (sources are
+not re-validated or re-stamped).
+
+Both directions use constant memory (one batch per worker) and record their progress in a
+checkpoint file in the directory, so that an interrupted transfer can be resumed:
+
+ -  exports checkpoint completed slices; an interrupted slice is exported again
+ -  imports checkpoint the lines of each file that have been written
+
+See `main.export_main` and `main.import_main` for CLI entry points.
+
+"""
+from concurrent.futures import ThreadPoolExecutor
+from gzip import open as gzip_open
+from itertools import islice
+from json import dump, load, loads
+from logging import getLogger
+from os import (
+    listdir,
+    makedirs,
+    remove,
+    replace,
+)
+from os.path import exists, join
+from re import compile, escape
+from sys import stderr
+from threading import Lock
+from time import monotonic
+
+from elasticsearch.helpers import scan
+
+from microcosm_elasticsearch.columnar import DEFAULT_BATCH_SIZE
+from microcosm_elasticsearch.ndjson import dumps, iter_batches
+
+
+# How long scroll contexts are kept alive between batches
+DEFAULT_KEEP_ALIVE = "5m"
+
+EXPORT_CHECKPOINT = "export.checkpoint.json"
+IMPORT_CHECKPOINT = "import.checkpoint.json"
+
+SUFFIX = ".ndjson"
+GZIP_SUFFIX = ".gz"
+
+logger = getLogger("microcosm_elasticsearch.transfer")
+
+
+def to_file_name(index_name, slice_id, compress=False):
+    suffix = SUFFIX + GZIP_SUFFIX if compress else SUFFIX
+    return f"{index_name}.{slice_id:03d}{suffix}"
+
+
+def list_files(directory, index_name):
+    """
+    List the (exported) files of an index in a directory.
+
+    """
+    pattern = compile(escape(index_name) + r"\.\d+" + escape(SUFFIX) + f"({escape(GZIP_SUFFIX)})?$")
+    if not exists(directory):
+        return []
+    return sorted(name for name in listdir(directory) if pattern.match(name))
+
+
+def open_file(path, mode, compress=None):
+    if compress is None:
+        compress = path.endswith(GZIP_SUFFIX)
+    if compress:
+        return gzip_open(path, mode)
+    return open(path, mode)
+
+
+def to_line(hit):
+    """
+    Serialize a hit as an NDJSON line.
+
+    """
+    line = dict(_id=hit["_id"])
+    if hit.get("_routing") is not None:
+        line["_routing"] = hit["_routing"]
+    line["_source"] = hit["_source"]
+    return dumps(line) + b"\n"
+
+
+def to_action(line):
+    """
+    Parse an NDJSON line as a (raw) bulk action (see `Store.bulk_raw`).
+
+    """
+    data = loads(line)
+    return ("index", data["_id"], dumps(data["_source"]), data.get("_routing"))
+
+
+class Checkpoint:
+    """
+    The progress of a transfer, saved as JSON after every change.
+
+    """
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = Lock()
+        self.state = dict()
+
+        if resume and exists(path):
+            with open(path) as file:
+                self.state = load(file)
+
+    def get(self, name):
+        return self.state.get(name)
+
+    def set(self, name, value):
+        with self.lock:
+            self.state[name] = value
+            # NB: replace the file atomically so that an interrupted save does not lose the checkpoint
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as file:
+                dump(self.state, file)
+            replace(temporary_path, self.path)
+
+
+class Progress:
+    """
+    A (thread-safe) display of the progress and throughput of a transfer.
+
+    """
+    def __init__(self, label, total=None, stream=stderr, interval_seconds=1.0, clock=monotonic):
+        self.label = label
+        self.total = total
+        self.stream = stream
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+
+        self.count = 0
+        self.started_at = clock()
+        self.reported_at = None
+        self.lock = Lock()
+
+    @property
+    def rate(self):
+        elapsed_seconds = self.clock() - self.started_at
+        return self.count / elapsed_seconds if elapsed_seconds > 0 else 0.0
+
+    def format(self):
+        total = "" if self.total is None else f"/{self.total}"
+        return f"{self.label}: {self.count}{total} documents ({self.rate:.0f} documents/second)"
+
+    def add(self, count):
+        with self.lock:
+            self.count += count
+            now = self.clock()
+            if self.reported_at is None or now - self.reported_at >= self.interval_seconds:
+                self.reported_at = now
+                self.report("\r")
+
+    def finish(self):
+        with self.lock:
+            self.report("\n")
+
+    def report(self, end):
+        if self.stream is None:
+            return
+        self.stream.write(self.format() + end)
+        self.stream.flush()
+
+
+def export_slice(
+    client,
+    index_name,
+    path,
+    slice_id=0,
+    slices=1,
+    batch_size=DEFAULT_BATCH_SIZE,
+    keep_alive=DEFAULT_KEEP_ALIVE,
+    on_batch=None,
+):
+    """
+    Scroll (a slice of) an index into an NDJSON file.
+
+    The file is written under a temporary name and renamed once complete.
+
+    :returns: the number of exported documents
+
+    """
+    query = dict()
+    if slices > 1:
+        query["slice"] = dict(id=slice_id, max=slices)
+
+    hits = scan(
+        client,
+        index=index_name,
+        query=query,
+        size=batch_size,
+        scroll=keep_alive,
+    )
+
+    count = 0
+    temporary_path = f"{path}.tmp"
+    with open_file(temporary_path, "wb", compress=path.endswith(GZIP_SUFFIX)) as file:
+        for batch in iter_batches(hits, batch_size):
+            file.writelines(to_line(hit) for hit in batch)
+            count += len(batch)
+            if on_batch is not None:
+                on_batch(len(batch))
+
+    replace(temporary_path, path)
+    return count
+
+
+def export_indexes(
+    client,
+    index_names,
+    directory,
+    workers=1,
+    slices=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    keep_alive=DEFAULT_KEEP_ALIVE,
+    compress=False,
+    resume=False,
+    stream=stderr,
+):
+    """
+    Export indexes to NDJSON files.
+
+    :param workers: the number of slices exported in parallel
+    :param slices: the number of scroll slices per index; defaults to the number of workers
+    :param compress: whether to gzip files
+    :param resume: whether to skip the slices completed by a previous (interrupted) export;
+                   otherwise, existing files of the indexes are removed
+    :returns: a dictionary of index names to the number of exported documents
+
+    """
+    slices = slices or workers
+    makedirs(directory, exist_ok=True)
+
+    checkpoint = Checkpoint(join(directory, EXPORT_CHECKPOINT), resume=resume)
+    if not resume:
+        for index_name in index_names:
+            for name in list_files(directory, index_name):
+                remove(join(directory, name))
+
+    progress = Progress(
+        "export",
+        total=sum(client.count(index=index_name)["count"] for index_name in index_names),
+        stream=stream,
+    )
+
+    def export(task):
+        index_name, slice_id = task
+        name = to_file_name(index_name, slice_id, compress)
+        completed = checkpoint.get(name)
+        if completed is not None:
+            progress.add(completed["count"])
+            return completed["count"]
+
+        count = export_slice(
+            client,
+            index_name,
+            join(directory, name),
+            slice_id=slice_id,
+            slices=slices,
+            batch_size=batch_size,
+            keep_alive=keep_alive,
+            on_batch=progress.add,
+        )
+        checkpoint.set(name, dict(count=count))
+        return count
+
+    tasks = [
+        (index_name, slice_id)
+        for index_name in index_names
+        for slice_id in range(slices)
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        counts = list(executor.map(export, tasks))
+    progress.finish()
+
+    result = {index_name: 0 for index_name in index_names}
+    for (index_name, _), count in zip(tasks, counts):
+        result[index_name] += count
+    return result
+
+
+def import_file(store, path, batch_size=DEFAULT_BATCH_SIZE, skip_lines=0, on_batch=None, **kwargs):
+    """
+    Stream an NDJSON file into a store's index.
+
+    :param skip_lines: the number of lines already imported (e.g. by an interrupted import)
+    :param on_batch: called with the number of lines consumed, written and failed by each batch
+    :returns: a tuple of the number of written and failed documents
+
+    """
+    written, failed = 0, 0
+    with open_file(path, "rb") as file:
+        for batch in iter_batches(islice(file, skip_lines, None), batch_size):
+            actions = [to_action(line) for line in batch if line.strip()]
+            batch_written, batch_failed = 0, 0
+            if actions:
+                [(batch_written, errors)] = store.bulk_raw(
+                    actions,
+                    batch_size=len(actions),
+                    # NB: preserve the documents' stamps (e.g. `updated_at`)
+                    stamp=False,
+                    **kwargs
+                )
+                batch_failed = len(errors)
+                for error in errors[:1]:
+                    logger.warning(f"Failed to import {batch_failed} document(s) from {path}, e.g.: {error}")
+
+            written += batch_written
+            failed += batch_failed
+            if on_batch is not None:
+                on_batch(len(batch), batch_written, batch_failed)
+
+    return written, failed
+
+
+def import_stores(
+    stores,
+    directory,
+    workers=1,
+    batch_size=DEFAULT_BATCH_SIZE,
+    resume=False,
+    stream=stderr,
+):
+    """
+    Import the NDJSON files of the stores' indexes.
+
+    Files are imported in parallel. Stores that share an index (e.g. polymorphic models) import its files once.
+
+    :param resume: whether to skip the lines imported by a previous (interrupted) import
+    :returns: a dictionary of index names to tuples of the number of written and failed documents
+
+    """
+    stores_by_index = dict()
+    for store in stores:
+        stores_by_index.setdefault(store.get_index_name(), store)
+
+    checkpoint = Checkpoint(join(directory, IMPORT_CHECKPOINT), resume=resume)
+    progress = Progress("import", stream=stream)
+
+    def import_(task):
+        store, name = task
+        state = checkpoint.get(name) or dict(lines=0, written=0, failed=0, complete=False)
+        if state["complete"]:
+            progress.add(state["written"])
+            return state["written"], state["failed"]
+
+        def on_batch(lines, written, failed):
+            state.update(
+                lines=state["lines"] + lines,
+                written=state["written"] + written,
+                failed=state["failed"] + failed,
+            )
+            checkpoint.set(name, dict(state))
+            progress.add(written)
+
+        import_file(
+            store,
+            join(directory, name),
+            batch_size=batch_size,
+            skip_lines=state["lines"],
+            on_batch=on_batch,
+        )
+        state.update(complete=True)
+        checkpoint.set(name, dict(state))
+        return state["written"], state["failed"]
+
+    tasks = [
+        (store, name)
+        for index_name, store in stores_by_index.items()
+        for name in list_files(directory, index_name)
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(import_, tasks))
+    progress.finish()
+
+    counts = {index_name: (0, 0) for index_name in stores_by_index}
+    for (store, _), (written, failed) in zip(tasks, results):
+        index_name = store.get_index_name()
+        counts[index_name] = (counts[index_name][0] + written, counts[index_name][1] + failed)
+    return counts
@@ -50,7 +50,12 @@ setup(
     entry_points={
         "microcosm.factories": [
             "elasticsearch_client = microcosm_elasticsearch.factories:configure_elasticsearch_client",
+            "elasticsearch_hedging_policy = microcosm_elasticsearch.resilience:configure_hedging_policy",
             "elasticsearch_index_registry = microcosm_elasticsearch.registry:IndexRegistry",
+            "elasticsearch_metrics = microcosm_elasticsearch.metrics:ElasticsearchMetrics",
+            "elasticsearch_retry_policy = microcosm_elasticsearch.resilience:configure_retry_policy",
+            "elasticsearch_slow_query_log = microcosm_elasticsearch.profiling:SlowQueryLog",
+            "elasticsearch_stats_exporter = microcosm_elasticsearch.stats:StatsExporter",
             "index_status_convention = microcosm_elasticsearch.index_status.convention:configure_status_convention",
         ],
     },